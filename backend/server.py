@@ -1,19 +1,22 @@
 from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Depends, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 import pytz
 import jwt
 import bcrypt
 import yfinance as yf
+from yfinance.exceptions import YFTickerMissingError
 import pandas as pd
 import numpy as np
 import asyncio
@@ -21,11 +24,23 @@ from concurrent.futures import ThreadPoolExecutor
 import requests
 from bs4 import BeautifulSoup
 import json
+import pickle
 import requests_cache
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import time
 import random
+import sqlite3
+import math
+import threading
+import sys
+import bisect
+import contextvars
+
+try:
+    import fcntl  # Cross-process locking of the universe store (not available on Windows)
+except ImportError:
+    fcntl = None
 
 
 ROOT_DIR = Path(__file__).parent
@@ -35,13 +50,48 @@ load_dotenv(ROOT_DIR / '.env')
 MAX_RETRIES = 5
 INITIAL_WAIT = 0.5  # Start with 500ms
 MAX_WAIT = 30       # Cap at 30 seconds
-BATCH_DELAY = 0.2   # 200ms between requests in batch
 RATE_LIMIT_BACKOFF = True
 
+# Upstream token buckets: provider -> sustained requests per minute and burst capacity.
+# 90/min keeps the old budget of 30 symbol fetches per minute at ~3 calls each.
+UPSTREAM_RATE_LIMITS = {
+    "yahoo": {"requests_per_minute": 90, "burst": 10},
+    # The quote summary (ticker.info) is the slowest, most throttled call; it gets its own lane
+    "yahoo_fundamentals": {"requests_per_minute": 30, "burst": 5}
+}
+DEFAULT_UPSTREAM_PROVIDER = "yahoo"
+UPSTREAM_KIND_PROVIDERS = {  # Call kind -> provider, for kinds that use their own bucket
+    "fundamentals": "yahoo_fundamentals"
+}
+
+# Adaptive (AIMD) concurrency window for outbound calls, per provider
+UPSTREAM_INITIAL_CONCURRENCY = 4
+UPSTREAM_MIN_CONCURRENCY = 1
+UPSTREAM_MAX_CONCURRENCY = 16
+UPSTREAM_LATENCY_TARGET = 5.0  # Seconds; slower calls stop the window from growing
+UPSTREAM_CALL_TIMEOUT = 30  # Seconds before an outbound call counts as timed out
+# Every provider's full window gets a thread, so an admitted call never queues for one
+UPSTREAM_EXECUTOR_WORKERS = UPSTREAM_MAX_CONCURRENCY * len(UPSTREAM_RATE_LIMITS)
+
+# Retry budget and circuit breaker
+RETRY_BUDGET_RATIO = 0.1  # Retries allowed as a fraction of upstream requests in the last minute
+RETRY_BUDGET_MIN_PER_MINUTE = 10  # Retries always allowed per minute, even at low traffic
+CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive failed calls that open a provider's circuit
+CIRCUIT_OPEN_SECONDS = 30  # How long an open circuit rejects calls before a half-open probe
+# Task currently re-running a failed call in rate_limited_request; its calls are charged to the retry budget
+UPSTREAM_RETRYING = contextvars.ContextVar("upstream_retrying", default=None)
+
 # Rate limiting counters
 request_count = 0
-last_request_time = time.time()
-requests_per_minute = 0
+
+# Outbound market-data call accounting (see record_upstream_call)
+UPSTREAM_CALL_STATS = {"by_kind": {}, "by_symbol": {}}
+BULK_CALL_KEY = "*bulk*"  # Symbol key used for multi-ticker calls
+
+# In-flight request registry: concurrent callers with the same key share one task
+INFLIGHT_REQUESTS = {}
+INFLIGHT_WAITERS = {}  # Shared task -> callers still awaiting it
+COALESCING_STATS = {"leaders": 0, "coalesced": 0, "cancelled": 0, "by_kind": {}}
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
@@ -64,20 +114,136 @@ api_router = APIRouter(prefix="/api")
 
 # Thread pool for blocking operations - increased for larger dataset
 executor = ThreadPoolExecutor(max_workers=25)
+negative_cache_writer = ThreadPoolExecutor(max_workers=1)  # Applies negative-cache writes in order
+upstream_executor = ThreadPoolExecutor(max_workers=UPSTREAM_EXECUTOR_WORKERS, thread_name_prefix="upstream")
 
 # Enhanced caching configuration for larger stock dataset
 import time
-from functools import lru_cache
+from functools import lru_cache, partial
+from collections import deque, OrderedDict
+from collections.abc import Mapping, MutableMapping
+from itertools import islice
+from contextlib import closing, contextmanager
+from types import MappingProxyType
 from typing import Union
 
-# Cache for stock data to reduce API calls
-STOCK_DATA_CACHE = {}
-CACHE_EXPIRY_MINUTES = 15  # Cache expires after 15 minutes
+# Cache for stock data to reduce API calls (STOCK_DATA_CACHE, a StockDataCache, is created below)
+CACHE_MAX_MEMORY_MB = float(os.environ.get('STOCKBREAK_CACHE_MAX_MB', 256))  # Byte budget for cached entries
+CACHE_EVICTION_POLICY = os.environ.get('STOCKBREAK_CACHE_EVICTION', 'lru')  # 'lru' or 'lfu'
+CACHE_LFU_SAMPLE_SIZE = 16  # LFU evicts the least used of this many least recently used entries
+CACHE_LATENCY_SAMPLES = 256  # Recent load latencies kept per key class for percentiles
+CACHE_PENDING_LOAD_SECONDS = 300  # A miss not filled within this long is a failed load and is not timed
+INDICATOR_STATE = {}  # symbol -> IncrementalIndicatorState, advanced on every refresh
+CACHE_EXPIRY_MINUTES = 15  # Soft TTL: older entries are served stale while a refresh runs
+CACHE_TRADING_EXPIRY_MINUTES = 5  # Tighter soft TTL while the market is trading
+CACHE_HARD_EXPIRY_MINUTES = 60  # Hard TTL: older entries are never served (outside outages)
+CACHE_REFRESHING = set()  # Symbols with a background refresh in flight
+CACHE_REFRESH_STATS = {"stale_served": 0, "refreshes_scheduled": 0, "refresh_failures": 0}
+BACKGROUND_TASKS = set()  # Strong references to fire-and-forget tasks
+
+# NSE trading calendar (IST). Data fetched once the day's bars have settled after the close
+# stays valid until the next pre-open, so off-hours requests do not go upstream.
+IST = pytz.timezone('Asia/Kolkata')
+MARKET_PRE_OPEN = (9, 0)
+MARKET_OPEN = (9, 15)
+MARKET_CLOSE = (15, 30)
+MARKET_CLOSE_SETTLE_MINUTES = 15  # Final daily bars can lag the close by a few minutes
+# Weekday trading holidays published by NSE each December, as a JSON object of ISO date -> name
+NSE_HOLIDAYS_PATH = Path(os.environ.get('STOCKBREAK_NSE_HOLIDAYS', ROOT_DIR / 'nse_holidays.json'))
+NSE_HOLIDAYS_STATUS = {"error": None, "warned_on": None}  # Load failure, and the day the calendar was last flagged
+
+def load_nse_holidays(path: Path) -> Dict[date, str]:
+    """Read the NSE holiday list (date -> holiday name) from a JSON file"""
+    with open(path, encoding='utf-8') as f:
+        return {date.fromisoformat(day): name for day, name in json.load(f).items()}
+
+try:
+    NSE_HOLIDAYS = load_nse_holidays(NSE_HOLIDAYS_PATH)
+except (OSError, ValueError, AttributeError) as e:
+    NSE_HOLIDAYS = {}  # Weekends only until the file is fixed; reported at startup
+    NSE_HOLIDAYS_STATUS["error"] = str(e)
 
 # Batch processing configuration
 BATCH_SIZE = 50  # Process stocks in batches of 50
 MAX_CONCURRENT_BATCHES = 3  # Maximum concurrent batch operations
 
+# Persistent OHLCV store (SQLite, one row per symbol per trading day)
+DATA_DIR = Path(os.environ.get('STOCKBREAK_DATA_DIR', ROOT_DIR / 'data'))
+OHLCV_STORE_PATH = DATA_DIR / 'ohlcv.sqlite3'
+OHLCV_HISTORY_DAYS = 366  # Calendar days of history handed to the analysis pipeline
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+OHLCV_REBASE_TOLERANCE = 1e-4  # Relative close change on a re-fetched settled bar that means the history was re-adjusted
+UNIVERSE_STORE_DIR = DATA_DIR / 'universe'  # Memory-mapped symbols x days x OHLCV array
+WARM_STATE_PATH = DATA_DIR / 'warm_state.sqlite3'  # Cache, indicator state and snapshot kept across restarts
+# Version of the pickled warm-state payloads; bump it whenever CompactStockEntry,
+# IncrementalIndicatorState or the snapshot fields change shape, so older rows are discarded
+WARM_STATE_FORMAT = 3
+
+# Durable analysis cache in MongoDB, shared by API instances on different hosts (opt-in)
+MONGO_CACHE_ENABLED = os.environ.get('STOCKBREAK_MONGO_CACHE', '0') == '1'
+MONGO_CACHE_WRITE_BATCH = 100  # Buffered documents that trigger an unordered bulk write
+MONGO_CACHE_TIMEOUT = 2.0  # Seconds before a cache read or write is abandoned
+MONGO_OHLCV_SEGMENT_TTL_DAYS = 7  # OHLCV segments outlive analyses so history can be reused
+MONGO_CACHE_PENDING = {}  # Symbol -> latest buffered (analysis, segment) documents
+MONGO_CACHE_STATS = {"reads": 0, "hits": 0, "misses": 0, "read_failures": 0,
+                     "writes": 0, "write_batches": 0, "write_failures": 0}
+
+# Shared L2 cache: one SQLite (WAL) file behind every uvicorn worker's in-process L1 cache
+SHARED_CACHE_ENABLED = os.environ.get('STOCKBREAK_SHARED_CACHE', '1') != '0'
+SHARED_CACHE_PATH = DATA_DIR / 'shared_cache.sqlite3'
+SHARED_CACHE_LEASE_SECONDS = 60  # A worker refreshing a symbol holds its lease at most this long
+SHARED_CACHE_POLL_SECONDS = 0.25  # How often other workers check for the lease holder's result
+SHARED_CACHE_FORMAT = WARM_STATE_FORMAT  # L2 payloads pickle the same cache entries as the warm-state store
+WORKER_ID = f"{os.getpid()}"
+# One worker at a time holds this lease and runs the shared background work (snapshot builds,
+# warm-state saves, L2 pruning); it is renewed every third of its lifetime
+BACKGROUND_LEASE_KEY = "background"
+BACKGROUND_LEASE_SECONDS = 90
+BACKGROUND_LEASE = {"held": False, "since": None}
+SHARED_CACHE_STATS = {"l2_hits": 0, "l2_misses": 0, "l2_writes": 0, "l2_write_failures": 0,
+                      "leases_acquired": 0, "lease_waits": 0, "lease_wait_hits": 0, "lease_wait_timeouts": 0}
+WARM_STATE_KEYS = set()  # Persisted keys not yet restored; restored on first touch
+WARM_STATE_DIRTY = set()  # Keys changed since the last save
+WARM_STATE_STATS = {"restored": 0, "discarded": 0, "saved": 0, "last_save_ms": None, "saved_snapshot_version": None}
+UNIVERSE_TRADING_DAYS = 260  # Trading days kept on the shared date axis
+UNIVERSE_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+STORED_CHART_LOOKBACK = {  # Chart periods served from the store: bar count or date offset
+    "1d": 1,
+    "5d": 5,
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1)
+}
+
+# Fundamentals (ticker.info) change at most daily, so they are cached apart from prices
+FUNDAMENTALS_MIN_TTL_HOURS = 6  # Kept at least this long, then until the next pre-open
+FUNDAMENTALS_CACHE = {}  # symbol -> {'info': trimmed info, 'fetched_at': epoch seconds}
+FUNDAMENTALS_STATS = {"memory_hits": 0, "store_hits": 0, "stale_served": 0, "refreshes": 0, "refresh_failures": 0}
+
+# Negative cache: failing symbols are re-probed on an exponential schedule, dead ones are quarantined
+NEGATIVE_CACHE_BASE_SECONDS = 300  # Re-probe delay after the first failure; doubles with each further one
+NEGATIVE_CACHE_MAX_SECONDS = 24 * 3600  # Longest re-probe delay, also how often quarantined symbols are probed
+QUARANTINE_AFTER_NOT_FOUND = 3  # Consecutive confirmed not-found/delisted responses that quarantine a symbol
+SYMBOL_FAILURES = {}  # symbol -> {'failures', 'not_found', 'reason', 'first_failure', 'last_failure', 'retry_at', 'quarantined'}
+NEGATIVE_CACHE_STATS = {"failures": 0, "skipped": 0, "quarantined": 0, "recovered": 0, "released": 0}
+
+# Bulk (multi-ticker) download configuration
+BULK_FETCH_ENABLED = True  # Download history for a whole batch in one call
+BULK_DOWNLOAD_CHUNK_SIZE = 20  # Maximum tickers per yf.download call (fetched one after another)
+BULK_DOWNLOAD_TICKER_TIMEOUT = 5  # Seconds yf.download waits on each ticker's request; bulk call timeouts scale with it
+YF_DOWNLOAD_LOCK = threading.Lock()  # yf.download collects results in module globals, so calls must not overlap
+
+# Materialized scan snapshot, rebuilt in the background and queried by the scan endpoint
+SCAN_SNAPSHOT = None  # Current ScanSnapshot, replaced atomically by the refresher
+SCAN_SNAPSHOT_REFRESH_SECONDS = CACHE_EXPIRY_MINUTES * 60
+SCAN_SNAPSHOT_MAX_AGE_SECONDS = SCAN_SNAPSHOT_REFRESH_SECONDS * 3  # Older snapshots fall back to a live scan
+SCAN_SNAPSHOT_POLL_SECONDS = 60  # How often workers without the background lease look for a newer snapshot
+
+# Background scan jobs (job_id -> ScanJob); finished jobs are kept for reuse until they expire
+SCAN_JOBS = {}
+SCAN_JOB_TTL_MINUTES = 30
+
 # Define Models
 class StatusCheck(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -217,6 +383,20 @@ class AlertRequest(BaseModel):
     condition: str  # "above", "below"
     email: Optional[str] = None
 
+class ScanJobRequest(BaseModel):
+    sector: Optional[str] = None
+    min_confidence: float = 0.5
+    risk_level: Optional[str] = None
+    action: Optional[str] = None
+    breakout_type: Optional[str] = None
+    limit: int = 100
+    use_cache: bool = True
+    min_rsi: Optional[float] = None
+    max_rsi: Optional[float] = None
+    min_volume_ratio: Optional[float] = None
+    max_volume_ratio: Optional[float] = None
+    max_pe: Optional[float] = None
+
 # Comprehensive NSE Stock Database (2500+ stocks across all sectors)
 # This includes stocks from NIFTY 50, NIFTY Next 50, NIFTY 500, Midcap 100, Smallcap 100, and additional tradeable stocks
 NSE_SYMBOLS = {
@@ -504,66 +684,1854 @@ NSE_SYMBOLS = {
     "BSE": "Finance", "BUTTERFLY": "Durables", "BYKE": "Hotels"
 }
 
+# Row order of the universe store (symbol -> row index)
+UNIVERSE_SYMBOLS = list(NSE_SYMBOLS.keys())
+
+class UniverseStore:
+    """Memory-mapped symbols x trading days x OHLCV array shared by all workers via the page cache.
+
+    Rows follow UNIVERSE_SYMBOLS order and columns a shared, right-aligned date axis
+    (latest trading day last). The axis is the NSE trading calendar over the full lookback,
+    widened by any off-calendar session a write brings in. Missing bars are NaN. Views
+    returned by field() and symbol_view() slice the map directly, so readers never copy
+    per-symbol frames. Writers hold a file lock, so workers never move the axis under
+    each other.
+    """
+
+    def __init__(self, directory: Path, symbols: List[str], days: int):
+        self.directory = directory
+        self.symbols = symbols
+        self.index = {symbol: row for row, symbol in enumerate(symbols)}
+        self.days = days
+        self.data = None   # float64 (symbols, days, fields)
+        self.dates = None  # int64 (days,) day numbers since epoch, 0 = unused slot
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive access across this worker's threads and, where fcntl exists, across workers"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / 'universe.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def open(self) -> None:
+        """Map the universe files, (re)creating them if missing or built for another symbol list"""
+        if self.data is not None:
+            return
+        with self._locked():
+            self._open()
+
+    def _open(self) -> None:
+        if self.data is not None:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        data_path = self.directory / 'ohlcv.f64'
+        dates_path = self.directory / 'dates.i8'
+        symbols_path = self.directory / 'symbols.json'
+        shape = (len(self.symbols), self.days, len(UNIVERSE_FIELDS))
+
+        reuse = (
+            data_path.exists() and dates_path.exists() and symbols_path.exists()
+            and json.loads(symbols_path.read_text()) == self.symbols
+            and data_path.stat().st_size == np.prod(shape) * 8
+        )
+
+        if reuse:
+            self.data = np.memmap(data_path, dtype=np.float64, mode='r+', shape=shape)
+            self.dates = np.memmap(dates_path, dtype=np.int64, mode='r+', shape=(self.days,))
+        else:
+            self.data = np.memmap(data_path, dtype=np.float64, mode='w+', shape=shape)
+            self.data[:] = np.nan
+            self.dates = np.memmap(dates_path, dtype=np.int64, mode='w+', shape=(self.days,))
+            self.dates[:] = 0
+            symbols_path.write_text(json.dumps(self.symbols))
+            logger.info(f"Created universe store {shape} at {self.directory}")
+
+    def _axis_for(self, days: np.ndarray) -> Optional[np.ndarray]:
+        """The date axis needed to hold `days`, or None if the current axis already does"""
+        current = self.dates[self.dates > 0]
+        if len(current) == self.days:
+            window = days[days >= current[0]]
+            if days.max() <= current[-1] and np.isin(window, current).all():
+                return None
+
+        latest = max(int(days.max()), int(current[-1]) if len(current) else 0)
+        calendar = trading_day_numbers(latest, self.days)
+        return np.union1d(calendar, np.union1d(current, days))[-self.days:]
+
+    def _realign(self, axis: np.ndarray) -> None:
+        """Move every row onto a new right-aligned date axis; bars that fall off it are dropped"""
+        old_dates = np.array(self.dates)
+        old_data = np.array(self.data)
+        offset = self.days - len(axis)
+
+        self.data[:] = np.nan
+        self.dates[:] = 0
+        self.dates[offset:] = axis
+
+        used = np.flatnonzero(old_dates > 0)
+        positions = np.clip(np.searchsorted(axis, old_dates[used]), 0, len(axis) - 1)
+        kept = axis[positions] == old_dates[used]
+        self.data[:, offset + positions[kept]] = old_data[:, used[kept]]
+
+    def write_symbol(self, symbol: str, hist: pd.DataFrame) -> bool:
+        """Replace a symbol's row with the bars in hist (bars older than the lookback are skipped)"""
+        row = self.index.get(symbol)
+        if row is None or hist is None or hist.empty:
+            return False
+
+        index = hist.index.tz_localize(None) if getattr(hist.index, 'tz', None) is not None else hist.index
+        days = index.values.astype('datetime64[D]').astype(np.int64)
+        values = hist[OHLCV_COLUMNS].to_numpy(dtype=np.float64)
+
+        with self._locked():
+            self._open()
+
+            axis = self._axis_for(np.unique(days))
+            if axis is not None:
+                self._realign(axis)
+
+            positions = np.searchsorted(self.dates, days)
+            positions = np.clip(positions, 0, self.days - 1)
+            on_axis = self.dates[positions] == days
+
+            self.data[row] = np.nan
+            self.data[row, positions[on_axis]] = values[on_axis]
+            return True
+
+    def flush(self) -> None:
+        """Write dirty pages back to disk"""
+        if self.data is not None:
+            self.data.flush()
+            self.dates.flush()
+
+    def field(self, name: str) -> np.ndarray:
+        """Zero-copy (symbols, days) view of one OHLCV field"""
+        self.open()
+        return self.data[:, :, UNIVERSE_FIELDS.index(name)]
+
+    def symbol_view(self, symbol: str) -> Optional[np.ndarray]:
+        """Zero-copy (days, fields) view of one symbol's bars"""
+        row = self.index.get(symbol)
+        if row is None:
+            return None
+        self.open()
+        return self.data[row]
+
+    def trading_days(self) -> pd.DatetimeIndex:
+        """Dates of the populated part of the shared axis"""
+        self.open()
+        days = np.asarray(self.dates)
+        return pd.to_datetime(days[days > 0].astype('datetime64[D]'))
+
+    def fresh_rows(self) -> np.ndarray:
+        """Boolean mask of symbols whose row has a bar on the latest trading day"""
+        return ~np.isnan(self.field('close')[:, -1])
+
+    def indicator_graph(self) -> 'LazyIndicatorGraph':
+        """Lazy indicator graph over the whole universe; columns are computed on first access"""
+        return LazyIndicatorGraph(
+            self.field('close').T, self.field('high').T, self.field('low').T,
+            self.field('volume').T, self.symbols
+        )
+
+    def indicator_table(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Latest technical indicators for every symbol, computed in one vectorized pass"""
+        return self.indicator_graph().materialize(columns or INDICATOR_COLUMNS)
+
+    def change_percent(self) -> np.ndarray:
+        """Latest day-over-day close change (%) for every symbol, NaN where unavailable"""
+        close = self.field('close')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (close[:, -1] / close[:, -2] - 1) * 100
+
+
+UNIVERSE_STORE = UniverseStore(UNIVERSE_STORE_DIR, UNIVERSE_SYMBOLS, UNIVERSE_TRADING_DAYS)
+
+def is_trading_day(day: date) -> bool:
+    """Whether NSE trades on a calendar day (weekday and not an exchange holiday)"""
+    return day.weekday() < 5 and day not in NSE_HOLIDAYS
+
+def check_holiday_calendar(today: Optional[date] = None) -> bool:
+    """Whether the holiday list covers today; logs a warning (once a day) when it is missing or has run out.
+
+    Past the last listed holiday every weekday counts as a trading day, so holidays get
+    treated as sessions until NSE_HOLIDAYS_PATH is updated with the next year's list.
+    """
+    today = today or datetime.now(IST).date()
+    last_listed = max(NSE_HOLIDAYS, default=None)
+    if last_listed is not None and today <= last_listed:
+        return True
+    if NSE_HOLIDAYS_STATUS["warned_on"] != today:
+        NSE_HOLIDAYS_STATUS["warned_on"] = today
+        if last_listed is None:
+            logger.warning(f"No NSE holidays loaded from {NSE_HOLIDAYS_PATH} "
+                           f"({NSE_HOLIDAYS_STATUS['error'] or 'empty list'}), treating every weekday as a trading day")
+        else:
+            logger.warning(f"NSE holiday list at {NSE_HOLIDAYS_PATH} ends on {last_listed}, "
+                           f"treating every later weekday as a trading day until it is updated")
+    return False
+
+def trading_day_numbers(last_day: int, count: int) -> np.ndarray:
+    """Day numbers (days since epoch, ascending) of the `count` NSE trading days ending on or before `last_day`"""
+    day = date(1970, 1, 1) + timedelta(days=int(last_day))
+    days = []
+    while len(days) < count:
+        if is_trading_day(day):
+            days.append((day - date(1970, 1, 1)).days)
+        day -= timedelta(days=1)
+    return np.array(days[::-1], dtype=np.int64)
+
+def market_time(moment: datetime, hour_minute: Tuple[int, int]) -> datetime:
+    """The given IST wall-clock time on the same day as `moment`"""
+    return moment.replace(hour=hour_minute[0], minute=hour_minute[1], second=0, microsecond=0)
+
+def next_market_open(moment: Optional[datetime] = None) -> datetime:
+    """Start of the next pre-open session strictly after `moment` (IST)"""
+    moment = (moment or datetime.now(IST)).astimezone(IST)
+    candidate = market_time(moment, MARKET_PRE_OPEN)
+    if candidate <= moment:
+        candidate += timedelta(days=1)
+    while not is_trading_day(candidate.date()):
+        candidate += timedelta(days=1)
+    return candidate
+
+def market_session(moment: Optional[datetime] = None) -> str:
+    """NSE session at `moment`: PRE_OPEN, OPEN, SETTLING (just after the close) or CLOSED"""
+    moment = (moment or datetime.now(IST)).astimezone(IST)
+    if not is_trading_day(moment.date()) or moment < market_time(moment, MARKET_PRE_OPEN):
+        return "CLOSED"
+    if moment < market_time(moment, MARKET_OPEN):
+        return "PRE_OPEN"
+    close_time = market_time(moment, MARKET_CLOSE)
+    if moment <= close_time:
+        return "OPEN"
+    if moment < close_time + timedelta(minutes=MARKET_CLOSE_SETTLE_MINUTES):
+        return "SETTLING"
+    return "CLOSED"
+
+def market_data_expires_at(fetched_at: float, ttl_seconds: float) -> float:
+    """Epoch time until which data fetched at `fetched_at` is current; settled data lasts until the next pre-open"""
+    moment = datetime.fromtimestamp(fetched_at, IST)
+    if market_session(moment) == "CLOSED":
+        return next_market_open(moment).timestamp()
+    return fetched_at + ttl_seconds
+
+def cache_ttl_seconds(session: str) -> int:
+    """Soft TTL for data cached during a market session"""
+    return (CACHE_TRADING_EXPIRY_MINUTES if session == "OPEN" else CACHE_EXPIRY_MINUTES) * 60
+
+def deep_sizeof(obj, sample: int = 8, seen: Optional[set] = None) -> int:
+    """Approximate retained size in bytes of a JSON-like object graph.
+
+    Long sequences (chart bars) are homogeneous, so only `sample` items are measured
+    and the total is extrapolated; this keeps sizing a cache entry well under a millisecond.
+    """
+    seen = set() if seen is None else seen
+    stack = [obj]
+    size = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, pd.Index):
+            size += item.memory_usage()
+        elif hasattr(type(item), '__slots__'):
+            stack.extend(getattr(item, name, None) for name in type(item).__slots__)
+        elif isinstance(item, (list, tuple)) and len(item) > sample:
+            step = len(item) // sample
+            measured = sum(deep_sizeof(element, sample, seen) for element in item[::step][:sample])
+            size += measured * len(item) // sample
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+    return size
+
+
+class StockDataCache(MutableMapping):
+    """Byte-bounded cache of {'data', 'timestamp', ...} entries with LRU or sampled LFU eviction.
+
+    Entry sizes are measured on write and the total is kept under max_bytes by evicting
+    from the least recently used end. Write times are kept sorted so age histograms are
+    answered with bisect instead of a scan. lookup() classifies each read as fresh, stale
+    or miss per key class (the key prefix before '_'); the time from a miss to the write
+    that fills it is recorded as that class's load latency.
+    """
+
+    def __init__(self, max_bytes: int, policy: str = 'lru'):
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> entry, least recently used first
+        self._sizes = {}
+        self._frequency = {}
+        self._write_times = []  # Sorted write timestamps of the current entries
+        self._pending_loads = {}  # key -> perf_counter() of the miss awaiting a write
+        self._class_stats = {}
+
+    @staticmethod
+    def key_class(key: str) -> str:
+        return key.split('_', 1)[0]
+
+    def _stats_for(self, key: str) -> Dict:
+        return self._class_stats.setdefault(self.key_class(key), {
+            "hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0,
+            "load_latency": deque(maxlen=CACHE_LATENCY_SAMPLES), "loads": 0
+        })
+
+    def __getitem__(self, key: str) -> Dict:
+        return self._entries[key]
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __setitem__(self, key: str, entry: Dict) -> None:
+        if key in self._entries:
+            self._discard(key)
+        size = deep_sizeof(entry)
+        self._entries[key] = entry
+        self._sizes[key] = size
+        self._frequency.setdefault(key, 0)
+        bisect.insort(self._write_times, entry.get('timestamp', 0))
+        self.bytes += size
+
+        started = self._pending_loads.pop(key, None)
+        if started is not None:
+            stats = self._stats_for(key)
+            stats["loads"] += 1
+            stats["load_latency"].append(time.perf_counter() - started)
+
+        while self.bytes > self.max_bytes and len(self._entries) > 1:
+            self._evict_one(protect=key)
+
+    def __delitem__(self, key: str) -> None:
+        self._discard(key)
+        self._frequency.pop(key, None)
+        self._pending_loads.pop(key, None)
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= self._sizes.pop(key)
+        timestamps = self._write_times
+        del timestamps[bisect.bisect_left(timestamps, entry.get('timestamp', 0))]
+
+    def _evict_one(self, protect: str) -> None:
+        candidates = [k for k in islice(self._entries, CACHE_LFU_SAMPLE_SIZE + 1) if k != protect]
+        if self.policy == 'lfu':
+            victim = min(candidates[:CACHE_LFU_SAMPLE_SIZE], key=lambda k: self._frequency.get(k, 0))
+        else:
+            victim = candidates[0]
+        self._stats_for(victim)["evictions"] += 1
+        del self[victim]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._sizes.clear()
+        self._frequency.clear()
+        self._write_times.clear()
+        self._pending_loads.clear()
+        self.bytes = 0
+
+    def lookup(self, key: str, record: bool = True) -> Tuple[Optional[Dict], str]:
+        """Entry and its status ('fresh' | 'stale' | 'miss'), counted in the hit/miss statistics"""
+        entry = self._entries.get(key)
+        if is_cache_valid(entry):
+            status = "fresh"
+        elif is_cache_usable(entry):
+            status = "stale"
+        else:
+            entry, status = None, "miss"
+
+        if record:
+            stats = self._stats_for(key)
+            if entry is not None:
+                stats["hits" if status == "fresh" else "stale_hits"] += 1
+                self._entries.move_to_end(key)
+                self._frequency[key] += 1
+            else:
+                stats["misses"] += 1
+                self._record_pending_load(key)
+        return entry, status
+
+    def _record_pending_load(self, key: str) -> None:
+        """Start timing a miss, dropping misses whose load failed and so never got a write"""
+        now = time.perf_counter()
+        pending = self._pending_loads
+        # Keys are in miss order, so abandoned misses sit at the front
+        while pending:
+            oldest = next(iter(pending))
+            if now - pending[oldest] < CACHE_PENDING_LOAD_SECONDS:
+                break
+            del pending[oldest]
+        pending.setdefault(key, now)
+
+    def hit_ratio(self) -> float:
+        """Share of counted lookups served from the cache (fresh or stale)"""
+        hits = sum(s["hits"] + s["stale_hits"] for s in self._class_stats.values())
+        lookups = hits + sum(s["misses"] for s in self._class_stats.values())
+        return round(hits / lookups, 4) if lookups else 0.0
+
+    def entries_by_age(self, bounds_minutes: List[float]) -> List[int]:
+        """Entry counts per age band: [0, b0], (b0, b1], ..., (b_last, inf)"""
+        now = time.time()
+        # Ages ascend as write times descend, so count writes at or after each cutoff
+        counts_newer = [len(self._write_times) - bisect.bisect_left(self._write_times, now - b * 60)
+                        for b in bounds_minutes]
+        bands = [counts_newer[0]] + [b - a for a, b in zip(counts_newer, counts_newer[1:])]
+        return bands + [len(self._write_times) - counts_newer[-1]]
+
+    def stats(self) -> Dict[str, Any]:
+        by_class = {}
+        for key_class, stats in self._class_stats.items():
+            latencies = sorted(stats["load_latency"])
+            lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+            by_class[key_class] = {
+                "hits": stats["hits"],
+                "stale_hits": stats["stale_hits"],
+                "misses": stats["misses"],
+                "hit_ratio": round((stats["hits"] + stats["stale_hits"]) / lookups, 4) if lookups else 0.0,
+                "evictions": stats["evictions"],
+                "loads": stats["loads"],
+                "load_latency_ms": {
+                    "avg": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+                    "p95": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+                    "max": round(latencies[-1] * 1000, 1) if latencies else None
+                }
+            }
+        for key, size in self._sizes.items():
+            entry_stats = by_class.setdefault(self.key_class(key), {})
+            entry_stats["entries"] = entry_stats.get("entries", 0) + 1
+            entry_stats["bytes"] = entry_stats.get("bytes", 0) + size
+
+        return {
+            "policy": self.policy,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "utilization": round(self.bytes / self.max_bytes, 4) if self.max_bytes else None,
+            "avg_entry_bytes": int(self.bytes / len(self._entries)) if self._entries else 0,
+            "hit_ratio": self.hit_ratio(),
+            "evictions": sum(s["evictions"] for s in self._class_stats.values()),
+            "by_key_class": by_class
+        }
+
+
+STOCK_DATA_CACHE = StockDataCache(int(CACHE_MAX_MEMORY_MB * 1024 * 1024), CACHE_EVICTION_POLICY)
+
+def cache_entry_age(cache_entry: Dict) -> float:
+    """Seconds since the entry was cached"""
+    return time.time() - cache_entry.get('timestamp', 0)
+
 def is_cache_valid(cache_entry: Dict) -> bool:
     """Check if cache entry is still valid"""
     if not cache_entry:
         return False
     
-    cache_time = cache_entry.get('timestamp', 0)
-    current_time = time.time()
+    expires_at = cache_entry.get('expires_at', cache_entry.get('timestamp', 0) + CACHE_EXPIRY_MINUTES * 60)
+    return time.time() < expires_at
+
+def is_cache_usable(cache_entry: Dict) -> bool:
+    """Check if cache entry may still be served stale (within the hard TTL)"""
+    if not cache_entry:
+        return False
     
-    return (current_time - cache_time) < (CACHE_EXPIRY_MINUTES * 60)
+    stale_until = cache_entry.get('stale_until', cache_entry.get('timestamp', 0) + CACHE_HARD_EXPIRY_MINUTES * 60)
+    return time.time() < stale_until
 
-def get_cached_stock_data(symbol: str) -> Optional[Dict]:
-    """Get cached stock data if valid"""
-    cache_key = f"stock_{symbol}"
-    cache_entry = STOCK_DATA_CACHE.get(cache_key)
+async def load_cache_tiers(symbols: List[str], record: bool = True) -> None:
+    """Bring symbols' warm-restart entries and newer L2 entries into L1, reading SQLite off the loop"""
+    keys = [f"stock_{symbol}" for symbol in symbols]
+    await warm_restore(keys)
+    if SHARED_CACHE_ENABLED:
+        await load_shared_entries([key for key in keys if not is_cache_valid(STOCK_DATA_CACHE.get(key))], record=record)
+
+def lookup_l1_stock_data(symbol: str, record: bool = True) -> Tuple[Optional[Dict], str]:
+    """Look up a symbol's L1 entry, returning (data with its age, 'fresh' | 'stale' | 'miss')"""
+    cache_entry, status = STOCK_DATA_CACHE.lookup(f"stock_{symbol}", record=record)
+    if cache_entry is None:
+        return None, status
+    
+    data = cache_entry['data'].with_cache_info(data_age_seconds=round(cache_entry_age(cache_entry), 1), cache_status=status)
+    return data, status
+
+async def lookup_cached_stock_data(symbol: str, record: bool = True) -> Tuple[Optional[Dict], str]:
+    """Look up a symbol's cache entry in every tier, returning (data with its age, 'fresh' | 'stale' | 'miss')"""
+    await load_cache_tiers([symbol], record=record)
+    return lookup_l1_stock_data(symbol, record=record)
+
+async def get_cached_stock_data(symbol: str, allow_stale: bool = True) -> Optional[Dict]:
+    """Get cached stock data if valid; stale data is served while a background refresh runs"""
+    data, status = await lookup_cached_stock_data(symbol)
     
-    if is_cache_valid(cache_entry):
+    if status == "fresh":
         logger.info(f"Using cached data for {symbol}")
-        return cache_entry['data']
+        return data
+    if status == "stale" and allow_stale:
+        logger.info(f"Serving stale cached data for {symbol} while refreshing")
+        CACHE_REFRESH_STATS["stale_served"] += 1
+        schedule_cache_refresh([symbol])
+        return data
     
     return None
 
+def spawn_background_task(coro) -> asyncio.Task:
+    """Start a fire-and-forget task, keeping a reference until it finishes"""
+    task = asyncio.ensure_future(coro)
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+    return task
+
+def schedule_cache_refresh(symbols: List[str]) -> None:
+    """Refresh stale symbols in the background, at most one refresh per symbol at a time"""
+    pending = [symbol for symbol in symbols if symbol not in CACHE_REFRESHING]
+    if not pending:
+        return
+    
+    CACHE_REFRESHING.update(pending)
+    CACHE_REFRESH_STATS["refreshes_scheduled"] += len(pending)
+    
+    async def _refresh():
+        try:
+            await fetch_stock_data_batch(pending, allow_stale=False)
+        except Exception as e:
+            CACHE_REFRESH_STATS["refresh_failures"] += 1
+            logger.error(f"Background cache refresh failed for {len(pending)} symbols: {str(e)}")
+        finally:
+            CACHE_REFRESHING.difference_update(pending)
+    
+    spawn_background_task(_refresh())
+
+async def get_stale_stock_data(symbol: str) -> Optional[Dict]:
+    """Get cached stock data regardless of age (fallback while upstream is unavailable)"""
+    await warm_restore([f"stock_{symbol}"])
+    cache_entry = STOCK_DATA_CACHE.get(f"stock_{symbol}")
+    if not cache_entry:
+        return None
+    return cache_entry['data'].with_cache_info(
+        data_age_seconds=round(cache_entry_age(cache_entry), 1), cache_status="stale"
+    )
+
+def served_from_cache(data: Dict) -> bool:
+    """True for views handed out by the cache (see with_cache_info), which must never be cached again"""
+    return getattr(data, 'cache_info', None) is not None
+
 def cache_stock_data(symbol: str, data: Dict) -> None:
     """Cache stock data with timestamp"""
+    if served_from_cache(data) or data.get('data_validation', {}).get('degraded'):
+        # Re-caching a cache view, or an analysis built from stored bars while the provider's
+        # circuit is open, would stamp old data as fresh in every tier
+        return
     cache_key = f"stock_{symbol}"
-    STOCK_DATA_CACHE[cache_key] = {
+    now = time.time()
+    expires_at = market_data_expires_at(now, cache_ttl_seconds(market_session()))
+    WARM_STATE_KEYS.discard(cache_key)
+    WARM_STATE_DIRTY.add(cache_key)
+    entry = {
         'data': data,
-        'timestamp': time.time()
+        'timestamp': now,
+        'expires_at': expires_at,
+        # Stale service is allowed for the same grace period past expiry regardless of session
+        'stale_until': expires_at + (CACHE_HARD_EXPIRY_MINUTES - CACHE_EXPIRY_MINUTES) * 60
+    }
+    STOCK_DATA_CACHE[cache_key] = entry
+    if SHARED_CACHE_ENABLED:
+        # Serialize here, where the entry is consistent; the write itself runs off the loop
+        payload = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        queue_shared_write(cache_key, payload, now, entry['stale_until'])
+    if MONGO_CACHE_ENABLED:
+        queue_mongo_cache_write(symbol, entry)
+
+def get_warm_state_connection() -> sqlite3.Connection:
+    """Open a connection to the warm-restart store (one per call, thread safe)"""
+    conn = sqlite3.connect(WARM_STATE_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+def init_warm_state_store() -> None:
+    """Create the warm-restart store schema if it does not exist yet"""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    with closing(get_warm_state_connection()) as conn, conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS warm_state (
+                key TEXT PRIMARY KEY,
+                payload BLOB NOT NULL,
+                usable_until REAL,
+                format INTEGER
+            )
+        """)
+        # Stores created before payloads were versioned; their rows have no format and are discarded
+        if "format" not in {column for _, column, *_ in conn.execute("PRAGMA table_info(warm_state)")}:
+            conn.execute("ALTER TABLE warm_state ADD COLUMN format INTEGER")
+
+def load_warm_state_index() -> Tuple[set, Optional[bytes]]:
+    """Drop unusable rows and rows of another payload format; return (restorable keys, snapshot payload)"""
+    with closing(get_warm_state_connection()) as conn, conn:
+        conn.execute("DELETE FROM warm_state WHERE usable_until IS NOT NULL AND usable_until <= ?", (time.time(),))
+        mismatched = conn.execute("DELETE FROM warm_state WHERE format IS NOT ?", (WARM_STATE_FORMAT,)).rowcount
+        keys = {key for (key,) in conn.execute("SELECT key FROM warm_state WHERE key != 'snapshot'")}
+        row = conn.execute("SELECT payload FROM warm_state WHERE key = 'snapshot'").fetchone()
+    if mismatched:
+        logger.info(f"Discarded {mismatched} warm-state rows saved in another format than v{WARM_STATE_FORMAT}")
+    return keys, (row[0] if row else None)
+
+def write_warm_state(rows: List[Tuple[str, bytes, Optional[float]]], deleted: List[str]) -> None:
+    """Upsert serialized warm-state rows in the current format and delete keys that no longer exist in memory"""
+    with closing(get_warm_state_connection()) as conn, conn:
+        conn.executemany("INSERT OR REPLACE INTO warm_state VALUES (?, ?, ?, ?)",
+                         [(*row, WARM_STATE_FORMAT) for row in rows])
+        conn.executemany("DELETE FROM warm_state WHERE key = ?", [(key,) for key in deleted])
+
+def collect_warm_state() -> Tuple[List[Tuple[str, bytes, Optional[float]]], List[str]]:
+    """Serialize everything changed since the last save; runs on the event loop so state is consistent"""
+    rows, deleted = [], []
+    dirty = list(WARM_STATE_DIRTY)
+    WARM_STATE_DIRTY.clear()
+    for key in dirty:
+        kind, symbol = key.split('_', 1)
+        if kind == "stock":
+            entry = STOCK_DATA_CACHE.get(key)
+            if entry is not None and is_cache_usable(entry):
+                rows.append((key, pickle.dumps(entry, pickle.HIGHEST_PROTOCOL), entry['stale_until']))
+                continue
+        elif kind == "indicator":
+            state = INDICATOR_STATE.get(symbol)
+            if state is not None:
+                rows.append((key, pickle.dumps(state, pickle.HIGHEST_PROTOCOL), None))
+                continue
+        deleted.append(key)
+
+    snapshot = SCAN_SNAPSHOT
+    if snapshot is not None and snapshot.version != WARM_STATE_STATS["saved_snapshot_version"]:
+        rows.append(scan_snapshot_row(snapshot))
+        WARM_STATE_STATS["saved_snapshot_version"] = snapshot.version
+    return rows, deleted
+
+def scan_snapshot_row(snapshot: 'ScanSnapshot') -> Tuple[str, bytes, Optional[float]]:
+    """Serialize a snapshot as its warm-state row"""
+    fields = (snapshot.version, snapshot.built_at, snapshot.build_seconds, dict(snapshot.rows), snapshot.scanned)
+    return "snapshot", pickle.dumps(fields, pickle.HIGHEST_PROTOCOL), snapshot.expires_at
+
+def load_persisted_snapshot() -> Optional[Tuple]:
+    """Read and unpickle the persisted snapshot's fields (blocking; run in the executor)"""
+    with closing(get_warm_state_connection()) as conn:
+        row = conn.execute("SELECT payload FROM warm_state WHERE key = 'snapshot' AND format = ?",
+                           (WARM_STATE_FORMAT,)).fetchone()
+    return pickle.loads(row[0]) if row else None
+
+async def adopt_persisted_snapshot(fields: Tuple) -> bool:
+    """Publish a persisted snapshot unless this worker already has one built at the same time or later"""
+    global SCAN_SNAPSHOT
+    version, built_at, build_seconds, rows, scanned = fields
+    if SCAN_SNAPSHOT is not None and SCAN_SNAPSHOT.built_at >= built_at:
+        return False
+    snapshot = await asyncio.get_event_loop().run_in_executor(
+        executor, ScanSnapshot, version, built_at, build_seconds, rows, scanned
+    )
+    if SCAN_SNAPSHOT is not None and SCAN_SNAPSHOT.built_at >= built_at:
+        return False
+    SCAN_SNAPSHOT = snapshot
+    WARM_STATE_STATS["saved_snapshot_version"] = version
+    return True
+
+async def save_warm_state() -> None:
+    """Persist changed cache entries, indicator states and the snapshot without blocking the loop on I/O"""
+    start = time.perf_counter()
+    rows, deleted = collect_warm_state()
+    if rows or deleted:
+        await asyncio.get_event_loop().run_in_executor(executor, write_warm_state, rows, deleted)
+    WARM_STATE_STATS["saved"] += len(rows)
+    WARM_STATE_STATS["last_save_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+def read_warm_entries(keys: List[str]) -> Dict[str, Any]:
+    """Read and unpickle persisted warm-state entries (blocking; run in the executor)"""
+    values = {}
+    with closing(get_warm_state_connection()) as conn:
+        for key in keys:
+            row = conn.execute("SELECT payload FROM warm_state WHERE key = ? AND format = ?",
+                               (key, WARM_STATE_FORMAT)).fetchone()
+            if row is None:
+                continue
+            try:
+                values[key] = pickle.loads(row[0])
+            except Exception as e:
+                logger.warning(f"Warm state restore failed for {key}: {str(e)}")
+    return values
+
+async def warm_restore(keys: List[str]) -> None:
+    """Restore persisted cache entries or indicator states on first touch"""
+    pending = [key for key in keys if key in WARM_STATE_KEYS]
+    if not pending:
+        return
+    WARM_STATE_KEYS.difference_update(pending)
+    try:
+        values = await asyncio.get_event_loop().run_in_executor(executor, read_warm_entries, pending)
+    except Exception as e:
+        logger.warning(f"Warm state restore failed for {len(pending)} keys: {str(e)}")
+        values = {}
+
+    # Entries written while the read ran are newer than anything on disk and are kept
+    for key in pending:
+        value = values.get(key)
+        kind, symbol = key.split('_', 1)
+        if kind == "stock" and value is not None and is_cache_usable(value) and key not in STOCK_DATA_CACHE:
+            STOCK_DATA_CACHE[key] = value
+            WARM_STATE_STATS["restored"] += 1
+        elif kind == "indicator" and value is not None and symbol not in INDICATOR_STATE:
+            INDICATOR_STATE[symbol] = value
+            WARM_STATE_STATS["restored"] += 1
+        else:
+            WARM_STATE_STATS["discarded"] += 1
+
+async def restore_warm_state() -> None:
+    """Index persisted keys and republish the last scan snapshot; entries themselves load lazily"""
+    loop = asyncio.get_event_loop()
+    try:
+        keys, snapshot_payload = await loop.run_in_executor(executor, load_warm_state_index)
+    except Exception as e:
+        logger.error(f"Warm state unavailable, starting cold: {str(e)}")
+        return
+
+    # warm_restore skips keys already written since startup, which are newer than anything on disk
+    WARM_STATE_KEYS.update(keys)
+    if snapshot_payload is not None:
+        try:
+            await adopt_persisted_snapshot(pickle.loads(snapshot_payload))
+        except Exception as e:
+            logger.warning(f"Persisted scan snapshot could not be restored: {str(e)}")
+    logger.info(f"Warm state indexed: {len(WARM_STATE_KEYS)} entries restorable on demand, "
+                f"snapshot {'v' + str(SCAN_SNAPSHOT.version) if SCAN_SNAPSHOT else 'not'} restored")
+
+def get_shared_cache_connection() -> sqlite3.Connection:
+    """Open a connection to the cross-worker L2 cache (one per call, thread safe)"""
+    conn = sqlite3.connect(SHARED_CACHE_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def init_shared_cache() -> None:
+    """Create the L2 cache schema: entries, refresh leases and per-worker statistics"""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    with closing(get_shared_cache_connection()) as conn, conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS shared_cache (
+                key TEXT PRIMARY KEY,
+                payload BLOB NOT NULL,
+                timestamp REAL NOT NULL,
+                stale_until REAL NOT NULL,
+                writer TEXT NOT NULL,
+                format INTEGER
+            )
+        """)
+        # Caches created before payloads were versioned; their rows are never read and expire in place
+        if "format" not in {column for _, column, *_ in conn.execute("PRAGMA table_info(shared_cache)")}:
+            conn.execute("ALTER TABLE shared_cache ADD COLUMN format INTEGER")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS refresh_leases (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS worker_stats (
+                worker TEXT PRIMARY KEY,
+                stats TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+def read_shared_entries(newer_than: Dict[str, float]) -> Dict[str, Dict]:
+    """Read and unpickle L2 entries newer than the given timestamps (blocking; run in the executor)
+
+    Only rows in SHARED_CACHE_FORMAT are read. A row that still fails to unpickle is skipped
+    and deleted, so one bad payload neither fails the whole batch nor is read again.
+    """
+    entries, unreadable = {}, []
+    now = time.time()
+    with closing(get_shared_cache_connection()) as conn:
+        for key, timestamp in newer_than.items():
+            row = conn.execute(
+                "SELECT payload, timestamp FROM shared_cache WHERE key = ? AND format = ? AND timestamp > ? AND stale_until > ?",
+                (key, SHARED_CACHE_FORMAT, timestamp, now)
+            ).fetchone()
+            if row is None:
+                continue
+            try:
+                entries[key] = pickle.loads(row[0])
+            except Exception as e:
+                logger.warning(f"Discarding unreadable shared cache entry {key}: {str(e)}")
+                unreadable.append((key, row[1]))
+        if unreadable:
+            # Matched on timestamp so an entry another worker wrote meanwhile survives
+            with conn:
+                conn.executemany("DELETE FROM shared_cache WHERE key = ? AND timestamp = ?", unreadable)
+    return entries
+
+async def load_shared_entries(keys: List[str], record: bool = True) -> None:
+    """Pull newer entries for keys from the L2 cache into L1 (called on L1 misses or stale hits)"""
+    if not keys:
+        return
+    newer_than = {key: (STOCK_DATA_CACHE.get(key) or {}).get('timestamp', 0) for key in keys}
+    try:
+        entries = await asyncio.get_event_loop().run_in_executor(executor, read_shared_entries, newer_than)
+    except Exception as e:
+        logger.warning(f"Shared cache read failed for {len(keys)} keys: {str(e)}")
+        entries = {}
+
+    for key in keys:
+        entry = entries.get(key)
+        if record:
+            SHARED_CACHE_STATS["l2_hits" if entry is not None else "l2_misses"] += 1
+        # This worker may have cached something newer while the read ran
+        current = STOCK_DATA_CACHE.get(key)
+        if entry is not None and entry['timestamp'] > (current or {}).get('timestamp', 0):
+            STOCK_DATA_CACHE[key] = entry
+
+def write_shared_entry(key: str, payload: bytes, timestamp: float, stale_until: float) -> bool:
+    """Publish one entry to the L2 cache unless another worker already wrote a newer one; False on failure"""
+    try:
+        with closing(get_shared_cache_connection()) as conn, conn:
+            conn.execute("""
+                INSERT INTO shared_cache VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET payload = excluded.payload, timestamp = excluded.timestamp,
+                    stale_until = excluded.stale_until, writer = excluded.writer, format = excluded.format
+                WHERE excluded.timestamp > shared_cache.timestamp OR shared_cache.format IS NOT excluded.format
+            """, (key, payload, timestamp, stale_until, WORKER_ID, SHARED_CACHE_FORMAT))
+        return True
+    except Exception as e:
+        logger.warning(f"Shared cache write failed for {key}: {str(e)}")
+        return False
+
+def record_shared_write(write: asyncio.Future) -> None:
+    """Count a finished L2 write; runs on the event loop, which owns SHARED_CACHE_STATS"""
+    if not write.cancelled():
+        SHARED_CACHE_STATS["l2_writes" if write.result() else "l2_write_failures"] += 1
+
+def queue_shared_write(key: str, payload: bytes, timestamp: float, stale_until: float) -> None:
+    """Write an entry to L2 on the executor and count the outcome back on the calling loop"""
+    write = executor.submit(write_shared_entry, key, payload, timestamp, stale_until)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return  # Called outside a running loop (scripts, tests): the write still happens
+    asyncio.wrap_future(write, loop=loop).add_done_callback(record_shared_write)
+
+def acquire_refresh_leases(keys: List[str]) -> set:
+    """Take the refresh lease for every key no other worker holds; returns the keys acquired"""
+    if not SHARED_CACHE_ENABLED or not keys:
+        return set(keys)
+    now = time.time()
+    try:
+        with closing(get_shared_cache_connection()) as conn, conn:
+            conn.execute("DELETE FROM refresh_leases WHERE expires_at <= ?", (now,))
+            conn.executemany("INSERT OR IGNORE INTO refresh_leases VALUES (?, ?, ?)",
+                             [(key, WORKER_ID, now + SHARED_CACHE_LEASE_SECONDS) for key in keys])
+            placeholders = ",".join("?" for _ in keys)
+            acquired = {key for (key,) in conn.execute(
+                f"SELECT key FROM refresh_leases WHERE owner = ? AND key IN ({placeholders})", [WORKER_ID, *keys]
+            )}
+    except sqlite3.Error as e:
+        # Without the shared store every worker refreshes for itself
+        logger.warning(f"Refresh leases unavailable: {str(e)}")
+        return set(keys)
+    SHARED_CACHE_STATS["leases_acquired"] += len(acquired)
+    return acquired
+
+def release_refresh_leases(keys) -> None:
+    """Release leases this worker holds"""
+    if not SHARED_CACHE_ENABLED or not keys:
+        return
+    try:
+        with closing(get_shared_cache_connection()) as conn, conn:
+            conn.executemany("DELETE FROM refresh_leases WHERE key = ? AND owner = ?",
+                             [(key, WORKER_ID) for key in keys])
+    except sqlite3.Error as e:
+        logger.warning(f"Refresh lease release failed: {str(e)}")
+
+def refresh_lease_held(key: str) -> bool:
+    """Whether another worker currently holds the refresh lease for key"""
+    with closing(get_shared_cache_connection()) as conn:
+        row = conn.execute("SELECT 1 FROM refresh_leases WHERE key = ? AND owner != ? AND expires_at > ?",
+                           (key, WORKER_ID, time.time())).fetchone()
+    return row is not None
+
+def renew_background_lease() -> bool:
+    """Take the background lease if it is free or has lapsed, or extend it if this worker holds it"""
+    if not SHARED_CACHE_ENABLED:
+        return True
+    now = time.time()
+    try:
+        with closing(get_shared_cache_connection()) as conn, conn:
+            conn.execute("DELETE FROM refresh_leases WHERE key = ? AND expires_at <= ?", (BACKGROUND_LEASE_KEY, now))
+            conn.execute("""
+                INSERT INTO refresh_leases VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET expires_at = excluded.expires_at
+                WHERE refresh_leases.owner = excluded.owner
+            """, (BACKGROUND_LEASE_KEY, WORKER_ID, now + BACKGROUND_LEASE_SECONDS))
+            row = conn.execute("SELECT owner FROM refresh_leases WHERE key = ?", (BACKGROUND_LEASE_KEY,)).fetchone()
+    except sqlite3.Error as e:
+        # Without the shared store every worker runs its own background work
+        logger.warning(f"Background lease unavailable: {str(e)}")
+        return True
+    return row is not None and row[0] == WORKER_ID
+
+def set_background_lease(held: bool) -> None:
+    """Record whether this worker holds the background lease, logging hand-overs"""
+    if held != BACKGROUND_LEASE["held"]:
+        logger.info(f"Worker {WORKER_ID} {'took' if held else 'lost'} the background lease")
+        BACKGROUND_LEASE.update(held=held, since=time.time())
+
+async def background_lease_keeper():
+    """Background task that renews this worker's background lease, or takes it over once it lapses"""
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            set_background_lease(await loop.run_in_executor(executor, renew_background_lease))
+        except Exception as e:
+            logger.error(f"Background lease renewal error: {str(e)}")
+        await asyncio.sleep(BACKGROUND_LEASE_SECONDS / 3)
+
+async def wait_for_shared_entry(symbol: str) -> Optional[Dict]:
+    """Wait for the worker holding symbol's lease to publish fresh data; None if it gives up"""
+    key = f"stock_{symbol}"
+    loop = asyncio.get_event_loop()
+    SHARED_CACHE_STATS["lease_waits"] += 1
+    deadline = time.time() + SHARED_CACHE_LEASE_SECONDS
+    while time.time() < deadline:
+        await load_shared_entries([key], record=False)
+        entry = STOCK_DATA_CACHE.get(key)
+        if is_cache_valid(entry):
+            SHARED_CACHE_STATS["lease_wait_hits"] += 1
+            return entry['data'].with_cache_info(data_age_seconds=round(cache_entry_age(entry), 1), cache_status="fresh")
+        try:
+            if not await loop.run_in_executor(executor, refresh_lease_held, key):
+                break
+        except sqlite3.Error:
+            break
+        await asyncio.sleep(SHARED_CACHE_POLL_SECONDS)
+    SHARED_CACHE_STATS["lease_wait_timeouts"] += 1
+    return None
+
+async def leased_fetch(symbol: str, fetch) -> Optional[Dict]:
+    """Run fetch() only if this worker wins symbol's refresh lease, else reuse the holder's result"""
+    key = f"stock_{symbol}"
+    loop = asyncio.get_event_loop()
+    owned = await loop.run_in_executor(executor, acquire_refresh_leases, [key])
+    if not owned:
+        shared = await wait_for_shared_entry(symbol)
+        if shared is not None:
+            return shared
+    try:
+        return await fetch()
+    finally:
+        if owned:
+            await loop.run_in_executor(executor, release_refresh_leases, owned)
+
+def publish_worker_cache_stats() -> None:
+    """Record this worker's L1/L2 hit statistics so any worker can report all of them"""
+    l1 = STOCK_DATA_CACHE.stats()
+    stats = {
+        "l1": {key: l1[key] for key in ("entries", "bytes", "hit_ratio", "evictions")},
+        "l2": dict(SHARED_CACHE_STATS)
+    }
+    with closing(get_shared_cache_connection()) as conn, conn:
+        conn.execute("INSERT OR REPLACE INTO worker_stats VALUES (?, ?, ?)", (WORKER_ID, json.dumps(stats), time.time()))
+
+def load_worker_cache_stats() -> Dict[str, Dict]:
+    """Latest published cache statistics of every worker seen in the last hour"""
+    with closing(get_shared_cache_connection()) as conn:
+        rows = conn.execute("SELECT worker, stats, updated_at FROM worker_stats WHERE updated_at > ?",
+                            (time.time() - 3600,)).fetchall()
+    return {
+        worker: {**json.loads(stats), "updated_at": datetime.fromtimestamp(updated_at, timezone.utc).isoformat()}
+        for worker, stats, updated_at in rows
+    }
+
+def clear_shared_cache() -> int:
+    """Delete every L2 entry (all workers see the cache as empty afterwards)"""
+    with closing(get_shared_cache_connection()) as conn, conn:
+        return conn.execute("DELETE FROM shared_cache").rowcount
+
+def prune_shared_cache() -> int:
+    """Delete L2 entries past their hard TTL and leases that have expired"""
+    now = time.time()
+    with closing(get_shared_cache_connection()) as conn, conn:
+        deleted = conn.execute("DELETE FROM shared_cache WHERE stale_until <= ?", (now,)).rowcount
+        conn.execute("DELETE FROM refresh_leases WHERE expires_at <= ?", (now,))
+    return deleted
+
+async def ensure_mongo_cache_indexes() -> None:
+    """TTL index on purge_at plus the (symbol, as_of) index used by the batch reads"""
+    for collection in (db.analysis_cache, db.ohlcv_segments):
+        await collection.create_index([("purge_at", ASCENDING)], expireAfterSeconds=0)
+        await collection.create_index([("symbol", ASCENDING), ("as_of", DESCENDING)])
+
+def bson_document(value: Dict) -> Dict:
+    """Plain BSON-safe copy of an analysis dict (numpy scalars unwrapped, tuples as lists)"""
+    return json.loads(json.dumps(value, default=_json_default))
+
+def queue_mongo_cache_write(symbol: str, entry: Dict) -> None:
+    """Buffer a symbol's analysis document and OHLCV segment; full buffers are flushed in the background.
+
+    Both are plain documents keyed by symbol, so each write replaces the symbol's previous
+    one instead of adding another year of bars, and a read never deserialises code.
+    """
+    data = entry['data']
+    as_of = datetime.fromtimestamp(entry['timestamp'], timezone.utc)
+    analysis = {
+        "_id": symbol,
+        "symbol": symbol,
+        "as_of": as_of,
+        "expires_at": entry['expires_at'],
+        "stale_until": entry['stale_until'],
+        "purge_at": datetime.fromtimestamp(entry['stale_until'], timezone.utc),
+        "summary": bson_document(data.summary),
+        "info": bson_document(data.info)
+    }
+    dates = data.dates.tz_localize(None) if getattr(data.dates, 'tz', None) is not None else data.dates
+    segment = {
+        "_id": symbol,
+        "symbol": symbol,
+        "as_of": as_of,
+        "purge_at": as_of + timedelta(days=MONGO_OHLCV_SEGMENT_TTL_DAYS),
+        "dates": list(dates.strftime("%Y-%m-%d")),
+        **{field: data.ohlcv[:, i].tolist() for i, field in enumerate(UNIVERSE_FIELDS)}
+    }
+    MONGO_CACHE_PENDING[symbol] = (analysis, segment)
+    if len(MONGO_CACHE_PENDING) >= MONGO_CACHE_WRITE_BATCH:
+        spawn_background_task(flush_mongo_cache_writes())
+
+async def flush_mongo_cache_writes() -> None:
+    """Upsert buffered documents with one unordered bulk write per collection"""
+    if not MONGO_CACHE_PENDING:
+        return
+    pending = list(MONGO_CACHE_PENDING.values())
+    MONGO_CACHE_PENDING.clear()
+    try:
+        await asyncio.wait_for(asyncio.gather(
+            db.analysis_cache.bulk_write(
+                [ReplaceOne({"_id": analysis["_id"]}, analysis, upsert=True) for analysis, _ in pending], ordered=False
+            ),
+            db.ohlcv_segments.bulk_write(
+                [ReplaceOne({"_id": segment["_id"]}, segment, upsert=True) for _, segment in pending], ordered=False
+            )
+        ), MONGO_CACHE_TIMEOUT * 5)
+        MONGO_CACHE_STATS["writes"] += len(pending)
+        MONGO_CACHE_STATS["write_batches"] += 1
+    except Exception as e:
+        MONGO_CACHE_STATS["write_failures"] += 1
+        logger.warning(f"Mongo cache write of {len(pending)} documents failed: {str(e)}")
+
+async def load_mongo_cache(symbols: List[str]) -> int:
+    """Pull the latest usable analyses for a batch of L1 misses with one $in query per collection"""
+    now = time.time()
+    wanted = [s for s in symbols if not is_cache_valid(STOCK_DATA_CACHE.get(f"stock_{s}"))]
+    if not wanted:
+        return 0
+
+    MONGO_CACHE_STATS["reads"] += 1
+    try:
+        # Documents from before the plain-BSON format carry a pickled payload and are never read
+        analyses = await asyncio.wait_for(
+            db.analysis_cache.find(
+                {"symbol": {"$in": wanted}, "stale_until": {"$gt": now}, "summary": {"$exists": True}}, {"_id": 0}
+            ).sort([("symbol", ASCENDING), ("as_of", DESCENDING)]).to_list(None),
+            MONGO_CACHE_TIMEOUT
+        )
+        latest = {}
+        for doc in analyses:
+            latest.setdefault(doc["symbol"], doc)
+        segments = await asyncio.wait_for(
+            db.ohlcv_segments.find(
+                {"symbol": {"$in": list(latest)}, "as_of": {"$in": [doc["as_of"] for doc in latest.values()]}},
+                {"_id": 0}
+            ).to_list(None),
+            MONGO_CACHE_TIMEOUT
+        ) if latest else []
+    except Exception as e:
+        MONGO_CACHE_STATS["read_failures"] += 1
+        logger.warning(f"Mongo cache read for {len(wanted)} symbols failed: {str(e)}")
+        return 0
+
+    segments_by_key = {(doc["symbol"], doc["as_of"]): doc for doc in segments}
+    loaded = 0
+    for symbol, doc in latest.items():
+        segment = segments_by_key.get((symbol, doc["as_of"]))
+        key = f"stock_{symbol}"
+        current = STOCK_DATA_CACHE.get(key)
+        timestamp = doc["as_of"].replace(tzinfo=timezone.utc).timestamp()
+        if segment is None or (current and current.get('timestamp', 0) >= timestamp):
+            continue
+        summary, info = doc["summary"], doc["info"]
+        ohlcv = np.column_stack([np.asarray(segment[field], dtype=np.float64) for field in UNIVERSE_FIELDS])
+        dates = pd.DatetimeIndex(pd.to_datetime(segment["dates"]), name='Date')
+        STOCK_DATA_CACHE[key] = {
+            'data': CompactStockEntry.from_columns(summary, dates, ohlcv, info),
+            'timestamp': timestamp,
+            'expires_at': doc["expires_at"],
+            'stale_until': doc["stale_until"]
+        }
+        loaded += 1
+
+    MONGO_CACHE_STATS["hits"] += loaded
+    MONGO_CACHE_STATS["misses"] += len(wanted) - loaded
+    return loaded
+
+async def clear_mongo_cache() -> int:
+    """Drop buffered writes and every stored analysis and OHLCV segment; returns the analyses deleted"""
+    MONGO_CACHE_PENDING.clear()
+    analyses, _ = await asyncio.wait_for(asyncio.gather(
+        db.analysis_cache.delete_many({}),
+        db.ohlcv_segments.delete_many({})
+    ), MONGO_CACHE_TIMEOUT * 5)
+    return analyses.deleted_count
+
+def get_ohlcv_connection() -> sqlite3.Connection:
+    """Open a connection to the on-disk OHLCV store (one per call, thread safe)"""
+    conn = sqlite3.connect(OHLCV_STORE_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+def init_ohlcv_store() -> None:
+    """Create the OHLCV store schema if it does not exist yet"""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    with closing(get_ohlcv_connection()) as conn, conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ohlcv (
+                symbol TEXT NOT NULL,
+                date TEXT NOT NULL,
+                open REAL, high REAL, low REAL, close REAL, volume REAL,
+                PRIMARY KEY (symbol, date)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS fundamentals (
+                symbol TEXT PRIMARY KEY,
+                info TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS symbol_failures (
+                symbol TEXT PRIMARY KEY,
+                state TEXT NOT NULL
+            )
+        """)
+
+def store_history(symbol: str, hist: pd.DataFrame, replace: bool = False) -> int:
+    """Upsert daily bars for a symbol; re-written dates replace partial intraday bars.
+
+    With replace, the symbol's stored bars are dropped first: used when the provider has
+    re-adjusted the whole history for a split or dividend.
+    """
+    if hist is None or hist.empty:
+        return 0
+
+    index = hist.index.tz_localize(None) if getattr(hist.index, 'tz', None) is not None else hist.index
+    rows = [
+        (symbol, day, *(None if pd.isna(v) else float(v) for v in values))
+        for day, values in zip(index.strftime("%Y-%m-%d"), hist[OHLCV_COLUMNS].itertuples(index=False))
+    ]
+
+    with closing(get_ohlcv_connection()) as conn, conn:
+        if replace:
+            conn.execute("DELETE FROM ohlcv WHERE symbol = ?", (symbol,))
+        conn.executemany("INSERT OR REPLACE INTO ohlcv VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    return len(rows)
+
+def load_stored_history(symbol: str, since: Optional[str] = None) -> pd.DataFrame:
+    """Read a symbol's stored daily bars (optionally from a YYYY-MM-DD date) without touching the network"""
+    query = "SELECT date, open, high, low, close, volume FROM ohlcv WHERE symbol = ?"
+    params = [symbol]
+    if since:
+        query += " AND date >= ?"
+        params.append(since)
+    query += " ORDER BY date"
+
+    with closing(get_ohlcv_connection()) as conn:
+        rows = conn.execute(query, params).fetchall()
+
+    hist = pd.DataFrame(rows, columns=['Date'] + OHLCV_COLUMNS)
+    hist['Date'] = pd.to_datetime(hist['Date'])
+    return hist.set_index('Date')
+
+def get_reference_bars(symbols: List[str]) -> Dict[str, Tuple[str, Optional[float]]]:
+    """Get the newest settled stored bar (YYYY-MM-DD date, close) for each symbol that has history.
+
+    That is the bar before the latest one, which may still be a partial intraday bar (the
+    latest one when only one is stored). Incremental fetches start from it, so the provider's
+    copy can be compared with the stored one.
+    """
+    if not symbols:
+        return {}
+
+    placeholders = ",".join("?" for _ in symbols)
+    with closing(get_ohlcv_connection()) as conn:
+        rows = conn.execute(
+            f"""SELECT symbol, date, close FROM (
+                    SELECT symbol, date, close, ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY date DESC) AS age
+                    FROM ohlcv WHERE symbol IN ({placeholders})
+                ) WHERE age <= 2 ORDER BY symbol, age""",
+            symbols
+        ).fetchall()
+
+    # The older of the (at most) two rows per symbol wins
+    return {symbol: (day, close) for symbol, day, close in rows}
+
+def history_rebased(reference: Tuple[str, Optional[float]], new_bars: Optional[pd.DataFrame]) -> bool:
+    """True when the provider's copy of a stored settled bar has a different close.
+
+    Downloads are split and dividend adjusted, so after a corporate action every earlier
+    bar moves; appending new bars to the stored ones would mix two price bases.
+    """
+    day, close = reference
+    if new_bars is None or new_bars.empty or close is None:
+        return False
+
+    index = new_bars.index.tz_localize(None) if getattr(new_bars.index, 'tz', None) is not None else new_bars.index
+    fetched = new_bars['Close'].to_numpy()[index.strftime("%Y-%m-%d") == day]
+    if not len(fetched) or pd.isna(fetched[0]):
+        return False
+    return not math.isclose(fetched[0], close, rel_tol=OHLCV_REBASE_TOLERANCE)
+
+def forget_indicator_state(symbol: str) -> None:
+    """Drop a symbol's incremental indicator state so it is re-seeded from the re-adjusted history"""
+    INDICATOR_STATE.pop(symbol, None)
+    WARM_STATE_KEYS.discard(f"indicator_{symbol}")
+
+def store_fundamentals(symbol: str, info: Dict, fetched_at: float) -> None:
+    """Upsert a symbol's trimmed fundamentals"""
+    with closing(get_ohlcv_connection()) as conn, conn:
+        conn.execute("INSERT OR REPLACE INTO fundamentals VALUES (?, ?, ?)",
+                     (symbol, json.dumps(info, default=_json_default), fetched_at))
+
+def load_stored_fundamentals(symbol: str) -> Optional[Dict]:
+    """Read a symbol's stored fundamentals entry ({'info', 'fetched_at'}) without touching the network"""
+    with closing(get_ohlcv_connection()) as conn:
+        row = conn.execute("SELECT info, fetched_at FROM fundamentals WHERE symbol = ?", (symbol,)).fetchone()
+    return {"info": json.loads(row[0]), "fetched_at": row[1]} if row else None
+
+def fundamentals_expire_at(fetched_at: float) -> float:
+    """Daily schedule: fundamentals stay current until the first pre-open after the minimum TTL"""
+    earliest = fetched_at + FUNDAMENTALS_MIN_TTL_HOURS * 3600
+    return max(earliest, next_market_open(datetime.fromtimestamp(fetched_at, IST)).timestamp())
+
+def store_symbol_failure(symbol: str, state: Optional[Dict]) -> None:
+    """Upsert a symbol's negative-cache state, or delete it when state is None"""
+    try:
+        with closing(get_ohlcv_connection()) as conn, conn:
+            if state is None:
+                conn.execute("DELETE FROM symbol_failures WHERE symbol = ?", (symbol,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO symbol_failures VALUES (?, ?)", (symbol, json.dumps(state)))
+    except Exception as e:
+        logger.warning(f"Negative cache write failed for {symbol}: {str(e)}")
+
+def load_symbol_failures() -> Dict[str, Dict]:
+    """Read every persisted negative-cache entry so quarantines survive restarts"""
+    with closing(get_ohlcv_connection()) as conn:
+        rows = conn.execute("SELECT symbol, state FROM symbol_failures").fetchall()
+    states = {symbol: json.loads(state) for symbol, state in rows}
+    # Entries written before not-found confirmation counted bare empty frames; let them re-probe
+    return {symbol: state for symbol, state in states.items() if "not_found" in state}
+
+def record_symbol_failure(symbol: str, reason: str, not_found: bool) -> None:
+    """Back a failing symbol off exponentially; repeated confirmed not-found responses quarantine it.
+
+    Only failures that say something about the symbol belong here: timeouts, throttling and
+    open circuits are the provider's problem and are handled by the retry budget and breakers.
+    An empty frame alone is not a not-found: yfinance also returns one for throttled or
+    expired sessions, so it only backs the symbol off.
+    """
+    now = time.time()
+    state = SYMBOL_FAILURES.get(symbol) or {"failures": 0, "not_found": 0, "first_failure": now, "quarantined": False}
+    state["failures"] += 1
+    state["not_found"] = state["not_found"] + 1 if not_found else 0
+    state["reason"] = reason
+    state["last_failure"] = now
+
+    # A quarantined symbol stays quarantined until it returns data; failed probes keep the daily schedule
+    if state["quarantined"] or state["not_found"] >= QUARANTINE_AFTER_NOT_FOUND:
+        if not state["quarantined"]:
+            NEGATIVE_CACHE_STATS["quarantined"] += 1
+            logger.warning(f"Quarantining {symbol} after {state['not_found']} not-found responses: {reason}")
+        state["quarantined"] = True
+        delay = NEGATIVE_CACHE_MAX_SECONDS
+    else:
+        delay = min(NEGATIVE_CACHE_BASE_SECONDS * 2 ** (state["failures"] - 1), NEGATIVE_CACHE_MAX_SECONDS)
+    state["retry_at"] = now + delay
+
+    SYMBOL_FAILURES[symbol] = state
+    NEGATIVE_CACHE_STATS["failures"] += 1
+    negative_cache_writer.submit(store_symbol_failure, symbol, dict(state))
+
+def record_symbol_success(symbol: str) -> None:
+    """Forget a symbol's failures once it returns data again"""
+    state = SYMBOL_FAILURES.pop(symbol, None)
+    if state is None:
+        return
+    NEGATIVE_CACHE_STATS["recovered"] += 1
+    if state["quarantined"]:
+        logger.info(f"{symbol} returned data again, lifting its quarantine")
+    negative_cache_writer.submit(store_symbol_failure, symbol, None)
+
+def symbol_blocked(symbol: str) -> bool:
+    """True while a failing symbol waits for its next re-probe; checked before any network I/O"""
+    state = SYMBOL_FAILURES.get(symbol)
+    if state is None or time.time() >= state["retry_at"]:
+        return False
+    NEGATIVE_CACHE_STATS["skipped"] += 1
+    return True
+
+def symbol_quarantined(symbol: str) -> bool:
+    """True while a quarantined symbol is not yet due for its daily re-probe"""
+    state = SYMBOL_FAILURES.get(symbol)
+    return bool(state and state["quarantined"] and time.time() < state["retry_at"])
+
+def history_window_start() -> str:
+    """First date (YYYY-MM-DD) of the rolling window served to the analysis pipeline"""
+    return (datetime.now() - timedelta(days=OHLCV_HISTORY_DAYS)).strftime("%Y-%m-%d")
+
+async def fetch_history_incremental(symbol: str) -> pd.DataFrame:
+    """Serve history from the local store, downloading only bars after the last stored date"""
+    loop = asyncio.get_event_loop()
+    ticker = yf.Ticker(f"{symbol}.NS")
+    window_start = history_window_start()
+
+    try:
+        reference = (await loop.run_in_executor(executor, get_reference_bars, [symbol])).get(symbol)
+    except sqlite3.Error as e:
+        logger.warning(f"OHLCV store unavailable, fetching {symbol} history directly: {str(e)}")
+        return await call_upstream(symbol, "history", ticker.history, period="1y", raise_errors=True)
+
+    incremental = bool(reference and reference[0] >= window_start)
+    rebased = False
+    if incremental:
+        # Re-fetch from the last settled day, so a partial intraday bar gets finalised and
+        # a re-adjusted history shows up as a changed overlapping bar
+        try:
+            new_bars = await call_upstream(symbol, "history", ticker.history, start=reference[0])
+        except Exception as e:
+            # Serve the stored (possibly stale) bars rather than failing the request
+            logger.warning(f"History refresh failed for {symbol}, serving stored bars: {str(e)}")
+            new_bars = None
+        if history_rebased(reference, new_bars):
+            logger.info(f"{symbol} history was re-adjusted upstream, replacing stored bars")
+            new_bars = await call_upstream(symbol, "history", ticker.history, period="1y", raise_errors=True)
+            rebased = True
+            forget_indicator_state(symbol)
+    else:
+        new_bars = await call_upstream(symbol, "history", ticker.history, period="1y", raise_errors=True)
+
+    try:
+        if new_bars is not None and not new_bars.empty:
+            await loop.run_in_executor(executor, store_history, symbol, new_bars, rebased)
+        return await loop.run_in_executor(executor, load_stored_history, symbol, window_start)
+    except sqlite3.Error as e:
+        logger.warning(f"OHLCV store write failed for {symbol}: {str(e)}")
+        if incremental:
+            return await call_upstream(symbol, "history", ticker.history, period="1y", raise_errors=True)
+        return new_bars
+
+async def get_fundamentals(symbol: str) -> Tuple[Dict, Optional[Dict]]:
+    """Fundamentals for a symbol from memory, then the store, then the fundamentals lane.
+
+    Returns (trimmed info, live quote): the quote is the full ticker.info when it was
+    fetched by this call, else None. Expired entries are served while a background
+    refresh runs, so the daily rollover never stalls a scan behind the slow lane.
+    """
+    entry = FUNDAMENTALS_CACHE.get(symbol)
+    if entry is None:
+        loop = asyncio.get_event_loop()
+        try:
+            entry = await loop.run_in_executor(executor, load_stored_fundamentals, symbol)
+        except sqlite3.Error as e:
+            logger.warning(f"Fundamentals store unavailable for {symbol}: {str(e)}")
+        if entry is not None:
+            FUNDAMENTALS_CACHE[symbol] = entry
+            FUNDAMENTALS_STATS["store_hits"] += 1
+    else:
+        FUNDAMENTALS_STATS["memory_hits"] += 1
+
+    if entry is not None:
+        if time.time() >= fundamentals_expire_at(entry["fetched_at"]):
+            FUNDAMENTALS_STATS["stale_served"] += 1
+            spawn_background_task(single_flight(f"fundamentals:{symbol}", partial(refresh_fundamentals, symbol, entry)))
+        return entry["info"], None
+
+    return await single_flight(f"fundamentals:{symbol}", partial(refresh_fundamentals, symbol, entry))
+
+async def refresh_fundamentals(symbol: str, previous: Optional[Dict] = None) -> Tuple[Dict, Optional[Dict]]:
+    """Fetch ticker.info on the fundamentals lane and persist the fields the analysis uses"""
+    ticker = yf.Ticker(f"{symbol}.NS")
+    try:
+        quote = await call_upstream(symbol, "fundamentals", lambda: ticker.info)
+    except Exception as e:
+        FUNDAMENTALS_STATS["refresh_failures"] += 1
+        logger.warning(f"Fundamentals fetch failed for {symbol}, using {'stored' if previous else 'no'} fundamentals: {str(e)}")
+        return (previous["info"] if previous else {}), None
+
+    FUNDAMENTALS_STATS["refreshes"] += 1
+    entry = {
+        "info": {field: quote[field] for field in STOCK_INFO_FIELDS if quote.get(field) is not None},
+        "fetched_at": time.time()
     }
+    FUNDAMENTALS_CACHE[symbol] = entry
+    try:
+        await asyncio.get_event_loop().run_in_executor(executor, store_fundamentals, symbol, entry["info"], entry["fetched_at"])
+    except sqlite3.Error as e:
+        logger.warning(f"Fundamentals store write failed for {symbol}: {str(e)}")
+    return entry["info"], quote
+
+def record_upstream_call(symbol: str, kind: str, count: int = 1, retry: bool = False) -> None:
+    """Count outbound market-data requests against a symbol and call kind.
+
+    Retried requests were already paid for from the retry budget, so they do not also
+    raise the request count that budget is sized from.
+    """
+    global request_count
+
+    request_count += count
+    if not retry:
+        for _ in range(count):
+            RETRY_BUDGET.record_request()
+    UPSTREAM_CALL_STATS["by_kind"][kind] = UPSTREAM_CALL_STATS["by_kind"].get(kind, 0) + count
+    symbol_calls = UPSTREAM_CALL_STATS["by_symbol"].setdefault(symbol, {})
+    symbol_calls[kind] = symbol_calls.get(kind, 0) + count
+
+async def call_upstream(symbol: str, kind: str, func, *args, cost: int = 1,
+                        call_timeout: Optional[float] = None, **kwargs):
+    """Run a blocking market-data call in the upstream thread pool, paced by its provider's token
+    bucket and bounded by its provider's adaptive concurrency window.
+
+    cost is the number of HTTP requests the call makes (e.g. one per ticker for a bulk
+    download); the token bucket and call statistics are charged that many. call_timeout
+    overrides UPSTREAM_CALL_TIMEOUT for calls that make several requests in a row. A retry
+    (see rate_limited_request) skips the token bucket, since the retry budget already paid for it.
+
+    A call that times out or is cancelled keeps its concurrency slot until its thread returns,
+    since the thread cannot be stopped and is still talking to the provider. A multi-request
+    call that outlives its own timeout, or gives up on a local wait, is a 'local_timeout': it
+    says nothing about the provider, so it neither shrinks the window nor trips the breaker.
+    """
+    provider = upstream_provider(kind)
+    breaker = UPSTREAM_BREAKERS[provider]
+    if not breaker.allow():
+        raise UpstreamUnavailableError(f"{provider} circuit is open")
+
+    limiter = UPSTREAM_LIMITERS[provider]
+    try:
+        await limiter.acquire()
+    except asyncio.CancelledError:
+        breaker.record("cancelled")
+        raise
+
+    started = None
+    outcome = "cancelled"
+    call = None
+    retry = UPSTREAM_RETRYING.get() is asyncio.current_task()
+    try:
+        if not retry:
+            await UPSTREAM_BUCKETS[provider].acquire(cost)
+        record_upstream_call(symbol, kind, cost, retry=retry)
+        started = time.monotonic()
+        call = upstream_executor.submit(func, *args, **kwargs)
+        result = await asyncio.wait_for(asyncio.wrap_future(call), call_timeout or UPSTREAM_CALL_TIMEOUT)
+        outcome = "ok"
+        return result
+    except Exception as e:
+        outcome = classify_upstream_error(e)
+        if outcome == "timeout" and cost > 1 and call is not None and not call.done():
+            outcome = "local_timeout"
+        raise
+    finally:
+        breaker.record(outcome)
+        latency = time.monotonic() - started if started else 0.0
+        if call is None or call.done():
+            limiter.release(latency, outcome)
+        else:
+            loop = asyncio.get_event_loop()
+
+            def _release_when_returned(_):
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(limiter.release, latency, outcome)
+
+            call.add_done_callback(_release_when_returned)
+
+class TokenBucket:
+    """Async token bucket: refills at a steady rate up to a burst capacity.
+
+    Waiters queue on an asyncio.Lock, which wakes them in FIFO order, so callers are
+    served first come, first served and the bucket never runs faster than its rate.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+        self.waiting = 0
+        self.acquired = 0  # Tokens handed out
+        self.acquisitions = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent = deque()  # Monotonic acquire times within the last minute
+
+    def _refill(self, now: float, capacity: Optional[float] = None) -> None:
+        self.tokens = min(capacity or self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: int = 1) -> float:
+        """Take `tokens` tokens, waiting in line if the bucket is short; returns the seconds waited.
+
+        A request for more than the burst capacity waits until that many tokens have
+        accrued, so the long-run rate holds for bulk calls too.
+        """
+        self.waiting += 1
+        started = time.monotonic()
+        try:
+            async with self.lock:
+                self._refill(time.monotonic())
+                if self.tokens < tokens:
+                    await asyncio.sleep((tokens - self.tokens) / self.rate)
+                    self._refill(time.monotonic(), max(self.capacity, tokens))
+                self.tokens -= tokens
+        finally:
+            self.waiting -= 1
+
+        now = time.monotonic()
+        waited = now - started
+        self.acquired += tokens
+        self.acquisitions += 1
+        if waited > 0.001:
+            self.throttled += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.recent.extend([now] * tokens)
+        return waited
+
+    def requests_last_minute(self) -> int:
+        cutoff = time.monotonic() - 60
+        while self.recent and self.recent[0] < cutoff:
+            self.recent.popleft()
+        return len(self.recent)
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill(time.monotonic())
+        return {
+            "requests_per_minute_limit": round(self.rate * 60, 2),
+            "burst_capacity": int(self.capacity),
+            "tokens_available": round(self.tokens, 2),
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "requests_last_minute": self.requests_last_minute(),
+            "avg_wait_ms": round(self.total_wait / max(self.acquisitions, 1) * 1000, 1),
+            "max_wait_ms": round(self.max_wait * 1000, 1)
+        }
+
+UPSTREAM_BUCKETS = {
+    provider: TokenBucket(limits["requests_per_minute"], limits["burst"])
+    for provider, limits in UPSTREAM_RATE_LIMITS.items()
+}
+
+class AdaptiveConcurrencyLimiter:
+    """Additive-increase/multiplicative-decrease limit on concurrent outbound calls.
+
+    Every healthy call (no error, latency within the target) grows the window by 1/window,
+    i.e. by one slot per window's worth of calls. Throttling errors and timeouts halve
+    it, at most once per average call latency so one burst of failures counts once;
+    local timeouts leave it alone. Waiters are admitted in FIFO order.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.waiters = deque()
+        self.avg_latency = 0.0
+        self.last_decrease = 0.0
+        self.outcomes = {"ok": 0, "slow": 0, "error": 0, "throttled": 0, "timeout": 0, "local_timeout": 0, "not_found": 0}
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def window(self) -> int:
+        return max(self.minimum, int(self.limit))
+
+    async def acquire(self) -> None:
+        if self.in_flight < self.window and not self.waiters:
+            self.in_flight += 1
+            return
+
+        waiter = asyncio.get_event_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed over just as we were cancelled; pass it on
+                self.in_flight -= 1
+                self._wake()
+            else:
+                self.waiters.remove(waiter)
+            raise
+
+    def release(self, latency: float, outcome: str) -> None:
+        """Return a slot and adapt the window to the call's outcome"""
+        self.in_flight -= 1
+
+        if outcome in ("throttled", "timeout"):
+            now = time.monotonic()
+            if now - self.last_decrease > self.avg_latency:
+                self.limit = max(float(self.minimum), self.limit / 2)
+                self.last_decrease = now
+                self.decreases += 1
+        elif outcome == "ok":
+            self.avg_latency = latency if not self.avg_latency else 0.8 * self.avg_latency + 0.2 * latency
+            if latency > self.latency_target:
+                outcome = "slow"
+            elif self.limit < self.maximum:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+                self.increases += 1
+
+        if outcome in self.outcomes:
+            self.outcomes[outcome] += 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self.waiters and self.in_flight < self.window:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window": self.window,
+            "limit": round(self.limit, 2),
+            "min_window": self.minimum,
+            "max_window": self.maximum,
+            "in_flight": self.in_flight,
+            "waiting": len(self.waiters),
+            "avg_latency_ms": round(self.avg_latency * 1000, 1),
+            "latency_target_ms": round(self.latency_target * 1000),
+            "outcomes": self.outcomes,
+            "increases": self.increases,
+            "decreases": self.decreases
+        }
+
+UPSTREAM_LIMITERS = {
+    provider: AdaptiveConcurrencyLimiter(UPSTREAM_INITIAL_CONCURRENCY, UPSTREAM_MIN_CONCURRENCY,
+                                         UPSTREAM_MAX_CONCURRENCY, UPSTREAM_LATENCY_TARGET)
+    for provider in UPSTREAM_RATE_LIMITS
+}
+
+class UpstreamUnavailableError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+
+class LocalTimeoutError(TimeoutError):
+    """Raised by a call that gave up on a local wait (e.g. for another bulk download) before reaching the provider"""
+
+class CircuitBreaker:
+    """Per-provider circuit breaker: closed -> open after consecutive failures -> half-open probe.
+
+    While open every call fails fast. After CIRCUIT_OPEN_SECONDS a single probe call is let
+    through; its success closes the circuit, its failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int, open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = "half_open"
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, outcome: str) -> None:
+        if outcome in ("ok", "not_found"):
+            self.state = "closed"
+            self.failures = 0
+        elif outcome in ("error", "throttled", "timeout"):
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                    logger.warning(f"Upstream circuit opened after {self.failures} consecutive failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+        self.probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "open_for_seconds": round(time.monotonic() - self.opened_at, 1) if self.state != "closed" else 0,
+            "times_opened": self.times_opened,
+            "rejected_calls": self.rejected
+        }
+
+class RetryBudget:
+    """Caps retries at a fraction of recent upstream requests so failures cannot multiply traffic"""
+
+    def __init__(self, ratio: float, min_per_minute: int):
+        self.ratio = ratio
+        self.min_per_minute = min_per_minute
+        self.requests = deque()
+        self.retries = deque()
+        self.denied = 0
+
+    @staticmethod
+    def _prune(times: deque, now: float) -> int:
+        while times and times[0] < now - 60:
+            times.popleft()
+        return len(times)
+
+    def record_request(self) -> None:
+        self.requests.append(time.monotonic())
+
+    def try_spend(self, cost: int = 1) -> bool:
+        """Spend `cost` retries (a bulk call retries every ticker); allowed while the minute's budget is not used up"""
+        now = time.monotonic()
+        allowed = max(self.min_per_minute, self.ratio * self._prune(self.requests, now))
+        if self._prune(self.retries, now) >= allowed:
+            self.denied += 1
+            return False
+        self.retries.extend([now] * cost)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        requests = self._prune(self.requests, now)
+        return {
+            "ratio": self.ratio,
+            "requests_last_minute": requests,
+            "retries_last_minute": self._prune(self.retries, now),
+            "retries_allowed_per_minute": int(max(self.min_per_minute, self.ratio * requests)),
+            "denied": self.denied
+        }
+
+UPSTREAM_BREAKERS = {
+    provider: CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_OPEN_SECONDS)
+    for provider in UPSTREAM_RATE_LIMITS
+}
+RETRY_BUDGET = RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_MIN_PER_MINUTE)
+
+def circuit_open(provider: Optional[str] = None) -> bool:
+    """True while the provider's circuit (any provider's, if none is given) is not closed"""
+    if provider is not None:
+        return UPSTREAM_BREAKERS[provider].state != "closed"
+    return any(breaker.state != "closed" for breaker in UPSTREAM_BREAKERS.values())
+
+def classify_upstream_error(error: Exception) -> str:
+    """Bucket an upstream failure as 'local_timeout', 'timeout', 'throttled', 'not_found' or a plain 'error'"""
+    if isinstance(error, LocalTimeoutError):
+        return "local_timeout"
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return "timeout"
+    if isinstance(error, YFTickerMissingError):
+        # The provider answered: the ticker has no timezone or prices ("possibly delisted")
+        return "not_found"
+    message = str(error).lower()
+    if ("429" in message or "too many requests" in message or "rate limit" in message
+            or "ratelimit" in type(error).__name__.lower()):
+        return "throttled"
+    if "timed out" in message or "timeout" in type(error).__name__.lower():
+        return "timeout"
+    return "error"
+
+def upstream_provider(kind: str) -> str:
+    return UPSTREAM_KIND_PROVIDERS.get(kind, DEFAULT_UPSTREAM_PROVIDER)
+
+def requests_last_minute() -> int:
+    return sum(bucket.requests_last_minute() for bucket in UPSTREAM_BUCKETS.values())
+
+async def single_flight(key: str, factory):
+    """Run factory() once per key at a time; concurrent callers await the same result.
+
+    Keys are "<kind>:<identity>", e.g. "stock:RELIANCE" or "scan:<filters>". The shared
+    task is shielded so one caller being cancelled does not cancel it for the others; once
+    the last caller awaiting it is cancelled, nobody wants the result and the task is cancelled.
+    """
+    kind = key.split(":", 1)[0]
+    kind_stats = COALESCING_STATS["by_kind"].setdefault(kind, {"leaders": 0, "coalesced": 0})
+
+    task = INFLIGHT_REQUESTS.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        INFLIGHT_REQUESTS[key] = task
+
+        def _release(done, key=key):
+            if INFLIGHT_REQUESTS.get(key) is done:
+                del INFLIGHT_REQUESTS[key]
+
+        task.add_done_callback(_release)
+        COALESCING_STATS["leaders"] += 1
+        kind_stats["leaders"] += 1
+    else:
+        COALESCING_STATS["coalesced"] += 1
+        kind_stats["coalesced"] += 1
+
+    INFLIGHT_WAITERS[task] = INFLIGHT_WAITERS.get(task, 0) + 1
+    try:
+        return await asyncio.shield(task)
+    finally:
+        INFLIGHT_WAITERS[task] -= 1
+        if not INFLIGHT_WAITERS[task]:
+            del INFLIGHT_WAITERS[task]
+            if not task.done():
+                task.cancel()
+                COALESCING_STATS["cancelled"] += 1
 
 async def rate_limited_request(func, *args, **kwargs):
-    """Enhanced rate limiting with exponential backoff and jitter"""
-    global request_count, last_request_time, requests_per_minute
-    
-    current_time = time.time()
-    
-    # Reset counter every minute
-    if current_time - last_request_time > 60:
-        requests_per_minute = 0
-        last_request_time = current_time
-    
-    # Check if we're hitting rate limits (conservative: 30 requests per minute)
-    if requests_per_minute >= 30:
-        wait_time = 60 - (current_time - last_request_time)
-        if wait_time > 0:
-            logger.warning(f"Rate limit reached, waiting {wait_time:.1f} seconds")
-            await asyncio.sleep(wait_time)
-            requests_per_minute = 0
-            last_request_time = time.time()
-    
-    # Add base delay between requests
-    await asyncio.sleep(BATCH_DELAY)
-    
-    # Attempt request with exponential backoff
+    """Retry with exponential backoff and jitter; pacing happens in call_upstream's token buckets.
+
+    Each retry is charged to RETRY_BUDGET at the call's cost (the cost keyword of a wrapped
+    call_upstream, else 1); the upstream calls it makes skip the token buckets, which were
+    already charged for the first attempt.
+    """
+    cost = kwargs.get("cost", 1)
     for attempt in range(MAX_RETRIES):
+        retrying = UPSTREAM_RETRYING.set(asyncio.current_task() if attempt else None)
         try:
-            requests_per_minute += 1
-            result = await func(*args, **kwargs)
-            return result
+            return await func(*args, **kwargs)
         except Exception as e:
-            if attempt == MAX_RETRIES - 1:
+            # Never retry into an open circuit, and stop once the retry budget is spent
+            if attempt == MAX_RETRIES - 1 or isinstance(e, UpstreamUnavailableError) or not RETRY_BUDGET.try_spend(cost):
                 raise e
             
             # Calculate exponential backoff with jitter
@@ -573,50 +2541,284 @@ async def rate_limited_request(func, *args, **kwargs):
             
             logger.warning(f"Request failed (attempt {attempt + 1}/{MAX_RETRIES}), retrying in {total_wait:.2f}s: {str(e)}")
             await asyncio.sleep(total_wait)
-    
-    return None
+        finally:
+            UPSTREAM_RETRYING.reset(retrying)
+
+async def fetch_with_retry(symbol: str, lease_held: bool = False) -> Optional[Dict]:
+    """Fetch stock data with enhanced error handling and retry logic
 
-async def fetch_with_retry(symbol: str) -> Optional[Dict]:
-    """Fetch stock data with enhanced error handling and retry logic"""
-    async def _fetch():
-        return await fetch_comprehensive_stock_data(symbol)
+    With lease_held the caller already holds symbol's refresh lease (e.g. for a whole bulk
+    batch), so it is neither taken again nor released when this fetch ends.
+    """
+    if symbol_blocked(symbol):
+        return None
+    try:
+        fetch = partial(fetch_recording_failures, symbol, retry=True)
+        stock_data = await single_flight(f"stock:{symbol}", fetch if lease_held else partial(leased_fetch, symbol, fetch))
+    except Exception as e:
+        logger.error(f"Failed to fetch data for {symbol}: {str(e)}")
+        stock_data = None
     
+    # Fail fast to expired cached data while upstream is unavailable
+    if not stock_data and circuit_open():
+        return await get_stale_stock_data(symbol)
+    return stock_data
+
+def split_bulk_history(raw: pd.DataFrame, symbols: List[str]) -> Dict[str, pd.DataFrame]:
+    """Split a multi-ticker yf.download frame into per-symbol OHLCV frames"""
+    frames = {}
+
+    if raw is None or raw.empty:
+        return frames
+
+    for symbol in symbols:
+        ticker_symbol = f"{symbol}.NS"
+        try:
+            if isinstance(raw.columns, pd.MultiIndex):
+                if ticker_symbol in raw.columns.get_level_values(0):
+                    frame = raw[ticker_symbol]
+                elif ticker_symbol in raw.columns.get_level_values(1):
+                    frame = raw.xs(ticker_symbol, axis=1, level=1)
+                else:
+                    continue
+            elif len(symbols) == 1:
+                frame = raw
+            else:
+                continue
+
+            # Tickers missing from the response come back as all-NaN rows
+            frame = frame.dropna(subset=['Close'])
+            if not frame.empty:
+                frames[symbol] = frame.copy()
+        except Exception as e:
+            logger.warning(f"Could not split bulk history for {symbol}: {str(e)}")
+
+    return frames
+
+def bulk_call_timeout(tickers: int) -> float:
+    """Timeout for a serial multi-ticker download: the usual call timeout plus every ticker's request timeout"""
+    return UPSTREAM_CALL_TIMEOUT + BULK_DOWNLOAD_TICKER_TIMEOUT * tickers
+
+def download_bulk_history(symbols: List[str], period: str = "1y", start: Optional[str] = None,
+                          timeout: Optional[float] = None) -> Dict[str, pd.DataFrame]:
+    """Download daily history for a chunk of symbols with one multi-ticker call.
+
+    yfinance makes one request per ticker; threads=False keeps them sequential, so the call
+    holds a single slot of the concurrency window it was admitted under. timeout is the
+    caller's budget (bulk_call_timeout by default): waiting for another download may use
+    only what the download itself would not need, so a download never starts, and holds
+    the lock, after its caller has given up.
+    """
+    window = {"start": start} if start else {"period": period}
+    lock_wait = (timeout or bulk_call_timeout(len(symbols))) - BULK_DOWNLOAD_TICKER_TIMEOUT * len(symbols)
+    # yfinance resets and fills yfinance.shared._DFS/_ERRORS on every call; overlapping
+    # downloads would wipe or mix each other's results
+    if not YF_DOWNLOAD_LOCK.acquire(timeout=max(lock_wait, 0.0)):
+        raise LocalTimeoutError(f"Timed out waiting for another bulk download to finish ({len(symbols)} tickers)")
     try:
-        return await rate_limited_request(_fetch)
+        raw = yf.download(
+            tickers=[f"{symbol}.NS" for symbol in symbols],
+            interval="1d",
+            group_by="ticker",
+            threads=False,
+            progress=False,
+            timeout=BULK_DOWNLOAD_TICKER_TIMEOUT,
+            **window
+        )
+    finally:
+        YF_DOWNLOAD_LOCK.release()
+    return split_bulk_history(raw, symbols)
+
+async def fetch_bulk_history(symbols: List[str], period: str = "1y", start: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+    """Fetch history for a batch of symbols in bulk, returning per-symbol frames"""
+    frames = {}
+
+    for i in range(0, len(symbols), BULK_DOWNLOAD_CHUNK_SIZE):
+        chunk = symbols[i:i + BULK_DOWNLOAD_CHUNK_SIZE]
+        timeout = bulk_call_timeout(len(chunk))
+        try:
+            frames.update(await rate_limited_request(
+                call_upstream, BULK_CALL_KEY, "bulk_history", download_bulk_history, chunk, period, start, timeout,
+                cost=len(chunk), call_timeout=timeout
+            ))
+        except Exception as e:
+            logger.error(f"Bulk history download failed for {len(chunk)} symbols: {str(e)}")
+
+    return frames
+
+async def fetch_bulk_history_incremental(symbols: List[str]) -> Dict[str, pd.DataFrame]:
+    """Bulk variant of fetch_history_incremental: one call for stored symbols, one for new ones"""
+    if not symbols:
+        return {}
+
+    loop = asyncio.get_event_loop()
+    window_start = history_window_start()
+
+    try:
+        references = await loop.run_in_executor(executor, get_reference_bars, symbols)
+    except sqlite3.Error as e:
+        logger.warning(f"OHLCV store unavailable, bulk fetching full history: {str(e)}")
+        return await fetch_bulk_history(symbols)
+
+    stored = [s for s in symbols if s in references and references[s][0] >= window_start]
+    fresh = [s for s in symbols if s not in stored]
+
+    downloaded = {}
+    if stored:
+        downloaded.update(await fetch_bulk_history(stored, start=min(references[s][0] for s in stored)))
+    # Symbols re-adjusted upstream since their bars were stored get their full history again
+    rebased = [s for s in stored if history_rebased(references[s], downloaded.get(s))]
+    if rebased:
+        logger.info(f"{len(rebased)} histories were re-adjusted upstream, replacing stored bars")
+        for symbol in rebased:
+            downloaded.pop(symbol)
+            forget_indicator_state(symbol)
+        fresh += rebased
+    if fresh:
+        downloaded.update(await fetch_bulk_history(fresh))
+
+    def _persist_and_load() -> Dict[str, pd.DataFrame]:
+        for symbol, frame in downloaded.items():
+            store_history(symbol, frame, replace=symbol in rebased)
+        frames = {}
+        for symbol in symbols:
+            hist = load_stored_history(symbol, window_start)
+            if not hist.empty:
+                frames[symbol] = hist
+        return frames
+
+    try:
+        return await loop.run_in_executor(executor, _persist_and_load)
+    except sqlite3.Error as e:
+        logger.warning(f"OHLCV store write failed during bulk fetch: {str(e)}")
+        return {s: f for s, f in downloaded.items() if s in fresh}
+
+async def fetch_stock_data_from_history(symbol: str, hist: pd.DataFrame) -> Optional[Dict]:
+    """Build comprehensive stock data from pre-downloaded history (bulk fetch mode)"""
+    return await single_flight(f"stock:{symbol}", partial(_build_stock_data_from_history, symbol, hist))
+
+async def _build_stock_data_from_history(symbol: str, hist: pd.DataFrame) -> Optional[Dict]:
+    """Uncoalesced body of fetch_stock_data_from_history"""
+    try:
+        # Price comes from the last bar; fundamentals only cost a call once a day
+        info, quote = await get_fundamentals(symbol)
+
+        real_time_data = derive_price_snapshot(hist, quote)
+        real_time_data["upstream_calls"] = {"fundamentals": 1 if quote else 0}
+        real_time_data["degraded"] = circuit_open(upstream_provider("history"))
+
+        await warm_restore([f"indicator_{symbol}"])
+        await update_universe_store(symbol, hist)
+        stock_data = build_stock_analysis(symbol, hist, info, real_time_data)
+        record_symbol_success(symbol)
+        return stock_data
     except Exception as e:
-        logger.error(f"Failed to fetch data for {symbol} after {MAX_RETRIES} attempts: {str(e)}")
+        logger.error(f"Error building stock data from history for {symbol}: {str(e)}")
         return None
 
-async def fetch_stock_data_batch(symbols: List[str]) -> List[Optional[Dict]]:
-    """Enhanced batch fetching with improved rate limiting and error handling"""
+async def fetch_stock_data_batch(symbols: List[str], bulk: bool = BULK_FETCH_ENABLED,
+                                 prefilter=None, allow_stale: bool = True) -> List[Optional[Dict]]:
+    """Enhanced batch fetching with improved rate limiting and error handling
+
+    On the bulk path an optional prefilter(symbol, hist) -> bool is checked against the
+    downloaded history; rejected symbols return None without the quote call or full analysis.
+    With allow_stale, entries past the soft TTL are returned as-is and refreshed in one
+    background batch.
+    """
     results = []
-    
-    logger.info(f"Starting batch fetch for {len(symbols)} symbols")
-    
-    for i, symbol in enumerate(symbols):
+
+    logger.info(f"Starting batch fetch for {len(symbols)} symbols (bulk={bulk})")
+
+    # One $in round trip pulls in whatever other API instances have already analysed
+    if MONGO_CACHE_ENABLED:
+        await load_mongo_cache(symbols)
+
+    if bulk:
+        # Serve cached symbols first, then download history for the rest in one call
+        await load_cache_tiers(symbols)
+        lookups = [lookup_l1_stock_data(symbol) for symbol in symbols]
+        stale = [symbol for symbol, (_, status) in zip(symbols, lookups) if status == "stale"]
+        if allow_stale and stale:
+            CACHE_REFRESH_STATS["stale_served"] += len(stale)
+            schedule_cache_refresh(stale)
+        results = [
+            data if status == "fresh" or (allow_stale and status == "stale") else None
+            for data, status in lookups
+        ]
+        # Symbols in negative-cache backoff are not downloaded until their re-probe is due
+        missing = [symbol for symbol, cached in zip(symbols, results) if not cached and not symbol_blocked(symbol)]
+        # Symbols another worker is already refreshing are picked up from the shared cache instead
+        loop = asyncio.get_event_loop()
+        leased = await loop.run_in_executor(executor, acquire_refresh_leases, [f"stock_{s}" for s in missing])
+        owned = [symbol for symbol in missing if f"stock_{symbol}" in leased]
+        histories = await fetch_bulk_history_incremental(owned)
+
+        logger.info(f"Bulk history returned {len(histories)}/{len(owned)} uncached symbols "
+                    f"({len(missing) - len(owned)} being refreshed by other workers)")
+
+        async def _build(symbol: str) -> Optional[Dict]:
+            # A concurrent caller may have analysed the symbol while the bulk download ran
+            cached, status = lookup_l1_stock_data(symbol, record=False)
+            if status == "fresh":
+                return cached
+            if f"stock_{symbol}" not in leased:
+                shared = await wait_for_shared_entry(symbol)
+                if shared is not None:
+                    return shared
+            hist = histories.get(symbol)
+            if hist is not None and prefilter is not None and not prefilter(symbol, hist):
+                return None
+            if hist is not None:
+                stock_data = await fetch_stock_data_from_history(symbol, hist)
+            else:
+                # Fall back to the per-symbol path for tickers the bulk call missed
+                stock_data = await fetch_with_retry(symbol, lease_held=f"stock_{symbol}" in leased)
+
+            if stock_data:
+                cache_stock_data(symbol, stock_data)
+            else:
+                logger.warning(f"No data available for {symbol}")
+            return stock_data
+
+        try:
+            built = await asyncio.gather(*[_build(symbol) for symbol in missing], return_exceptions=True)
+        finally:
+            await loop.run_in_executor(executor, release_refresh_leases, leased)
+        built_by_symbol = {
+            symbol: (data if isinstance(data, Mapping) else None)
+            for symbol, data in zip(missing, built)
+        }
+        results = [cached if cached else built_by_symbol.get(symbol) for symbol, cached in zip(symbols, results)]
+
+        successful_fetches = sum(1 for r in results if r is not None)
+        logger.info(f"Batch fetch completed: {successful_fetches}/{len(symbols)} successful")
+
+        return results
+
+    async def _fetch(i: int, symbol: str) -> Optional[Dict]:
         try:
             # Check cache first
-            cached_data = get_cached_stock_data(symbol)
+            cached_data = await get_cached_stock_data(symbol, allow_stale=allow_stale)
             if cached_data:
-                results.append(cached_data)
                 logger.debug(f"Using cached data for {symbol} ({i+1}/{len(symbols)})")
-                continue
+                return cached_data
             
-            # Fetch fresh data with enhanced rate limiting
+            # Fetch fresh data; concurrency is bounded by the upstream limiter
             logger.debug(f"Fetching fresh data for {symbol} ({i+1}/{len(symbols)})")
             stock_data = await fetch_with_retry(symbol)
             
             if stock_data:
                 cache_stock_data(symbol, stock_data)
-                results.append(stock_data)
                 logger.debug(f"Successfully fetched data for {symbol}")
             else:
-                results.append(None)
                 logger.warning(f"No data available for {symbol}")
+            return stock_data
             
         except Exception as e:
             logger.error(f"Error fetching data for {symbol} in batch: {str(e)}")
-            results.append(None)
+            return None
+    
+    results = await asyncio.gather(*[_fetch(i, symbol) for i, symbol in enumerate(symbols)])
     
     successful_fetches = sum(1 for r in results if r is not None)
     logger.info(f"Batch fetch completed: {successful_fetches}/{len(symbols)} successful")
@@ -727,12 +2929,11 @@ async def get_large_cap_stocks():
 
 def clear_old_cache_entries():
     """Clear expired cache entries to manage memory"""
-    current_time = time.time()
-    expired_keys = []
+    # Expired entries are the fallback while upstream is unavailable, so keep them until it recovers
+    if circuit_open():
+        return
     
-    for key, entry in STOCK_DATA_CACHE.items():
-        if (current_time - entry.get('timestamp', 0)) > (CACHE_EXPIRY_MINUTES * 60):
-            expired_keys.append(key)
+    expired_keys = [key for key, entry in STOCK_DATA_CACHE.items() if not is_cache_usable(entry)]
     
     for key in expired_keys:
         del STOCK_DATA_CACHE[key]
@@ -751,10 +2952,7 @@ def get_system_performance_metrics() -> Dict[str, Any]:
         
         # Cache statistics
         cache_size = len(STOCK_DATA_CACHE)
-        cache_hit_ratio = getattr(get_cached_stock_data, 'hit_ratio', 0)
-        
-        # Request statistics
-        global request_count, requests_per_minute
+        cache_hit_ratio = STOCK_DATA_CACHE.hit_ratio()
         
         return {
             "timestamp": datetime.now(timezone.utc).isoformat(),
@@ -766,18 +2964,22 @@ def get_system_performance_metrics() -> Dict[str, Any]:
             "cache": {
                 "size": cache_size,
                 "hit_ratio": cache_hit_ratio,
+                "memory_mb": round(STOCK_DATA_CACHE.bytes / (1024 * 1024), 2),
+                "evictions": STOCK_DATA_CACHE.stats()["evictions"],
                 "expiry_minutes": CACHE_EXPIRY_MINUTES
             },
             "requests": {
                 "total_count": request_count,
-                "per_minute": requests_per_minute,
+                "per_minute": requests_last_minute(),
+                "by_kind": UPSTREAM_CALL_STATS["by_kind"],
                 "rate_limit_enabled": RATE_LIMIT_BACKOFF
             },
             "rate_limiting": {
                 "max_retries": MAX_RETRIES,
                 "initial_wait": INITIAL_WAIT,
                 "max_wait": MAX_WAIT,
-                "batch_delay": BATCH_DELAY
+                "buckets": {provider: bucket.stats() for provider, bucket in UPSTREAM_BUCKETS.items()},
+                "concurrency_windows": {provider: limiter.window for provider, limiter in UPSTREAM_LIMITERS.items()}
             }
         }
     except ImportError:
@@ -785,7 +2987,7 @@ def get_system_performance_metrics() -> Dict[str, Any]:
         return {
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "cache_size": len(STOCK_DATA_CACHE),
-            "requests_per_minute": requests_per_minute,
+            "requests_per_minute": requests_last_minute(),
             "note": "Install psutil for detailed system metrics"
         }
     except Exception as e:
@@ -815,7 +3017,7 @@ async def health_check_with_diagnostics() -> Dict[str, Any]:
         # Yahoo Finance API check
         try:
             test_ticker = yf.Ticker("RELIANCE.NS")
-            test_data = test_ticker.history(period="1d")
+            test_data = await call_upstream("RELIANCE", "health_check", test_ticker.history, period="1d")
             if not test_data.empty:
                 health_status["checks"]["yahoo_finance"] = {"status": "ok", "message": "Yahoo Finance API accessible"}
             else:
@@ -827,10 +3029,11 @@ async def health_check_with_diagnostics() -> Dict[str, Any]:
         
         # Cache health check
         cache_size = len(STOCK_DATA_CACHE)
-        if cache_size > 1000:  # Arbitrary threshold
-            health_status["checks"]["cache"] = {"status": "warning", "message": f"Large cache size: {cache_size} entries"}
+        cache_mb = STOCK_DATA_CACHE.bytes / (1024 * 1024)
+        if STOCK_DATA_CACHE.bytes > 0.9 * STOCK_DATA_CACHE.max_bytes:
+            health_status["checks"]["cache"] = {"status": "warning", "message": f"Cache near its memory budget: {cache_size} entries, {cache_mb:.1f}/{CACHE_MAX_MEMORY_MB:.0f} MB"}
         else:
-            health_status["checks"]["cache"] = {"status": "ok", "message": f"Cache size normal: {cache_size} entries"}
+            health_status["checks"]["cache"] = {"status": "ok", "message": f"Cache size normal: {cache_size} entries, {cache_mb:.1f} MB"}
         
         # Market status check
         market_status = get_market_status()
@@ -852,87 +3055,678 @@ async def health_check_with_diagnostics() -> Dict[str, Any]:
             "error": str(e)
         }
 
+INDICATOR_COLUMNS = [
+    'sma_20', 'sma_50', 'sma_200', 'ema_12', 'ema_26', 'rsi',
+    'macd', 'macd_signal', 'macd_histogram',
+    'bollinger_middle', 'bollinger_upper', 'bollinger_lower',
+    'stochastic_k', 'stochastic_d', 'vwap', 'atr', 'volume_ratio',
+    'resistance_level', 'support_level'
+]
+
+def right_align_bars(close: np.ndarray, *fields: np.ndarray) -> List[np.ndarray]:
+    """Move NaN padding to the top of each (days x symbols) column so latest bars share the last row"""
+    order = np.argsort(~np.isnan(close), axis=0, kind='stable')
+    return [np.take_along_axis(arr, order, axis=0) for arr in (close,) + fields]
+
+def _trailing_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Mean of the last `window` rows per column (NaN if the window is short or padded)"""
+    if values.shape[0] < window:
+        return np.full(values.shape[1], np.nan)
+    return values[-window:].mean(axis=0)
+
+def _trailing_extreme(values: np.ndarray, window: int, reducer, lag: int = 0) -> np.ndarray:
+    """Rolling max/min over the `window` rows ending `lag` rows before the last one"""
+    end = values.shape[0] - lag
+    if end < window:
+        return np.full(values.shape[1], np.nan)
+    return reducer(values[end - window:end], axis=0)
+
+def _ewm_mean(values: np.ndarray, span: int) -> np.ndarray:
+    """Column-wise pandas ewm(span).mean() (adjust=True) over a (days x symbols) array"""
+    decay = 1 - 2 / (span + 1)
+    out = np.full(values.shape, np.nan)
+    numerator = np.zeros(values.shape[1])
+    denominator = np.zeros(values.shape[1])
+
+    for t in range(values.shape[0]):
+        valid = ~np.isnan(values[t])
+        numerator = numerator * decay + np.where(valid, values[t], 0.0)
+        denominator = denominator * decay + valid
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[t] = np.where(denominator > 0, numerator / denominator, np.nan)
+
+    return out
+
+# Indicator dependency graph: name -> (dependency names, compute function).
+# Inputs are the right-aligned (days x symbols) arrays 'close', 'high', 'low',
+# 'volume' plus 'bars' (valid bars per symbol); every other node is derived lazily.
+INDICATOR_REGISTRY = {}
+
+def register_indicator(name: str, *dependencies: str):
+    """Register an indicator node computed from the named dependencies"""
+    def decorator(func):
+        INDICATOR_REGISTRY[name] = (dependencies, func)
+        return func
+    return decorator
+
+def _require_bars(bars: np.ndarray, minimum: int, values: np.ndarray) -> np.ndarray:
+    return np.where(bars >= minimum, values, np.nan)
+
+@register_indicator('sma_20', 'close')
+def _sma_20(close):
+    return _trailing_mean(close, 20)
+
+@register_indicator('sma_50', 'close')
+def _sma_50(close):
+    return _trailing_mean(close, 50)
+
+@register_indicator('sma_200', 'close')
+def _sma_200(close):
+    return _trailing_mean(close, 200)
+
+@register_indicator('ema_12_series', 'close')
+def _ema_12_series(close):
+    return _ewm_mean(close, 12)
+
+@register_indicator('ema_26_series', 'close')
+def _ema_26_series(close):
+    return _ewm_mean(close, 26)
+
+@register_indicator('ema_12', 'ema_12_series', 'bars')
+def _ema_12(ema_12_series, bars):
+    return _require_bars(bars, 12, ema_12_series[-1])
+
+@register_indicator('ema_26', 'ema_26_series', 'bars')
+def _ema_26(ema_26_series, bars):
+    return _require_bars(bars, 26, ema_26_series[-1])
+
+@register_indicator('rsi', 'close', 'bars')
+def _rsi(close, bars):
+    # Simple 14-day average of gains and losses
+    delta = np.vstack([np.full(close.shape[1], np.nan), np.diff(close, axis=0)])
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    rsi = 100 - 100 / (1 + _trailing_mean(gain, 14) / _trailing_mean(loss, 14))
+    return _require_bars(bars, 14, rsi)
+
+@register_indicator('macd_line', 'ema_12_series', 'ema_26_series')
+def _macd_line(ema_12_series, ema_26_series):
+    return ema_12_series - ema_26_series
+
+@register_indicator('macd_signal_series', 'macd_line')
+def _macd_signal_series(macd_line):
+    return _ewm_mean(macd_line, 9)
+
+@register_indicator('macd', 'macd_line', 'bars')
+def _macd(macd_line, bars):
+    return _require_bars(bars, 26, macd_line[-1])
+
+@register_indicator('macd_signal', 'macd_signal_series', 'bars')
+def _macd_signal(macd_signal_series, bars):
+    return _require_bars(bars, 35, macd_signal_series[-1])
+
+@register_indicator('macd_histogram', 'macd_line', 'macd_signal_series', 'bars')
+def _macd_histogram(macd_line, macd_signal_series, bars):
+    return _require_bars(bars, 35, macd_line[-1] - macd_signal_series[-1])
+
+@register_indicator('std_20', 'close')
+def _std_20(close):
+    if close.shape[0] < 20:
+        return np.full(close.shape[1], np.nan)
+    return close[-20:].std(axis=0, ddof=1)
+
+@register_indicator('bollinger_middle', 'sma_20')
+def _bollinger_middle(sma_20):
+    return sma_20
+
+@register_indicator('bollinger_upper', 'sma_20', 'std_20')
+def _bollinger_upper(sma_20, std_20):
+    return sma_20 + 2 * std_20
+
+@register_indicator('bollinger_lower', 'sma_20', 'std_20')
+def _bollinger_lower(sma_20, std_20):
+    return sma_20 - 2 * std_20
+
+@register_indicator('k_percent', 'close', 'high', 'low')
+def _k_percent(close, high, low):
+    # Stochastic %K for the last three days, newest first
+    k_percent = []
+    for lag in range(3):
+        low_14 = _trailing_extreme(low, 14, np.min, lag)
+        high_14 = _trailing_extreme(high, 14, np.max, lag)
+        last_close = close[-1 - lag] if close.shape[0] > lag else np.full(close.shape[1], np.nan)
+        k_percent.append(100 * (last_close - low_14) / (high_14 - low_14))
+    return np.array(k_percent)
+
+@register_indicator('stochastic_k', 'k_percent', 'bars')
+def _stochastic_k(k_percent, bars):
+    return _require_bars(bars, 14, k_percent[0])
+
+@register_indicator('stochastic_d', 'k_percent', 'bars')
+def _stochastic_d(k_percent, bars):
+    return _require_bars(bars, 14, k_percent.mean(axis=0))
+
+@register_indicator('vwap', 'close', 'high', 'low', 'volume', 'bars')
+def _vwap(close, high, low, volume, bars):
+    typical_price = (high + low + close) / 3
+    return _require_bars(bars, 20, _trailing_mean(typical_price * volume, 20) / _trailing_mean(volume, 20))
+
+@register_indicator('atr', 'close', 'high', 'low', 'bars')
+def _atr(close, high, low, bars):
+    prev_close = np.vstack([np.full(close.shape[1], np.nan), close[:-1]])
+    true_range = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+    return _require_bars(bars, 14, _trailing_mean(true_range, 14))
+
+@register_indicator('volume_ratio', 'volume')
+def _volume_ratio(volume):
+    avg_volume = _trailing_mean(volume, 20)
+    current_volume = volume[-1] if volume.shape[0] else np.full(volume.shape[1], np.nan)
+    return np.where(avg_volume > 0, current_volume / avg_volume, np.nan)
+
+@register_indicator('resistance_level', 'high')
+def _resistance_level(high):
+    return _trailing_extreme(high, 20, np.max)
+
+@register_indicator('support_level', 'low')
+def _support_level(low):
+    return _trailing_extreme(low, 20, np.min)
+
+class LazyIndicatorGraph:
+    """Evaluates registered indicators on demand, computing each dependency at most once"""
+
+    def __init__(self, close: np.ndarray, high: np.ndarray, low: np.ndarray,
+                 volume: np.ndarray, symbols: Optional[List[str]] = None):
+        close, high, low, volume = right_align_bars(
+            np.asarray(close, dtype=np.float64), np.asarray(high, dtype=np.float64),
+            np.asarray(low, dtype=np.float64), np.asarray(volume, dtype=np.float64)
+        )
+        self.symbols = symbols
+        self._values = {
+            'close': close,
+            'high': high,
+            'low': low,
+            'volume': volume,
+            'bars': (~np.isnan(close)).sum(axis=0)
+        }
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'LazyIndicatorGraph':
+        """Single-column graph over one symbol's OHLCV frame"""
+        return cls(*(df[column].to_numpy(dtype=np.float64)[:, None] for column in ('Close', 'High', 'Low', 'Volume')))
+
+    @property
+    def evaluated(self) -> List[str]:
+        return [name for name in self._values if name in INDICATOR_REGISTRY]
+
+    @property
+    def price(self) -> np.ndarray:
+        """Latest close per symbol"""
+        close = self._values['close']
+        return close[-1] if close.shape[0] else np.full(close.shape[1], np.nan)
+
+    def get(self, name: str) -> np.ndarray:
+        if name not in self._values:
+            dependencies, func = INDICATOR_REGISTRY[name]
+            inputs = [self.get(dependency) for dependency in dependencies]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                self._values[name] = func(*inputs)
+        return self._values[name]
+
+    def materialize(self, names: List[str] = INDICATOR_COLUMNS) -> pd.DataFrame:
+        """Columnar table (one row per symbol) of the requested indicators"""
+        return pd.DataFrame({name: self.get(name) for name in names}, index=self.symbols, columns=names)
+
+def compute_universe_indicators(close: np.ndarray, high: np.ndarray, low: np.ndarray,
+                                volume: np.ndarray, symbols: Optional[List[str]] = None) -> pd.DataFrame:
+    """Compute the latest technical indicators for every symbol in one pass.
+
+    Inputs are (days x symbols) arrays, oldest day first, NaN where a symbol has no bar.
+    Returns a columnar table (one row per symbol, one column per INDICATOR_COLUMNS entry)
+    with the same values calculate_advanced_technical_indicators produces per symbol.
+    """
+    return LazyIndicatorGraph(close, high, low, volume, symbols).materialize(INDICATOR_COLUMNS)
+
+# Breakout rules in descending confidence order, so the first rule that fires is the
+# highest-confidence pattern. Conditions take the latest price and a dict of indicator
+# arrays and return a boolean mask (NaN inputs never fire).
+BREAKOUT_RULES = [
+    {
+        "type": "200_dma", "confidence": 0.85,
+        "requires": ('sma_200', 'volume_ratio'),
+        "condition": lambda price, ind: (price > ind['sma_200'] * 1.02) & (ind['volume_ratio'] > 1.5),
+        "breakout_price": lambda price, ind: ind['sma_200']
+    },
+    {
+        "type": "resistance", "confidence": 0.75,
+        "requires": ('resistance_level', 'volume_ratio'),
+        "condition": lambda price, ind: (price > ind['resistance_level'] * 1.01) & (ind['volume_ratio'] > 1.3),
+        "breakout_price": lambda price, ind: ind['resistance_level']
+    },
+    {
+        "type": "momentum", "confidence": 0.70,
+        "requires": ('macd', 'macd_signal', 'rsi', 'sma_50'),
+        "condition": lambda price, ind: (
+            (ind['macd'] > ind['macd_signal']) & (ind['rsi'] > 50) & (ind['rsi'] < 80) & (price > ind['sma_50'])
+        ),
+        "breakout_price": lambda price, ind: ind['sma_50']
+    },
+    {
+        "type": "bollinger_upper", "confidence": 0.65,
+        "requires": ('bollinger_upper', 'volume_ratio'),
+        "condition": lambda price, ind: (price > ind['bollinger_upper']) & (ind['volume_ratio'] > 1.2),
+        "breakout_price": lambda price, ind: ind['bollinger_upper']
+    },
+    {
+        "type": "stochastic", "confidence": 0.60,
+        "requires": ('stochastic_k', 'stochastic_d'),
+        "condition": lambda price, ind: (
+            (ind['stochastic_k'] > ind['stochastic_d']) & (ind['stochastic_k'] > 20) & (ind['stochastic_k'] < 80)
+        ),
+        "breakout_price": lambda price, ind: price * 0.98
+    }
+]
+
+def plan_breakout_rules(breakout_type: Optional[str] = None, min_confidence: float = 0.0) -> List[Dict]:
+    """Rules a scan has to evaluate: those ranked at or above the requested type and confidence"""
+    planned = []
+    for rule in BREAKOUT_RULES:
+        if rule["confidence"] < min_confidence:
+            break
+        planned.append(rule)
+        if breakout_type and breakout_type != 'All' and rule["type"] == breakout_type:
+            break
+    return planned
+
+def plan_scan_columns(breakout_type: Optional[str] = None, min_confidence: float = 0.0) -> List[str]:
+    """Indicator columns (including dependencies) the scan pre-filter may materialise"""
+    columns = []
+
+    def _visit(name: str):
+        if name in columns or name not in INDICATOR_REGISTRY:
+            return
+        for dependency in INDICATOR_REGISTRY[name][0]:
+            _visit(dependency)
+        columns.append(name)
+
+    for rule in plan_breakout_rules(breakout_type, min_confidence):
+        for name in rule["requires"]:
+            _visit(name)
+    return columns
+
+def detect_breakout_lazy(graph: LazyIndicatorGraph, breakout_type: Optional[str] = None,
+                         min_confidence: float = 0.0) -> Optional[Dict]:
+    """Evaluate breakout rules for a single-symbol graph, materialising only what each rule needs"""
+    price = graph.price
+    wanted = breakout_type if breakout_type and breakout_type != 'All' else None
+
+    for rule in plan_breakout_rules(breakout_type, min_confidence):
+        indicators = {name: graph.get(name) for name in rule["requires"]}
+        with np.errstate(invalid='ignore'):
+            fired = bool(rule["condition"](price, indicators)[0])
+        if fired:
+            if wanted and rule["type"] != wanted:
+                return None
+            return {
+                "type": rule["type"],
+                "breakout_price": float(rule["breakout_price"](price, indicators)[0]),
+                "confidence": rule["confidence"]
+            }
+
+    return None
+
+BREAKOUT_TYPES = [rule["type"] for rule in BREAKOUT_RULES]
+BREAKOUT_INDICATORS = sorted({name for rule in BREAKOUT_RULES for name in rule["requires"]})
+
+# One row per symbol; pattern is the index into BREAKOUT_RULES, -1 where nothing fired
+BREAKOUT_RESULT_DTYPE = np.dtype([
+    ('pattern', np.int8),
+    ('confidence', np.float32),
+    ('breakout_price', np.float64)
+])
+
+def detect_universe_breakouts(price: np.ndarray, indicators) -> np.ndarray:
+    """Evaluate every breakout rule as a mask across all symbols and keep the best match per row.
+
+    indicators maps indicator names to per-symbol arrays (an indicator table, a dict of
+    arrays, ...). Because BREAKOUT_RULES is in descending confidence order, argmax over the
+    stacked masks picks the highest-confidence pattern exactly like detect_advanced_breakout.
+    """
+    price = np.asarray(price, dtype=np.float64)
+    values = {name: np.asarray(indicators[name], dtype=np.float64) for name in BREAKOUT_INDICATORS}
+
+    with np.errstate(invalid='ignore'):
+        masks = np.vstack([rule["condition"](price, values) for rule in BREAKOUT_RULES])
+        levels = np.vstack([np.broadcast_to(rule["breakout_price"](price, values), price.shape)
+                            for rule in BREAKOUT_RULES])
+
+    winner = masks.argmax(axis=0)
+    fired = masks.any(axis=0)
+    columns = np.arange(price.shape[0])
+
+    result = np.zeros(price.shape[0], dtype=BREAKOUT_RESULT_DTYPE)
+    result['pattern'] = np.where(fired, winner, -1)
+    result['confidence'] = np.where(fired, np.array([rule["confidence"] for rule in BREAKOUT_RULES])[winner], 0.0)
+    result['breakout_price'] = np.where(fired, levels[winner, columns], np.nan)
+    return result
+
+def breakout_from_result(row) -> Optional[Dict]:
+    """Convert one detect_universe_breakouts row into the per-symbol breakout dict"""
+    if row['pattern'] < 0:
+        return None
+    rule = BREAKOUT_RULES[row['pattern']]
+    return {
+        "type": rule["type"],
+        "breakout_price": float(row['breakout_price']),
+        "confidence": rule["confidence"]
+    }
+
+def passes_breakout_prefilter(hist: pd.DataFrame, breakout_type: Optional[str] = None,
+                              min_confidence: float = 0.0) -> bool:
+    """Cheap history-only check whether a symbol can still satisfy the scan's breakout filters"""
+    try:
+        return detect_breakout_lazy(LazyIndicatorGraph.from_frame(hist), breakout_type, min_confidence) is not None
+    except Exception as e:
+        logger.error(f"Error pre-filtering breakout history: {str(e)}")
+        return True
+
 def calculate_advanced_technical_indicators(df: pd.DataFrame) -> Dict[str, Any]:
-    """Calculate comprehensive technical indicators"""
-    try:
-        indicators = {}
-        
-        # Basic Moving Averages
-        indicators['sma_20'] = df['Close'].rolling(window=20).mean().iloc[-1] if len(df) >= 20 else None
-        indicators['sma_50'] = df['Close'].rolling(window=50).mean().iloc[-1] if len(df) >= 50 else None
-        indicators['sma_200'] = df['Close'].rolling(window=200).mean().iloc[-1] if len(df) >= 200 else None
-        
-        # Exponential Moving Averages
-        indicators['ema_12'] = df['Close'].ewm(span=12).mean().iloc[-1] if len(df) >= 12 else None
-        indicators['ema_26'] = df['Close'].ewm(span=26).mean().iloc[-1] if len(df) >= 26 else None
-        
-        # RSI
-        delta = df['Close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        indicators['rsi'] = 100 - (100 / (1 + rs)).iloc[-1] if len(df) >= 14 else None
-        
-        # MACD
-        if indicators['ema_12'] and indicators['ema_26']:
-            exp1 = df['Close'].ewm(span=12).mean()
-            exp2 = df['Close'].ewm(span=26).mean()
-            macd_line = exp1 - exp2
-            indicators['macd'] = macd_line.iloc[-1]
-            signal_line = macd_line.ewm(span=9).mean()
-            indicators['macd_signal'] = signal_line.iloc[-1] if len(df) >= 35 else None
-            indicators['macd_histogram'] = (macd_line - signal_line).iloc[-1] if len(df) >= 35 else None
-        
-        # Bollinger Bands
-        if indicators['sma_20']:
-            std_20 = df['Close'].rolling(window=20).std().iloc[-1]
-            indicators['bollinger_middle'] = indicators['sma_20']
-            indicators['bollinger_upper'] = indicators['sma_20'] + (2 * std_20)
-            indicators['bollinger_lower'] = indicators['sma_20'] - (2 * std_20)
-        
-        # Stochastic Oscillator
-        if len(df) >= 14:
-            low_14 = df['Low'].rolling(window=14).min()
-            high_14 = df['High'].rolling(window=14).max()
-            k_percent = 100 * ((df['Close'] - low_14) / (high_14 - low_14))
-            indicators['stochastic_k'] = k_percent.iloc[-1]
-            indicators['stochastic_d'] = k_percent.rolling(window=3).mean().iloc[-1]
-        
-        # VWAP (Volume Weighted Average Price)
-        if len(df) >= 20:
-            typical_price = (df['High'] + df['Low'] + df['Close']) / 3
-            vwap = (typical_price * df['Volume']).rolling(window=20).sum() / df['Volume'].rolling(window=20).sum()
-            indicators['vwap'] = vwap.iloc[-1]
-        
-        # ATR (Average True Range)
-        if len(df) >= 14:
-            high_low = df['High'] - df['Low']
-            high_close = np.abs(df['High'] - df['Close'].shift())
-            low_close = np.abs(df['Low'] - df['Close'].shift())
-            true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-            indicators['atr'] = true_range.rolling(window=14).mean().iloc[-1]
-        
-        # Volume analysis
-        avg_volume = df['Volume'].rolling(window=20).mean().iloc[-1] if len(df) >= 20 else None
-        current_volume = df['Volume'].iloc[-1]
-        indicators['volume_ratio'] = current_volume / avg_volume if avg_volume and avg_volume > 0 else None
-        
-        # Support and Resistance
-        indicators['resistance_level'] = df['High'].rolling(window=20).max().iloc[-1] if len(df) >= 20 else None
-        indicators['support_level'] = df['Low'].rolling(window=20).min().iloc[-1] if len(df) >= 20 else None
+    """Calculate comprehensive technical indicators (single-symbol view of the universe engine)"""
+    try:
+        table = compute_universe_indicators(
+            df['Close'].to_numpy(dtype=np.float64)[:, None],
+            df['High'].to_numpy(dtype=np.float64)[:, None],
+            df['Low'].to_numpy(dtype=np.float64)[:, None],
+            df['Volume'].to_numpy(dtype=np.float64)[:, None]
+        )
         
         # Convert numpy values to Python native types and handle NaN
-        for key, value in indicators.items():
-            if value is not None and not pd.isna(value):
-                indicators[key] = float(value)
-            else:
-                indicators[key] = None
-                
-        return indicators
+        return {
+            key: float(value) if not pd.isna(value) else None
+            for key, value in table.iloc[0].items()
+        }
     except Exception as e:
         logger.error(f"Error calculating technical indicators: {str(e)}")
         return {}
 
+class RollingWindow:
+    """Fixed-size ring buffer keeping a running sum and sum of squares.
+
+    The sums are taken relative to a shift near the window mean and are recomputed
+    exactly from the buffer once per full cycle (and on unpickling), so rounding
+    drift stays bounded however long the state lives and the variance does not lose
+    precision to cancellation at high price levels.
+    """
+    __slots__ = ('size', 'values', 'pos', 'count', 'shift', 'total', 'total_sq')
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values = [0.0] * size
+        self.pos = 0
+        self.count = 0
+        self.shift = 0.0
+        self.total = 0.0     # Sum of (value - shift) over the window
+        self.total_sq = 0.0  # Sum of (value - shift) ** 2 over the window
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._reseed()
+
+    def _window(self) -> List[float]:
+        return self.values if self.count == self.size else self.values[:self.count]
+
+    def _reseed(self) -> None:
+        """Recompute the sums exactly, re-centred on the current window mean"""
+        window = self._window()
+        self.shift = math.fsum(window) / len(window) if window else 0.0
+        deviations = [value - self.shift for value in window]
+        self.total = math.fsum(deviations)
+        self.total_sq = math.fsum(d * d for d in deviations)
+
+    def _evicted(self) -> Optional[float]:
+        """Shifted value the next push drops out of the window (None while filling)"""
+        return self.values[self.pos] - self.shift if self.count == self.size else None
+
+    def _sums_after(self, value: float) -> Tuple[float, float]:
+        shifted = value - self.shift
+        old = self._evicted()
+        if old is None:
+            return self.total + shifted, self.total_sq + shifted * shifted
+        return self.total + shifted - old, self.total_sq + shifted * shifted - old * old
+
+    def push(self, value: float) -> None:
+        self.total, self.total_sq = self._sums_after(value)
+        self.values[self.pos] = value
+        self.pos = (self.pos + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        if self.pos == 0:
+            self._reseed()
+
+    def preview_sum(self, value: float) -> float:
+        """Window sum if `value` were pushed next (NaN until the window would be full)"""
+        if self.count + 1 < self.size:
+            return math.nan
+        return self._sums_after(value)[0] + self.size * self.shift
+
+    def preview_std(self, value: float) -> float:
+        """Sample standard deviation of the window if `value` were pushed next"""
+        if self.count + 1 < self.size:
+            return math.nan
+        total, total_sq = self._sums_after(value)
+        return math.sqrt(max(total_sq - total * total / self.size, 0.0) / (self.size - 1))
+
+class MonotonicWindow:
+    """Sliding-window maximum (or minimum) with amortised O(1) updates"""
+    __slots__ = ('size', 'sign', 'items', 'index')
+
+    def __init__(self, size: int, maximum: bool = True):
+        self.size = size
+        self.sign = 1.0 if maximum else -1.0
+        self.items = deque()  # (bar index, signed value), values decreasing front to back
+        self.index = -1
+
+    def push(self, value: float) -> None:
+        self.index += 1
+        signed = self.sign * value
+        while self.items and self.items[-1][1] <= signed:
+            self.items.pop()
+        self.items.append((self.index, signed))
+        while self.items[0][0] <= self.index - self.size:
+            self.items.popleft()
+
+    def preview(self, value: float) -> float:
+        """Window extreme if `value` were pushed next"""
+        oldest_kept = self.index + 2 - self.size
+        best = self.sign * value
+        for position, signed in islice(self.items, 2):
+            if position >= oldest_kept:
+                best = max(best, signed)
+                break
+        return self.sign * best
+
+class IncrementalIndicatorState:
+    """Running indicator state for one symbol, advanced in O(1) per bar.
+
+    Every bar except the newest is committed into running sums, EMA states and
+    monotonic windows. The newest bar is held as a live bar that intraday
+    refreshes replace, and values() folds it in without mutating the state, so
+    results match calculate_advanced_technical_indicators over the same history.
+    """
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bars = 0
+        self.last_day = None  # Day number of the last committed bar
+        self.live = None      # (day, high, low, close, volume) of the newest bar
+        self.prev_close = math.nan
+
+        self.close_20 = RollingWindow(20)
+        self.close_50 = RollingWindow(50)
+        self.close_200 = RollingWindow(200)
+        self.gain_14 = RollingWindow(14)
+        self.loss_14 = RollingWindow(14)
+        self.true_range_14 = RollingWindow(14)
+        self.price_volume_20 = RollingWindow(20)
+        self.volume_20 = RollingWindow(20)
+        self.high_14 = MonotonicWindow(14, maximum=True)
+        self.low_14 = MonotonicWindow(14, maximum=False)
+        self.high_20 = MonotonicWindow(20, maximum=True)
+        self.low_20 = MonotonicWindow(20, maximum=False)
+        self.ema = {12: [0.0, 0.0], 26: [0.0, 0.0]}  # span -> [numerator, denominator]
+        self.macd_signal = [0.0, 0.0]
+        self.recent_k = deque([math.nan, math.nan], maxlen=2)
+
+    @staticmethod
+    def _ewm_step(state: List[float], span: int, value: float) -> Tuple[float, float]:
+        decay = 1 - 2 / (span + 1)
+        return state[0] * decay + value, state[1] * decay + 1.0
+
+    def _bar_inputs(self, high: float, low: float, close: float, volume: float) -> Dict[str, float]:
+        """Per-bar derived values shared by push() and values()"""
+        delta = close - self.prev_close
+        true_range = high - low
+        if not math.isnan(self.prev_close):
+            true_range = max(true_range, abs(high - self.prev_close), abs(low - self.prev_close))
+        return {
+            "gain": delta if delta > 0 else 0.0,
+            "loss": -delta if delta < 0 else 0.0,
+            "true_range": true_range,
+            "price_volume": (high + low + close) / 3 * volume,
+            "ema_12": self._ewm_step(self.ema[12], 12, close),
+            "ema_26": self._ewm_step(self.ema[26], 26, close)
+        }
+
+    def push(self, day: int, high: float, low: float, close: float, volume: float) -> None:
+        """Commit one completed bar"""
+        if any(math.isnan(v) for v in (high, low, close, volume)):
+            return
+
+        inputs = self._bar_inputs(high, low, close, volume)
+        self.bars += 1
+        self.last_day = day
+
+        for window in (self.close_20, self.close_50, self.close_200):
+            window.push(close)
+        self.gain_14.push(inputs["gain"])
+        self.loss_14.push(inputs["loss"])
+        self.true_range_14.push(inputs["true_range"])
+        self.price_volume_20.push(inputs["price_volume"])
+        self.volume_20.push(volume)
+        for window, value in ((self.high_14, high), (self.low_14, low), (self.high_20, high), (self.low_20, low)):
+            window.push(value)
+
+        self.ema[12] = list(inputs["ema_12"])
+        self.ema[26] = list(inputs["ema_26"])
+        macd = self.ema[12][0] / self.ema[12][1] - self.ema[26][0] / self.ema[26][1]
+        self.macd_signal = list(self._ewm_step(self.macd_signal, 9, macd))
+
+        k_percent = math.nan
+        if self.bars >= 14:
+            low_14 = -self.low_14.items[0][1]
+            high_14 = self.high_14.items[0][1]
+            k_percent = 100 * (close - low_14) / (high_14 - low_14) if high_14 != low_14 else math.nan
+        self.recent_k.append(k_percent)
+        self.prev_close = close
+
+    def advance(self, hist: pd.DataFrame) -> bool:
+        """Commit bars newer than the last committed one and take the newest as live.
+
+        Returns False when hist no longer overlaps the state and it must be rebuilt.
+        """
+        if hist is None or hist.empty:
+            return False
+
+        index = hist.index.tz_localize(None) if getattr(hist.index, 'tz', None) is not None else hist.index
+        days = index.values.astype('datetime64[D]').astype(np.int64)
+        if self.last_day is not None and (days[0] > self.last_day or days[-1] <= self.last_day):
+            return False
+
+        values = hist[['High', 'Low', 'Close', 'Volume']].to_numpy(dtype=np.float64)
+        for i in range(len(days) - 1):
+            if self.last_day is None or days[i] > self.last_day:
+                self.push(int(days[i]), *values[i])
+
+        self.live = (int(days[-1]), *values[-1]) if self.last_day is None or days[-1] > self.last_day else None
+        return True
+
+    @classmethod
+    def from_history(cls, symbol: str, hist: pd.DataFrame) -> 'IncrementalIndicatorState':
+        """Seed a state from a full history frame"""
+        state = cls(symbol)
+        state.advance(hist)
+        return state
+
+    def values(self) -> Dict[str, Optional[float]]:
+        """Latest indicator values with the live bar folded in"""
+        if self.live is None:
+            return {}
+
+        _, high, low, close, volume = self.live
+        inputs = self._bar_inputs(high, low, close, volume)
+        bars = self.bars + 1
+        nan = math.nan
+
+        ema_12 = inputs["ema_12"][0] / inputs["ema_12"][1]
+        ema_26 = inputs["ema_26"][0] / inputs["ema_26"][1]
+        macd = ema_12 - ema_26
+        signal_num, signal_den = self._ewm_step(self.macd_signal, 9, macd)
+        macd_signal = signal_num / signal_den
+
+        sma_20 = self.close_20.preview_sum(close) / 20
+        std_20 = self.close_20.preview_std(close)
+
+        avg_gain = self.gain_14.preview_sum(inputs["gain"]) / 14
+        avg_loss = self.loss_14.preview_sum(inputs["loss"]) / 14
+        if avg_loss > 0:
+            rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+        else:
+            rsi = 100.0 if avg_gain > 0 else nan
+
+        low_14 = self.low_14.preview(low)
+        high_14 = self.high_14.preview(high)
+        k_percent = 100 * (close - low_14) / (high_14 - low_14) if high_14 != low_14 else nan
+
+        avg_volume = self.volume_20.preview_sum(volume) / 20
+
+        indicators = {
+            'sma_20': sma_20,
+            'sma_50': self.close_50.preview_sum(close) / 50,
+            'sma_200': self.close_200.preview_sum(close) / 200,
+            'ema_12': ema_12 if bars >= 12 else nan,
+            'ema_26': ema_26 if bars >= 26 else nan,
+            'rsi': rsi if bars >= 14 else nan,
+            'macd': macd if bars >= 26 else nan,
+            'macd_signal': macd_signal if bars >= 35 else nan,
+            'macd_histogram': macd - macd_signal if bars >= 35 else nan,
+            'bollinger_middle': sma_20,
+            'bollinger_upper': sma_20 + 2 * std_20,
+            'bollinger_lower': sma_20 - 2 * std_20,
+            'stochastic_k': k_percent if bars >= 14 else nan,
+            'stochastic_d': (k_percent + sum(self.recent_k)) / 3 if bars >= 14 else nan,
+            'vwap': self.price_volume_20.preview_sum(inputs["price_volume"]) / (avg_volume * 20) if bars >= 20 else nan,
+            'atr': self.true_range_14.preview_sum(inputs["true_range"]) / 14,
+            'volume_ratio': volume / avg_volume if avg_volume > 0 else nan,
+            'resistance_level': self.high_20.preview(high) if bars >= 20 else nan,
+            'support_level': self.low_20.preview(low) if bars >= 20 else nan
+        }
+
+        return {key: None if math.isnan(value) else float(value) for key, value in indicators.items()}
+
+def get_incremental_indicators(symbol: str, hist: pd.DataFrame) -> Dict[str, Optional[float]]:
+    """Advance (or seed) the symbol's indicator state with hist and return the latest values.
+
+    Callers await warm_restore for the indicator key first, so no SQLite read runs here.
+    """
+    state = INDICATOR_STATE.get(symbol)
+    if state is None or not state.advance(hist):
+        state = IncrementalIndicatorState.from_history(symbol, hist)
+        INDICATOR_STATE[symbol] = state
+    WARM_STATE_DIRTY.add(f"indicator_{symbol}")
+    return state.values()
+
 def calculate_trading_recommendation(symbol: str, current_price: float, breakout_data: Dict, 
                                    technical_data: Dict, risk_assessment: Dict) -> Dict:
     """Calculate optimal entry points, stop loss, and target prices for trading"""
@@ -1049,25 +3843,25 @@ def get_market_status() -> Dict[str, Any]:
     """Get detailed NSE market status with timings"""
     try:
         # Indian timezone
-        ist = pytz.timezone('Asia/Kolkata')
-        now_ist = datetime.now(ist)
+        now_ist = datetime.now(IST)
         
-        # NSE market hours: 9:15 AM to 3:30 PM IST (Monday to Friday)
-        market_open_time = now_ist.replace(hour=9, minute=15, second=0, microsecond=0)
-        market_close_time = now_ist.replace(hour=15, minute=30, second=0, microsecond=0)
-        pre_open_start = now_ist.replace(hour=9, minute=0, second=0, microsecond=0)
+        # NSE market hours: 9:15 AM to 3:30 PM IST (Monday to Friday, except exchange holidays)
+        market_open_time = market_time(now_ist, MARKET_OPEN)
+        market_close_time = market_time(now_ist, MARKET_CLOSE)
+        pre_open_start = market_time(now_ist, MARKET_PRE_OPEN)
         
         # Check if it's a weekday
         is_weekday = now_ist.weekday() < 5  # Monday = 0, Friday = 4
+        holiday = NSE_HOLIDAYS.get(now_ist.date())
         
         current_time_str = now_ist.strftime("%I:%M %p IST")
         
-        if not is_weekday:
+        if not is_weekday or holiday:
             return {
                 "status": "CLOSED",
-                "message": "Market Closed - Weekend",
+                "message": f"Market Closed - {holiday or 'Weekend'}",
                 "current_time": current_time_str,
-                "next_open": "Monday 9:15 AM IST",
+                "next_open": next_market_open(now_ist).strftime("%A 9:15 AM IST"),
                 "is_trading_hours": False,
                 "time_to_open": None,
                 "time_to_close": None
@@ -1118,13 +3912,8 @@ def get_market_status() -> Dict[str, Any]:
             }
         
         else:
-            # After market close
-            next_day = now_ist + timedelta(days=1)
-            next_open = next_day.replace(hour=9, minute=0, second=0, microsecond=0)
-            
-            # Skip weekend
-            while next_open.weekday() >= 5:
-                next_open += timedelta(days=1)
+            # After market close (skipping weekends and holidays)
+            next_open = next_market_open(now_ist)
             
             return {
                 "status": "CLOSED",
@@ -1250,68 +4039,14 @@ def detect_advanced_breakout(symbol: str, df: pd.DataFrame, technical_data: Dict
     """Enhanced breakout detection with multiple patterns"""
     try:
         current_price = df['Close'].iloc[-1]
-        breakouts = []
-        
-        # 200 DMA breakout
-        sma_200 = technical_data.get('sma_200')
-        if sma_200 and current_price > sma_200 * 1.02:
-            if technical_data.get('volume_ratio', 0) > 1.5:
-                breakouts.append({
-                    "type": "200_dma",
-                    "breakout_price": sma_200,
-                    "confidence": 0.85
-                })
-        
-        # Resistance breakout
-        resistance = technical_data.get('resistance_level')
-        if resistance and current_price > resistance * 1.01:
-            if technical_data.get('volume_ratio', 0) > 1.3:
-                breakouts.append({
-                    "type": "resistance",
-                    "breakout_price": resistance,
-                    "confidence": 0.75
-                })
-        
-        # Bollinger Band breakout
-        bb_upper = technical_data.get('bollinger_upper')
-        if bb_upper and current_price > bb_upper:
-            if technical_data.get('volume_ratio', 0) > 1.2:
-                breakouts.append({
-                    "type": "bollinger_upper",
-                    "breakout_price": bb_upper,
-                    "confidence": 0.65
-                })
-        
-        # MACD bullish crossover
-        macd = technical_data.get('macd', 0)
-        macd_signal = technical_data.get('macd_signal', 0)
-        rsi = technical_data.get('rsi', 0)
-        
-        if macd > macd_signal and 50 < rsi < 80:
-            sma_50 = technical_data.get('sma_50', current_price)
-            if current_price > sma_50:
-                breakouts.append({
-                    "type": "momentum",
-                    "breakout_price": sma_50,
-                    "confidence": 0.70
-                })
-        
-        # Stochastic breakout
-        stoch_k = technical_data.get('stochastic_k', 0)
-        stoch_d = technical_data.get('stochastic_d', 0)
-        if stoch_k > stoch_d and stoch_k > 20 and stoch_k < 80:
-            breakouts.append({
-                "type": "stochastic",
-                "breakout_price": current_price * 0.98,
-                "confidence": 0.60
-            })
+        indicators = {
+            name: np.array([np.nan if technical_data.get(name) is None else technical_data[name]], dtype=np.float64)
+            for name in BREAKOUT_INDICATORS
+        }
         
         # Return the highest confidence breakout
-        if breakouts:
-            best_breakout = max(breakouts, key=lambda x: x['confidence'])
-            return best_breakout
-        
-        return None
+        result = detect_universe_breakouts(np.array([current_price], dtype=np.float64), indicators)
+        return breakout_from_result(result[0])
     except Exception as e:
         logger.error(f"Error detecting breakout for {symbol}: {str(e)}")
         return None
@@ -1324,8 +4059,8 @@ async def validate_stock_data_multiple_sources(symbol: str) -> Dict[str, Any]:
         try:
             ticker_symbol = f"{symbol}.NS"
             ticker = yf.Ticker(ticker_symbol)
-            hist = ticker.history(period="2d")  # Get last 2 days
-            info = ticker.info
+            hist = await call_upstream(symbol, "history", ticker.history, period="2d")  # Get last 2 days
+            info, _ = await get_fundamentals(symbol)
             
             if not hist.empty:
                 current_price = hist['Close'].iloc[-1]
@@ -1359,7 +4094,7 @@ async def validate_stock_data_multiple_sources(symbol: str) -> Dict[str, Any]:
             # For now, we'll simulate NSE validation by using a secondary yfinance call
             # with different parameters to cross-check
             alternative_ticker = yf.Ticker(f"{symbol}.NS")
-            alternative_info = alternative_ticker.fast_info
+            alternative_info = await call_upstream(symbol, "fast_info", lambda: alternative_ticker.fast_info)
             
             if hasattr(alternative_info, 'last_price'):
                 nse_data = {
@@ -1458,89 +4193,197 @@ async def validate_stock_data_multiple_sources(symbol: str) -> Dict[str, Any]:
             "quality_level": "Failed"
         }
 
-async def get_real_time_nse_price(symbol: str) -> Optional[Dict]:
-    """Attempt to get real-time NSE price from multiple sources"""
+def derive_price_snapshot(hist: pd.DataFrame, quote: Optional[Dict] = None) -> Dict:
+    """Derive current price, previous close, change and volume from history plus an optional quote"""
+    quote = quote or {}
+
+    last_close = float(hist['Close'].iloc[-1])
+    hist_prev_close = float(hist['Close'].iloc[-2]) if len(hist) > 1 else last_close
+
+    quote_price = quote.get('currentPrice') or quote.get('regularMarketPrice')
+    current_price = float(quote_price) if quote_price else last_close
+
+    quote_prev_close = quote.get('regularMarketPreviousClose') or quote.get('previousClose')
+    prev_close = float(quote_prev_close) if quote_prev_close else hist_prev_close
+
+    quote_volume = quote.get('regularMarketVolume')
+    volume = int(quote_volume) if quote_volume else int(hist['Volume'].iloc[-1])
+
+    snapshot = {
+        "current_price": current_price,
+        "previous_close": prev_close,
+        "change_percent": ((current_price - prev_close) / prev_close) * 100 if prev_close else 0.0,
+        "volume": volume,
+        "market_cap": quote.get('marketCap')
+    }
+
+    if quote_price:
+        snapshot["source"] = "Yahoo Finance Real-time"
+        snapshot["timestamp"] = datetime.now(timezone.utc).isoformat()
+    else:
+        snapshot["source"] = "Yahoo Finance Historical"
+        snapshot["timestamp"] = hist.index[-1].strftime("%Y-%m-%d %H:%M:%S")
+        snapshot["data_age_warning"] = "May be delayed up to 15 minutes"
+
+    return snapshot
+
+async def fetch_comprehensive_stock_data(symbol: str) -> Optional[Dict]:
+    """Fetch comprehensive stock data with one history call plus, at most daily, one fundamentals call"""
+    if symbol_blocked(symbol):
+        return None
     try:
-        # Method 1: Enhanced Yahoo Finance with real-time data
-        ticker_symbol = f"{symbol}.NS"
-        ticker = yf.Ticker(ticker_symbol)
-        
-        # Get real-time quote if available
-        try:
-            fast_info = ticker.fast_info
-            current_price = fast_info.last_price
-            
-            # Get historical data for change calculation
-            hist = ticker.history(period="2d")
-            if not hist.empty:
-                prev_close = hist['Close'].iloc[-2] if len(hist) > 1 else hist['Close'].iloc[-1]
-                change_percent = ((current_price - prev_close) / prev_close) * 100
-                
-                return {
-                    "current_price": float(current_price),
-                    "change_percent": float(change_percent),
-                    "volume": int(hist['Volume'].iloc[-1]) if not hist.empty else 0,
-                    "source": "Yahoo Finance Real-time",
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
-                    "market_cap": getattr(fast_info, 'market_cap', None)
-                }
-        except:
-            pass
-        
-        # Method 2: Fallback to regular historical data
-        hist = ticker.history(period="5d")
-        if not hist.empty:
-            current_price = hist['Close'].iloc[-1]
-            prev_close = hist['Close'].iloc[-2] if len(hist) > 1 else current_price
-            change_percent = ((current_price - prev_close) / prev_close) * 100
-            
-            return {
-                "current_price": float(current_price),
-                "change_percent": float(change_percent),
-                "volume": int(hist['Volume'].iloc[-1]),
-                "source": "Yahoo Finance Historical",
-                "timestamp": hist.index[-1].strftime("%Y-%m-%d %H:%M:%S"),
-                "data_age_warning": "May be delayed up to 15 minutes"
-            }
-        
+        return await single_flight(f"stock:{symbol}", partial(leased_fetch, symbol, partial(fetch_recording_failures, symbol)))
+    except Exception as e:
+        logger.error(f"Error fetching comprehensive data for {symbol}: {str(e)}")
         return None
-        
+
+async def fetch_recording_failures(symbol: str, retry: bool = False) -> Optional[Dict]:
+    """Run _fetch_comprehensive_stock_data (under rate_limited_request if retry), feeding a failure
+    that survived every attempt to the negative cache once; the failure is re-raised"""
+    try:
+        if retry:
+            return await rate_limited_request(_fetch_comprehensive_stock_data, symbol)
+        return await _fetch_comprehensive_stock_data(symbol)
+    except Exception as e:
+        # Open circuits, throttling and timeouts say nothing about the symbol itself
+        if not isinstance(e, UpstreamUnavailableError) and classify_upstream_error(e) == "error":
+            record_symbol_failure(symbol, str(e), not_found=False)
+        raise
+
+async def _fetch_comprehensive_stock_data(symbol: str) -> Optional[Dict]:
+    """Uncoalesced body of fetch_comprehensive_stock_data.
+
+    Upstream and transport errors propagate, so the retry layer, retry budget and callers
+    see them. A ticker the provider reports as missing, an empty history and errors in the
+    analysis itself return None.
+    """
+    upstream_calls = {}
+
+    try:
+        hist = await fetch_history_incremental(symbol)
     except Exception as e:
-        logger.error(f"Real-time price fetch failed for {symbol}: {str(e)}")
+        if classify_upstream_error(e) != "not_found":
+            raise
+        logger.warning(f"No such ticker upstream for {symbol}: {str(e)}")
+        record_symbol_failure(symbol, str(e), not_found=True)
         return None
+    upstream_calls["history"] = 1
+
+    if hist is None or hist.empty:
+        logger.warning(f"No price history available for {symbol}")
+        record_symbol_failure(symbol, "No price history available", not_found=False)
+        return None
+
+    # Fundamentals come from their own daily cache (failures fall back to stored or no fundamentals);
+    # a live quote only when it was just refreshed
+    info, quote = await get_fundamentals(symbol)
+    upstream_calls["fundamentals"] = 1 if quote else 0
 
-async def fetch_comprehensive_stock_data(symbol: str) -> Optional[Dict]:
-    """Fetch comprehensive stock data with validation and accuracy checks"""
     try:
-        # Get real-time price data with validation
-        real_time_data = await get_real_time_nse_price(symbol)
-        
-        if not real_time_data:
-            logger.warning(f"No real-time data available for {symbol}")
-            return None
-        
-        ticker_symbol = f"{symbol}.NS"
-        
-        loop = asyncio.get_event_loop()
-        
-        def get_stock_info():
-            ticker = yf.Ticker(ticker_symbol)
-            hist = ticker.history(period="1y")  # Get 1 year of data
-            info = ticker.info
-            return hist, info
-        
-        hist, info = await loop.run_in_executor(executor, get_stock_info)
-        
-        if hist.empty:
-            return None
-        
+        real_time_data = derive_price_snapshot(hist, quote)
+        real_time_data["upstream_calls"] = upstream_calls
+        real_time_data["degraded"] = circuit_open(upstream_provider("history"))
+
+        await warm_restore([f"indicator_{symbol}"])
+        await update_universe_store(symbol, hist)
+        stock_data = build_stock_analysis(symbol, hist, info, real_time_data)
+        record_symbol_success(symbol)
+        return stock_data
+    except Exception as e:
+        logger.error(f"Error analysing {symbol}: {str(e)}")
+        return None
+
+# yfinance info fields the analysis and API read; the rest of the quote blob is not cached
+STOCK_INFO_FIELDS = (
+    'longName', 'marketCap', 'beta', 'trailingPE', 'priceToBook', 'returnOnEquity', 'debtToEquity',
+    'dividendYield', 'bookValue', 'trailingEps', 'sector', 'industry', 'earningsGrowth', 'revenueGrowth'
+)
+CHART_TIMEFRAMES = {"1mo": 30, "3mo": 90, "6mo": 180, "1y": None}  # Timeframe -> trailing bars (None = all)
+
+
+class CompactStockEntry(Mapping):
+    """Analysis result as held in the cache: summary fields plus one columnar copy of the history.
+
+    Reads like the dict build_stock_analysis used to return, but chart_data timeframes are
+    built from the OHLCV arrays on access instead of being stored as four lists of per-bar
+    dicts, and info keeps only STOCK_INFO_FIELDS. with_cache_info() returns a view that
+    shares the arrays; to_dict() materialises a plain dict for JSON responses.
+    """
+    __slots__ = ('summary', 'dates', 'ohlcv', 'info', 'cache_info')
+
+    def __init__(self, summary: Dict, hist: pd.DataFrame, info: Dict):
+        self.summary = summary
+        self.dates = hist.index
+        self.ohlcv = hist.reindex(columns=OHLCV_COLUMNS).to_numpy(dtype=np.float64)
+        self.info = {field: info[field] for field in STOCK_INFO_FIELDS if info.get(field) is not None}
+        self.cache_info = None
+
+    @classmethod
+    def from_columns(cls, summary: Dict, dates: pd.DatetimeIndex, ohlcv: np.ndarray, info: Dict) -> 'CompactStockEntry':
+        """Rebuild an entry from already-columnar parts (e.g. read back from a durable cache)"""
+        entry = cls.__new__(cls)
+        entry.summary, entry.dates, entry.ohlcv, entry.info = summary, dates, ohlcv, info
+        entry.cache_info = None
+        return entry
+
+    def __getitem__(self, key: str):
+        if key == "chart_data":
+            return self.chart_data()
+        if key == "info":
+            return self.info
+        if self.cache_info and key in self.cache_info:
+            return self.cache_info[key]
+        return self.summary[key]
+
+    def __iter__(self):
+        cache_info = self.cache_info or {}
+        yield from (key for key in self.summary if key not in cache_info)
+        yield "chart_data"
+        yield "info"
+        yield from cache_info
+
+    def __len__(self) -> int:
+        cache_info = self.cache_info or {}
+        return sum(1 for key in self.summary if key not in cache_info) + 2 + len(cache_info)
+
+    def history(self) -> pd.DataFrame:
+        return pd.DataFrame(self.ohlcv, index=self.dates, columns=OHLCV_COLUMNS)
+
+    def chart_view(self, timeframe: str) -> List[Dict]:
+        """Per-bar records for one timeframe, in the reset_index().to_dict('records') shape"""
+        bars = CHART_TIMEFRAMES[timeframe]
+        hist = self.history()
+        return (hist.tail(bars) if bars else hist).reset_index().to_dict('records')
+
+    def chart_data(self) -> Dict[str, List[Dict]]:
+        return {timeframe: self.chart_view(timeframe) for timeframe in CHART_TIMEFRAMES}
+
+    def with_cache_info(self, **cache_info) -> 'CompactStockEntry':
+        view = CompactStockEntry.from_columns(self.summary, self.dates, self.ohlcv, self.info)
+        view.cache_info = cache_info
+        return view
+
+    def to_dict(self) -> Dict:
+        return {key: self[key] for key in self}
+
+
+async def update_universe_store(symbol: str, hist: pd.DataFrame) -> None:
+    """Keep the shared universe array in step with the latest download (file locking runs off the loop)"""
+    try:
+        await asyncio.get_event_loop().run_in_executor(executor, UNIVERSE_STORE.write_symbol, symbol, hist)
+    except Exception as e:
+        logger.warning(f"Universe store update failed for {symbol}: {str(e)}")
+
+def build_stock_analysis(symbol: str, hist: pd.DataFrame, info: Dict, real_time_data: Dict) -> Optional[CompactStockEntry]:
+    """Run indicators, breakout detection and recommendations over fetched history"""
+    try:
         # Use validated real-time price data
         current_price = real_time_data['current_price']
         change_percent = real_time_data['change_percent']
         volume = real_time_data.get('volume', int(hist['Volume'].iloc[-1]) if not hist.empty else 0)
         
-        # Calculate all technical indicators
-        technical_indicators = calculate_advanced_technical_indicators(hist)
+        # Calculate all technical indicators (O(1) per new bar once the state is seeded)
+        technical_indicators = get_incremental_indicators(symbol, hist)
         
         # Extract fundamental data
         fundamental_data = extract_fundamental_data(info)
@@ -1561,23 +4404,18 @@ async def fetch_comprehensive_stock_data(symbol: str) -> Optional[Dict]:
         # Get sector information
         sector = NSE_SYMBOLS.get(symbol, "Unknown")
         
-        # Prepare chart data for different timeframes
-        chart_data = {
-            "1mo": hist.tail(30).reset_index().to_dict('records'),
-            "3mo": hist.tail(90).reset_index().to_dict('records'),
-            "6mo": hist.tail(180).reset_index().to_dict('records'),
-            "1y": hist.reset_index().to_dict('records')
-        }
-        
         # Add data validation info
         data_validation = {
             "source": real_time_data.get('source', 'Yahoo Finance'),
             "timestamp": real_time_data.get('timestamp', datetime.now(timezone.utc).isoformat()),
             "data_age_warning": real_time_data.get('data_age_warning'),
-            "last_market_close": hist.index[-1].strftime("%Y-%m-%d") if not hist.empty else None
+            "last_market_close": hist.index[-1].strftime("%Y-%m-%d") if not hist.empty else None,
+            "upstream_calls": real_time_data.get('upstream_calls', {}),
+            "degraded": real_time_data.get('degraded', False)
         }
         
-        return {
+        # Chart timeframes and the trimmed info are derived from hist/info by the entry itself
+        return CompactStockEntry({
             "symbol": symbol,
             "name": info.get('longName', symbol),
             "current_price": current_price,
@@ -1590,12 +4428,10 @@ async def fetch_comprehensive_stock_data(symbol: str) -> Optional[Dict]:
             "risk_assessment": risk_assessment,
             "breakout_data": breakout_data,
             "trading_recommendation": trading_recommendation,
-            "chart_data": chart_data,
-            "data_validation": data_validation,
-            "info": info
-        }
+            "data_validation": data_validation
+        }, hist, info)
     except Exception as e:
-        logger.error(f"Error fetching comprehensive data for {symbol}: {str(e)}")
+        logger.error(f"Error analysing stock data for {symbol}: {str(e)}")
         return None
 
 
@@ -1782,159 +4618,511 @@ async def get_nse_symbols():
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
 
-@api_router.get("/stocks/search")
-async def search_stocks(q: str):
-    """Search stocks by symbol or name"""
-    query = q.upper()
-    matching_symbols = [
-        {"symbol": symbol, "sector": sector} 
-        for symbol, sector in NSE_SYMBOLS.items() 
-        if query in symbol
-    ]
-    return {"results": matching_symbols[:10], "query": q}
+@api_router.get("/stocks/search")
+async def search_stocks(q: str):
+    """Search stocks by symbol or name"""
+    query = q.upper()
+    matching_symbols = [
+        {"symbol": symbol, "sector": sector} 
+        for symbol, sector in NSE_SYMBOLS.items() 
+        if query in symbol
+    ]
+    return {"results": matching_symbols[:10], "query": q}
+
+def build_breakout_stock(symbol: str, result: Dict) -> Optional[Dict]:
+    """Shape one analysed symbol into a scan result row, None when it has no breakout"""
+    if not result or not result.get('breakout_data'):
+        return None
+    breakout_data = result['breakout_data']
+    return {
+        "symbol": symbol,
+        "name": result['name'],
+        "current_price": result['current_price'],
+        "breakout_price": breakout_data['breakout_price'],
+        "breakout_type": breakout_data['type'],
+        "confidence_score": breakout_data['confidence'],
+        "change_percent": result['change_percent'],
+        "volume": result['volume'],
+        "sector": result.get('sector', 'Unknown'),
+        "technical_data": result['technical_indicators'],
+        "fundamental_data": result['fundamental_data'],
+        "risk_assessment": result['risk_assessment'],
+        "trading_recommendation": result.get('trading_recommendation'),
+        "reason": f"Breakout above {breakout_data['type']} level with {breakout_data['confidence']*100:.0f}% confidence",
+        "data_source": result.get('data_validation', {}).get('source', 'Yahoo Finance'),
+        "last_updated": result.get('data_validation', {}).get('timestamp', datetime.now(timezone.utc).isoformat())
+    }
+
+# Numeric range filters: name -> location of the value inside a scan result row
+SCAN_RANGE_FIELDS = {
+    "rsi": ("technical_data", "rsi"),
+    "volume_ratio": ("technical_data", "volume_ratio"),
+    "pe": ("fundamental_data", "pe_ratio")
+}
+
+def scan_range_value(breakout_stock: Dict, name: str) -> Optional[float]:
+    section, key = SCAN_RANGE_FIELDS[name]
+    return (breakout_stock.get(section) or {}).get(key)
+
+def scan_range_filters(min_rsi: Optional[float] = None, max_rsi: Optional[float] = None,
+                       min_volume_ratio: Optional[float] = None, max_volume_ratio: Optional[float] = None,
+                       max_pe: Optional[float] = None) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+    """Collect the scan's (low, high) range filters, skipping unbounded ones"""
+    ranges = {
+        "rsi": (min_rsi, max_rsi),
+        "volume_ratio": (min_volume_ratio, max_volume_ratio),
+        "pe": (None, max_pe)
+    }
+    return {name: bounds for name, bounds in ranges.items() if bounds != (None, None)}
+
+def matches_scan_filters(breakout_stock: Dict, min_confidence: float = 0.5, risk_level: Optional[str] = None,
+                         action: Optional[str] = None, breakout_type: Optional[str] = None,
+                         ranges: Optional[Dict] = None) -> bool:
+    """Apply the scan's confidence, risk level, action, breakout type and range filters to a result row"""
+    # Apply confidence filter
+    if breakout_stock['confidence_score'] < min_confidence:
+        return False
+    
+    # Apply risk level filter
+    if risk_level and risk_level != 'All' and (breakout_stock.get('risk_assessment') or {}).get('risk_level') != risk_level:
+        return False
+    
+    # Apply action filter
+    trading_rec = breakout_stock.get('trading_recommendation')
+    stock_action = trading_rec.get('action', 'WAIT') if trading_rec else 'WAIT'
+    if action and action != 'All' and stock_action != action:
+        return False
+    
+    # Apply breakout type filter
+    if breakout_type and breakout_type != 'All' and breakout_stock.get('breakout_type', '') != breakout_type:
+        return False
+    
+    # Apply range filters (rows without the value never match)
+    for name, (low, high) in (ranges or {}).items():
+        value = scan_range_value(breakout_stock, name)
+        if value is None or (low is not None and value < low) or (high is not None and value > high):
+            return False
+    
+    return True
+
+class ScanIndex:
+    """Columnar filter index over the rows of a scan snapshot.
+
+    Rows are kept in symbol priority order. Categorical columns (sector, risk level, action,
+    breakout type) are stored as codes with one boolean bitmap per value, confidence as a
+    sorted array, and range columns as float arrays, so a filter combination resolves to a
+    handful of bitmap intersections.
+    """
+    CATEGORIES = ('sector', 'risk_level', 'action', 'breakout_type')
+
+    def __init__(self, rows: Dict[str, Dict], scanned: frozenset, priority: List[str]):
+        # Global and per-sector priority rank, used to reproduce the scan's limit semantics
+        rank, sector_rank, sector_counts = {}, {}, {}
+        for i, symbol in enumerate(priority):
+            sector = NSE_SYMBOLS.get(symbol)
+            rank[symbol] = i
+            sector_rank[symbol] = sector_counts.get(sector, 0)
+            sector_counts[sector] = sector_rank[symbol] + 1
+
+        # Rows of symbols a live scan would skip (e.g. quarantined since) fall outside every limit
+        unranked = np.iinfo(np.int64).max
+        self.symbols = sorted(rows, key=lambda symbol: rank.get(symbol, unranked))
+        self.rows = [rows[symbol] for symbol in self.symbols]
+        self.rank = np.array([rank.get(symbol, unranked) for symbol in self.symbols], dtype=np.int64)
+        self.sector_rank = np.array([sector_rank.get(symbol, unranked) for symbol in self.symbols], dtype=np.int64)
+
+        self.codes = {}
+        self.bitmaps = {}
+        for column in self.CATEGORIES:
+            values = [self._category(row, column) for row in self.rows]
+            categories = list(dict.fromkeys(values))
+            codes = np.array([categories.index(value) for value in values], dtype=np.int16)
+            self.codes[column] = codes
+            self.bitmaps[column] = {value: codes == code for code, value in enumerate(categories)}
+
+        self.confidence = np.array([row['confidence_score'] for row in self.rows], dtype=np.float64)
+        self.confidence_order = np.argsort(self.confidence, kind='stable')
+        self.sorted_confidence = self.confidence[self.confidence_order]
+
+        self.ranges = {
+            name: np.array([np.nan if scan_range_value(row, name) is None else scan_range_value(row, name)
+                            for row in self.rows], dtype=np.float64)
+            for name in SCAN_RANGE_FIELDS
+        }
+
+        # Sorted ranks of every scanned symbol, to count coverage under a limit
+        self.scanned_rank = np.sort(np.array([rank[s] for s in scanned if s in rank], dtype=np.int64))
+        self.scanned_sector_rank = {}
+        for symbol in scanned:
+            if symbol in rank:
+                self.scanned_sector_rank.setdefault(NSE_SYMBOLS.get(symbol), []).append(sector_rank[symbol])
+        self.scanned_sector_rank = {k: np.sort(np.array(v, dtype=np.int64)) for k, v in self.scanned_sector_rank.items()}
+
+    @staticmethod
+    def _category(row: Dict, column: str):
+        if column == 'risk_level':
+            return (row.get('risk_assessment') or {}).get('risk_level')
+        if column == 'action':
+            trading_rec = row.get('trading_recommendation')
+            return trading_rec.get('action', 'WAIT') if trading_rec else 'WAIT'
+        return row.get(column)
+
+    def _bitmap(self, column: str, value) -> np.ndarray:
+        bitmap = self.bitmaps[column].get(value)
+        return bitmap if bitmap is not None else np.zeros(len(self.rows), dtype=bool)
+
+    def query(self, sector: Optional[str] = None, min_confidence: float = 0.5, risk_level: Optional[str] = None,
+              action: Optional[str] = None, breakout_type: Optional[str] = None, limit: int = 100,
+              ranges: Optional[Dict] = None) -> Tuple[List[Dict], int]:
+        """Matching rows sorted by confidence (ties in priority order) and the number of symbols scanned"""
+        mask = np.zeros(len(self.rows), dtype=bool)
+        mask[self.confidence_order[np.searchsorted(self.sorted_confidence, min_confidence, side='left'):]] = True
+
+        if sector and sector != "All":
+            mask &= self._bitmap('sector', sector) & (self.sector_rank < limit)
+            scanned = self.scanned_sector_rank.get(sector, np.empty(0, dtype=np.int64))
+        else:
+            mask &= self.rank < limit
+            scanned = self.scanned_rank
+        for column, value in (('risk_level', risk_level), ('action', action), ('breakout_type', breakout_type)):
+            if value and value != 'All':
+                mask &= self._bitmap(column, value)
+        with np.errstate(invalid='ignore'):
+            for name, (low, high) in (ranges or {}).items():
+                values = self.ranges[name]
+                mask &= ~np.isnan(values)
+                if low is not None:
+                    mask &= values >= low
+                if high is not None:
+                    mask &= values <= high
+
+        selected = np.flatnonzero(mask)
+        selected = selected[np.argsort(-self.confidence[selected], kind='stable')]
+        return [self.rows[i] for i in selected], int(np.searchsorted(scanned, limit, side='left'))
+
+class ScanSnapshot:
+    """Immutable, versioned result of analysing the whole universe once.
+
+    rows holds the scan result row of every symbol with a breakout; scanned is the set of
+    symbols that returned data. The refresher swaps SCAN_SNAPSHOT for a new instance and
+    never mutates a published one, so queries can read it without locking.
+    """
+    __slots__ = ('version', 'built_at', 'build_seconds', 'rows', 'scanned', 'index', 'expires_at')
+
+    def __init__(self, version: int, built_at: datetime, build_seconds: float,
+                 rows: Dict[str, Dict], scanned: frozenset):
+        self.version = version
+        self.built_at = built_at
+        self.build_seconds = build_seconds
+        self.rows = MappingProxyType(rows)
+        self.scanned = scanned
+        # Ranked in the order live scans cover symbols, so a limit selects the same symbols either way
+        self.index = ScanIndex(rows, scanned, select_scan_symbols(None, len(NSE_SYMBOLS)))
+        # A snapshot built from settled end-of-day bars stays fresh until the next pre-open
+        self.expires_at = market_data_expires_at(built_at.timestamp(), SCAN_SNAPSHOT_MAX_AGE_SECONDS)
+
+    def age_seconds(self) -> float:
+        return (datetime.now(timezone.utc) - self.built_at).total_seconds()
+
+    def is_fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+def select_scan_symbols(sector: Optional[str], limit: int) -> List[str]:
+    """Priority-ordered symbols a scan covers, optionally restricted to one sector; quarantined ones are left out"""
+    all_symbols = [s for s in get_symbols_by_priority() if not symbol_quarantined(s)]
+    if sector and sector != "All":
+        return [s for s in all_symbols if NSE_SYMBOLS.get(s) == sector][:limit]
+    return all_symbols[:limit]
+
+async def build_scan_snapshot() -> ScanSnapshot:
+    """Analyse every symbol once in bulk batches and package the result as a new snapshot"""
+    start = time.perf_counter()
+    symbols = select_scan_symbols(None, len(NSE_SYMBOLS))
+    rows = {}
+    scanned = set()
+
+    # Symbols whose history cannot produce any breakout have data but need no full analysis
+    def _prefilter(symbol: str, hist: pd.DataFrame) -> bool:
+        if passes_breakout_prefilter(hist):
+            return True
+        scanned.add(symbol)
+        return False
+
+    for i in range(0, len(symbols), BATCH_SIZE):
+        batch_symbols = symbols[i:i + BATCH_SIZE]
+        batch_results = await fetch_stock_data_batch(batch_symbols, prefilter=_prefilter, allow_stale=False)
+        for symbol, result in zip(batch_symbols, batch_results):
+            if not isinstance(result, Mapping) or not result:
+                continue
+            scanned.add(symbol)
+            breakout_stock = build_breakout_stock(symbol, result)
+            if breakout_stock:
+                rows[symbol] = breakout_stock
+
+    version = SCAN_SNAPSHOT.version + 1 if SCAN_SNAPSHOT else 1
+    return ScanSnapshot(version, datetime.now(timezone.utc), time.perf_counter() - start, rows, frozenset(scanned))
+
+def scan_snapshot_refresh_delay(snapshot: ScanSnapshot) -> float:
+    """Seconds until a snapshot is due for a rebuild"""
+    if market_session() == "CLOSED" and snapshot.expires_at >= next_market_open().timestamp():
+        # Built from settled bars, which cannot change before the next pre-open
+        return max(snapshot.expires_at - time.time(), 60)
+    return max(SCAN_SNAPSHOT_REFRESH_SECONDS - snapshot.age_seconds(), 0)
+
+async def scan_snapshot_refresher():
+    """Background task that keeps SCAN_SNAPSHOT current.
+
+    Only the worker holding the background lease builds snapshots, persisting each one to the
+    warm-restart store; the other workers adopt the persisted snapshot when a newer one appears.
+    """
+    global SCAN_SNAPSHOT
+    # A snapshot restored from the warm-restart store may still be current
+    await restore_warm_state()
+    loop = asyncio.get_event_loop()
+    while True:
+        try:
+            if not BACKGROUND_LEASE["held"]:
+                fields = await loop.run_in_executor(executor, load_persisted_snapshot)
+                if fields is not None:
+                    await adopt_persisted_snapshot(fields)
+                await asyncio.sleep(SCAN_SNAPSHOT_POLL_SECONDS)
+                continue
+            if SCAN_SNAPSHOT is not None and scan_snapshot_refresh_delay(SCAN_SNAPSHOT) > 0:
+                # Wake up regularly so a lost lease is noticed while waiting for the next build
+                await asyncio.sleep(min(scan_snapshot_refresh_delay(SCAN_SNAPSHOT), SCAN_SNAPSHOT_POLL_SECONDS))
+                continue
+            snapshot = await build_scan_snapshot()
+            SCAN_SNAPSHOT = snapshot
+            await loop.run_in_executor(executor, write_warm_state, [scan_snapshot_row(snapshot)], [])
+            WARM_STATE_STATS["saved_snapshot_version"] = snapshot.version
+            logger.info(f"Scan snapshot v{snapshot.version} built in {snapshot.build_seconds:.1f}s: "
+                        f"{len(snapshot.rows)} breakouts across {len(snapshot.scanned)} symbols")
+            if scan_snapshot_refresh_delay(snapshot) > SCAN_SNAPSHOT_REFRESH_SECONDS:
+                logger.info(f"Market closed; next scan snapshot refresh at {next_market_open().strftime('%A %d %b %I:%M %p IST')}")
+        except Exception as e:
+            logger.error(f"Scan snapshot refresh error: {str(e)}")
+            await asyncio.sleep(60)  # Wait 1 minute before retrying
+
+def query_scan_snapshot(snapshot: ScanSnapshot, sector: Optional[str] = None, min_confidence: float = 0.5,
+                        risk_level: Optional[str] = None, action: Optional[str] = None,
+                        breakout_type: Optional[str] = None, limit: int = 100,
+                        ranges: Optional[Dict] = None) -> Dict:
+    """Answer a scan request by filtering, sorting and slicing a published snapshot"""
+    start = time.perf_counter()
+    breakout_stocks, total_processed = snapshot.index.query(
+        sector, min_confidence, risk_level, action, breakout_type, limit, ranges
+    )
+    query_ms = (time.perf_counter() - start) * 1000
+    
+    sector_breakouts = {}
+    for breakout_stock in breakout_stocks:
+        sector_breakouts[breakout_stock['sector']] = sector_breakouts.get(breakout_stock['sector'], 0) + 1
+    
+    return {
+        "breakout_stocks": breakout_stocks,
+        "scan_statistics": {
+            "total_symbols_in_db": len(NSE_SYMBOLS),
+            "total_scanned": total_processed,
+            "breakouts_found": len(breakout_stocks),
+            "success_rate": f"{(len(breakout_stocks) / max(total_processed, 1)) * 100:.1f}%",
+            "cache_usage": f"Snapshot v{snapshot.version} with {len(snapshot.rows)} breakouts"
+        },
+        "sector_breakdown": sector_breakouts,
+        "scanning_info": {
+            "batch_size": BATCH_SIZE,
+            "total_nse_stocks": len(NSE_SYMBOLS),
+            "cache_expiry_minutes": CACHE_EXPIRY_MINUTES,
+            "processing_method": "Materialized snapshot",
+            "snapshot_version": snapshot.version,
+            "snapshot_built_at": snapshot.built_at.isoformat(),
+            "snapshot_age_seconds": round(snapshot.age_seconds(), 1),
+            "index_query_ms": round(query_ms, 3)
+        }
+    }
+
+def scan_filters_applied(sector: Optional[str], min_confidence: float, risk_level: Optional[str],
+                         action: Optional[str], breakout_type: Optional[str], limit: int,
+                         use_cache: bool, ranges: Dict) -> Dict:
+    return {
+        "sector": sector or "All",
+        "min_confidence": min_confidence,
+        "risk_level": risk_level or "All",
+        "action": action or "All",
+        "breakout_type": breakout_type or "All",
+        "limit": limit,
+        "use_cache": use_cache,
+        "ranges": ranges
+    }
 
-@api_router.get("/stocks/breakouts/scan")
-async def scan_breakout_stocks(
+async def iter_breakout_scan(
     sector: Optional[str] = None,
     min_confidence: float = 0.5,
     risk_level: Optional[str] = None,
     action: Optional[str] = None,
     breakout_type: Optional[str] = None,
     limit: int = 100,
-    use_cache: bool = True
+    use_cache: bool = True,
+    ranges: Optional[Dict] = None
 ):
-    """Enhanced breakout scanning with batch processing and caching for full NSE coverage"""
-    try:
-        # Clear old cache entries first
-        if use_cache:
-            clear_old_cache_entries()
-        
-        breakout_stocks = []
+    """Run a breakout scan, yielding events as soon as each batch resolves.
+
+    Yields {"event": "breakout", "data": row} for every qualifying stock, one
+    {"event": "progress", ...} per batch and a final {"event": "summary", ...} carrying
+    scan_statistics, sector_breakdown, filters_applied and scanning_info.
+    """
+    ranges = ranges or {}
+    filters_applied = scan_filters_applied(sector, min_confidence, risk_level, action, breakout_type, limit, use_cache, ranges)
+    
+    # Serve from the materialized snapshot when one is current
+    snapshot = SCAN_SNAPSHOT
+    if use_cache and snapshot is not None and snapshot.is_fresh():
+        response = query_scan_snapshot(snapshot, sector, min_confidence, risk_level, action, breakout_type, limit, ranges)
+        for breakout_stock in response.pop("breakout_stocks"):
+            yield {"event": "breakout", "data": breakout_stock}
+        response["filters_applied"] = filters_applied
+        response["timestamp"] = datetime.now(timezone.utc).isoformat()
+        yield {"event": "summary", "data": response}
+        return
+    
+    # Clear old cache entries first
+    if use_cache:
+        clear_old_cache_entries()
+    
+    # Get prioritized symbols list, filtered by sector if specified
+    symbols_to_scan = select_scan_symbols(sector, limit)
+    total_batches = (len(symbols_to_scan) + BATCH_SIZE - 1) // BATCH_SIZE
+    
+    logger.info(f"Scanning {len(symbols_to_scan)} stocks for breakouts (sector: {sector or 'All'})")
+    
+    # Process symbols in batches for better performance
+    total_processed = 0
+    breakouts_found = 0
+    sector_breakouts = {}
+    
+    # Symbols whose history cannot produce a matching breakout skip quote/risk/trading work
+    prefiltered_out = []
+    
+    def _breakout_prefilter(symbol: str, hist: pd.DataFrame) -> bool:
+        if passes_breakout_prefilter(hist, breakout_type, min_confidence):
+            return True
+        prefiltered_out.append(symbol)
+        return False
+    
+    for i in range(0, len(symbols_to_scan), BATCH_SIZE):
+        batch_symbols = symbols_to_scan[i:i + BATCH_SIZE]
         
-        # Get prioritized symbols list
-        all_symbols = get_symbols_by_priority()
+        logger.info(f"Processing batch {i//BATCH_SIZE + 1}: {len(batch_symbols)} stocks")
         
-        # Filter symbols by sector if specified
-        if sector and sector != "All":
-            filtered_symbols = [s for s in all_symbols if NSE_SYMBOLS.get(s) == sector]
-            symbols_to_scan = filtered_symbols[:limit]
+        # Use batch processing with caching
+        if use_cache:
+            batch_results = await fetch_stock_data_batch(batch_symbols, prefilter=_breakout_prefilter)
         else:
-            symbols_to_scan = all_symbols[:limit]
-        
-        logger.info(f"Scanning {len(symbols_to_scan)} stocks for breakouts (sector: {sector or 'All'})")
-        
-        # Process symbols in batches for better performance
-        total_processed = 0
-        sector_breakouts = {}
-        
-        for i in range(0, len(symbols_to_scan), BATCH_SIZE):
-            batch_symbols = symbols_to_scan[i:i + BATCH_SIZE]
-            
-            logger.info(f"Processing batch {i//BATCH_SIZE + 1}: {len(batch_symbols)} stocks")
-            
-            # Use batch processing with caching
-            if use_cache:
-                batch_results = await fetch_stock_data_batch(batch_symbols)
-            else:
-                # Fetch data without caching for real-time analysis
-                tasks = [fetch_comprehensive_stock_data(symbol) for symbol in batch_symbols]
-                batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Process batch results
-            for j, result in enumerate(batch_results):
-                if isinstance(result, dict) and result and result.get('breakout_data'):
-                    symbol = batch_symbols[j]
-                    breakout_data = result['breakout_data']
-                    
-                    # Apply confidence filter
-                    if breakout_data['confidence'] < min_confidence:
-                        continue
-                    
-                    # Apply risk level filter
-                    if risk_level and risk_level != 'All' and result.get('risk_assessment', {}).get('risk_level') != risk_level:
-                        continue
-                    
-                    # Apply action filter
-                    trading_rec = result.get('trading_recommendation', {})
-                    stock_action = trading_rec.get('action', 'WAIT') if trading_rec else 'WAIT'
-                    if action and action != 'All' and stock_action != action:
-                        continue
-                    
-                    # Apply breakout type filter
-                    stock_breakout_type = breakout_data.get('type', '')
-                    if breakout_type and breakout_type != 'All' and stock_breakout_type != breakout_type:
-                        continue
-                    
-                    stock_sector = result.get('sector', 'Unknown')
-                    technical_indicators = result['technical_indicators']
-                    fundamental_data = result['fundamental_data']
-                    risk_assessment = result['risk_assessment']
-                    
+            # Fetch data without caching for real-time analysis
+            tasks = [fetch_comprehensive_stock_data(symbol) for symbol in batch_symbols]
+            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        # Process batch results
+        for j, result in enumerate(batch_results):
+            if isinstance(result, Mapping) and result:
+                breakout_stock = build_breakout_stock(batch_symbols[j], result)
+                if breakout_stock and matches_scan_filters(breakout_stock, min_confidence, risk_level, action, breakout_type, ranges):
                     # Count breakouts by sector
+                    stock_sector = breakout_stock['sector']
                     sector_breakouts[stock_sector] = sector_breakouts.get(stock_sector, 0) + 1
-                    
-                    breakout_stock = {
-                        "symbol": symbol,
-                        "name": result['name'],
-                        "current_price": result['current_price'],
-                        "breakout_price": breakout_data['breakout_price'],
-                        "breakout_type": breakout_data['type'],
-                        "confidence_score": breakout_data['confidence'],
-                        "change_percent": result['change_percent'],
-                        "volume": result['volume'],
-                        "sector": stock_sector,
-                        "technical_data": technical_indicators,
-                        "fundamental_data": fundamental_data,
-                        "risk_assessment": risk_assessment,
-                        "trading_recommendation": result.get('trading_recommendation'),
-                        "reason": f"Breakout above {breakout_data['type']} level with {breakout_data['confidence']*100:.0f}% confidence",
-                        "data_source": result.get('data_validation', {}).get('source', 'Yahoo Finance'),
-                        "last_updated": result.get('data_validation', {}).get('timestamp', datetime.now(timezone.utc).isoformat())
-                    }
-                    
-                    breakout_stocks.append(breakout_stock)
-                
-                total_processed += 1
+                    breakouts_found += 1
+                    yield {"event": "breakout", "data": breakout_stock}
             
-            # Add a small delay between batches to manage system resources
-            if i + BATCH_SIZE < len(symbols_to_scan):
-                await asyncio.sleep(0.5)  # 500ms delay between batches
-        
-        # Sort by confidence score
-        breakout_stocks.sort(key=lambda x: x['confidence_score'], reverse=True)
-        
-        # Calculate scan statistics
-        scan_stats = {
-            "total_symbols_in_db": len(NSE_SYMBOLS),
-            "total_scanned": total_processed,
-            "breakouts_found": len(breakout_stocks),
-            "success_rate": f"{(len(breakout_stocks) / max(total_processed, 1)) * 100:.1f}%",
-            "cache_usage": f"{len(STOCK_DATA_CACHE)} cached entries" if use_cache else "Cache disabled"
+            total_processed += 1
+        
+        yield {
+            "event": "progress",
+            "data": {
+                "batch": i // BATCH_SIZE + 1,
+                "total_batches": total_batches,
+                "processed": total_processed,
+                "total_symbols": len(symbols_to_scan),
+                "breakouts_found": breakouts_found
+            }
         }
         
-        logger.info(f"Scan completed: {scan_stats}")
-        
-        return {
-            "breakout_stocks": breakout_stocks,
+        # Add a small delay between batches to manage system resources
+        if i + BATCH_SIZE < len(symbols_to_scan):
+            await asyncio.sleep(0.5)  # 500ms delay between batches
+    
+    # Calculate scan statistics
+    scan_stats = {
+        "total_symbols_in_db": len(NSE_SYMBOLS),
+        "total_scanned": total_processed,
+        "breakouts_found": breakouts_found,
+        "success_rate": f"{(breakouts_found / max(total_processed, 1)) * 100:.1f}%",
+        "cache_usage": f"{len(STOCK_DATA_CACHE)} cached entries" if use_cache else "Cache disabled"
+    }
+    
+    logger.info(f"Scan completed: {scan_stats}")
+    
+    yield {
+        "event": "summary",
+        "data": {
             "scan_statistics": scan_stats,
             "sector_breakdown": sector_breakouts,
-            "filters_applied": {
-                "sector": sector or "All",
-                "min_confidence": min_confidence,
-                "risk_level": risk_level or "All",
-                "action": action or "All",
-                "breakout_type": breakout_type or "All",
-                "limit": limit,
-                "use_cache": use_cache
-            },
+            "filters_applied": filters_applied,
             "scanning_info": {
                 "batch_size": BATCH_SIZE,
                 "total_nse_stocks": len(NSE_SYMBOLS),
                 "cache_expiry_minutes": CACHE_EXPIRY_MINUTES,
-                "processing_method": "Batch processing with caching" if use_cache else "Real-time processing"
+                "processing_method": "Batch processing with caching" if use_cache else "Real-time processing",
+                "planned_indicators": plan_scan_columns(breakout_type, min_confidence),
+                "prefiltered_out": len(prefiltered_out)
             },
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
+    }
+
+async def collect_breakout_scan(sector: Optional[str], min_confidence: float, risk_level: Optional[str],
+                                action: Optional[str], breakout_type: Optional[str], limit: int,
+                                use_cache: bool, ranges: Dict) -> Dict:
+    """Run iter_breakout_scan to completion and assemble the scan response"""
+    breakout_stocks = []
+    summary = {}
+    
+    async for event in iter_breakout_scan(sector, min_confidence, risk_level, action, breakout_type,
+                                          limit, use_cache, ranges):
+        if event["event"] == "breakout":
+            breakout_stocks.append(event["data"])
+        elif event["event"] == "summary":
+            summary = event["data"]
+    
+    # Sort by confidence score
+    breakout_stocks.sort(key=lambda x: x['confidence_score'], reverse=True)
+    
+    return {"breakout_stocks": breakout_stocks, **summary}
+
+@api_router.get("/stocks/breakouts/scan")
+async def scan_breakout_stocks(
+    sector: Optional[str] = None,
+    min_confidence: float = 0.5,
+    risk_level: Optional[str] = None,
+    action: Optional[str] = None,
+    breakout_type: Optional[str] = None,
+    limit: int = 100,
+    use_cache: bool = True,
+    min_rsi: Optional[float] = None,
+    max_rsi: Optional[float] = None,
+    min_volume_ratio: Optional[float] = None,
+    max_volume_ratio: Optional[float] = None,
+    max_pe: Optional[float] = None
+):
+    """Enhanced breakout scanning with batch processing and caching for full NSE coverage"""
+    try:
+        ranges = scan_range_filters(min_rsi, max_rsi, min_volume_ratio, max_volume_ratio, max_pe)
+        filters = scan_filters_applied(sector, min_confidence, risk_level, action, breakout_type, limit, use_cache, ranges)
+        
+        # Identical concurrent scans share one run
+        return await single_flight(
+            f"scan:{json.dumps(filters, sort_keys=True)}",
+            partial(collect_breakout_scan, sector, min_confidence, risk_level, action, breakout_type,
+                    limit, use_cache, ranges)
+        )
         
     except Exception as e:
         logger.error(f"Error in breakout scanning: {str(e)}")
@@ -1946,6 +5134,199 @@ async def scan_breakout_stocks(
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
 
+class ScanJob:
+    """A breakout scan running in the background, with progress and partial results"""
+
+    def __init__(self, filters: Dict):
+        self.id = str(uuid.uuid4())
+        self.filters = filters
+        self.key = json.dumps(filters, sort_keys=True)
+        self.status = "running"
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at = None
+        self.started = time.perf_counter()
+        self.total_symbols = len(select_scan_symbols(filters['sector'], filters['limit']))
+        self.processed = 0
+        self.breakout_stocks = []
+        self.summary = None
+        self.error = None
+        self.task = None
+
+    def is_expired(self) -> bool:
+        return (self.finished_at is not None
+                and datetime.now(timezone.utc) - self.finished_at > timedelta(minutes=SCAN_JOB_TTL_MINUTES))
+
+    def eta_seconds(self) -> Optional[float]:
+        if self.status != "running" or not self.processed:
+            return None
+        elapsed = time.perf_counter() - self.started
+        return round(elapsed / self.processed * (self.total_symbols - self.processed), 1)
+
+    def to_dict(self, include_results: bool = True) -> Dict:
+        job = {
+            "job_id": self.id,
+            "status": self.status,
+            "filters": self.filters,
+            "progress": {
+                "processed": self.processed,
+                "total_symbols": self.total_symbols,
+                "percent": round(self.processed / max(self.total_symbols, 1) * 100, 1),
+                "breakouts_found": len(self.breakout_stocks),
+                "eta_seconds": self.eta_seconds()
+            },
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error
+        }
+        if include_results:
+            job["breakout_stocks"] = sorted(self.breakout_stocks, key=lambda x: x['confidence_score'], reverse=True)
+            job.update(self.summary or {})
+        return job
+
+async def run_scan_job(job: ScanJob):
+    """Drive iter_breakout_scan for a job, recording progress and partial results as they arrive"""
+    try:
+        filters = dict(job.filters)
+        ranges = filters.pop('ranges')
+        async for event in iter_breakout_scan(ranges=ranges, **filters):
+            if event["event"] == "breakout":
+                job.breakout_stocks.append(event["data"])
+            elif event["event"] == "progress":
+                job.processed = event["data"]["processed"]
+                job.total_symbols = event["data"]["total_symbols"]
+            elif event["event"] == "summary":
+                job.summary = event["data"]
+                job.processed = event["data"]["scan_statistics"].get("total_scanned", job.processed)
+        job.status = "completed"
+    except asyncio.CancelledError:
+        job.status = "cancelled"
+        raise
+    except Exception as e:
+        logger.error(f"Scan job {job.id} failed: {str(e)}")
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        job.finished_at = datetime.now(timezone.utc)
+
+def clear_expired_scan_jobs() -> int:
+    """Drop finished scan jobs older than SCAN_JOB_TTL_MINUTES"""
+    expired = [job_id for job_id, job in SCAN_JOBS.items() if job.is_expired()]
+    for job_id in expired:
+        del SCAN_JOBS[job_id]
+    return len(expired)
+
+@api_router.post("/stocks/breakouts/scan/jobs")
+async def create_scan_job(request: ScanJobRequest):
+    """Start a breakout scan in the background, reusing a running or retained job with the same filters"""
+    clear_expired_scan_jobs()
+    
+    ranges = scan_range_filters(request.min_rsi, request.max_rsi, request.min_volume_ratio,
+                                request.max_volume_ratio, request.max_pe)
+    filters = {
+        "sector": request.sector,
+        "min_confidence": request.min_confidence,
+        "risk_level": request.risk_level,
+        "action": request.action,
+        "breakout_type": request.breakout_type,
+        "limit": request.limit,
+        "use_cache": request.use_cache,
+        "ranges": ranges
+    }
+    
+    key = json.dumps(filters, sort_keys=True)
+    for job in SCAN_JOBS.values():
+        if job.key == key and job.status in ("running", "completed"):
+            return {**job.to_dict(include_results=False), "reused": True}
+    
+    job = ScanJob(filters)
+    SCAN_JOBS[job.id] = job
+    job.task = asyncio.create_task(run_scan_job(job))
+    logger.info(f"Started scan job {job.id} for {job.total_symbols} symbols")
+    return {**job.to_dict(include_results=False), "reused": False}
+
+@api_router.get("/stocks/breakouts/scan/jobs")
+async def list_scan_jobs():
+    """List running and retained scan jobs"""
+    clear_expired_scan_jobs()
+    return {
+        "jobs": [job.to_dict(include_results=False) for job in SCAN_JOBS.values()],
+        "ttl_minutes": SCAN_JOB_TTL_MINUTES,
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+@api_router.get("/stocks/breakouts/scan/jobs/{job_id}")
+async def get_scan_job(job_id: str, include_results: bool = True):
+    """Get a scan job's progress and its (partial) results"""
+    job = SCAN_JOBS.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    return job.to_dict(include_results=include_results)
+
+@api_router.post("/stocks/breakouts/scan/jobs/{job_id}/cancel")
+async def cancel_scan_job(job_id: str):
+    """Cancel a running scan job; results gathered so far are kept"""
+    job = SCAN_JOBS.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    if job.status == "running" and job.task:
+        job.task.cancel()
+        try:
+            await job.task
+        except asyncio.CancelledError:
+            pass
+    return job.to_dict(include_results=False)
+
+def _json_default(value):
+    """JSON fallback for numpy scalars and timestamps in streamed events"""
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+@api_router.get("/stocks/breakouts/scan/stream")
+async def stream_breakout_scan(
+    sector: Optional[str] = None,
+    min_confidence: float = 0.5,
+    risk_level: Optional[str] = None,
+    action: Optional[str] = None,
+    breakout_type: Optional[str] = None,
+    limit: int = 100,
+    use_cache: bool = True,
+    min_rsi: Optional[float] = None,
+    max_rsi: Optional[float] = None,
+    min_volume_ratio: Optional[float] = None,
+    max_volume_ratio: Optional[float] = None,
+    max_pe: Optional[float] = None,
+    format: str = "ndjson"
+):
+    """Stream breakouts and per-batch progress as they resolve (NDJSON or Server-Sent Events)"""
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+    
+    ranges = scan_range_filters(min_rsi, max_rsi, min_volume_ratio, max_volume_ratio, max_pe)
+    
+    async def _events():
+        try:
+            async for event in iter_breakout_scan(sector, min_confidence, risk_level, action, breakout_type,
+                                                  limit, use_cache, ranges):
+                yield event
+        except Exception as e:
+            logger.error(f"Error in streaming breakout scan: {str(e)}")
+            yield {
+                "event": "error",
+                "data": {"error": "Failed to scan stocks for breakouts", "details": str(e),
+                         "timestamp": datetime.now(timezone.utc).isoformat()}
+            }
+    
+    async def _encode():
+        async for event in _events():
+            if format == "sse":
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'], default=_json_default)}\n\n"
+            else:
+                yield json.dumps(event, default=_json_default) + "\n"
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(_encode(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
 @api_router.get("/stocks/market-overview")
 async def get_market_overview():
     """Enhanced market overview with detailed market status"""
@@ -1968,17 +5349,30 @@ async def get_market_overview():
         sector_performance = {}
         top_sectors = ["IT", "Banking", "FMCG", "Auto", "Pharma"]
         
+        # Average the latest change of every fresh symbol straight from the universe array
+        try:
+            fresh = UNIVERSE_STORE.fresh_rows()
+            changes = UNIVERSE_STORE.change_percent()
+            for sector in top_sectors:
+                rows = [UNIVERSE_STORE.index[s] for s in UNIVERSE_SYMBOLS if NSE_SYMBOLS[s] == sector]
+                sector_changes = changes[rows][fresh[rows] & ~np.isnan(changes[rows])]
+                if len(sector_changes):
+                    sector_performance[sector] = float(sector_changes.mean())
+        except Exception as e:
+            logger.warning(f"Universe store unavailable for sector performance: {str(e)}")
+        
         for sector in top_sectors:
-            sector_symbols = [s for s, sect in NSE_SYMBOLS.items() if sect == sector][:3]
-            sector_changes = []
+            if sector in sector_performance:
+                continue
             
-            for symbol in sector_symbols:
-                try:
-                    stock_data = await fetch_comprehensive_stock_data(symbol)
-                    if stock_data:
-                        sector_changes.append(stock_data['change_percent'])
-                except:
-                    continue
+            sector_symbols = [s for s, sect in NSE_SYMBOLS.items() if sect == sector][:3]
+            sector_results = await asyncio.gather(
+                *[fetch_comprehensive_stock_data(symbol) for symbol in sector_symbols], return_exceptions=True
+            )
+            sector_changes = [
+                stock_data['change_percent'] for stock_data in sector_results
+                if isinstance(stock_data, Mapping) and stock_data
+            ]
             
             if sector_changes:
                 sector_performance[sector] = sum(sector_changes) / len(sector_changes)
@@ -2038,12 +5432,23 @@ async def validate_stock_data(symbol: str):
 async def get_stock_data(symbol: str):
     """Get detailed data for a specific stock with validation"""
     symbol = symbol.upper()
+    
+    # Fresh or stale-while-revalidate cache hit
+    if MONGO_CACHE_ENABLED:
+        await load_mongo_cache([symbol])
+    cached_data = await get_cached_stock_data(symbol)
+    if cached_data:
+        return cached_data.to_dict()
+    
     stock_data = await fetch_comprehensive_stock_data(symbol)
     
     if not stock_data:
         raise HTTPException(status_code=404, detail=f"Stock data not found for {symbol}")
     
-    return stock_data
+    if served_from_cache(stock_data):
+        return stock_data.to_dict()
+    cache_stock_data(symbol, stock_data)
+    return stock_data.with_cache_info(data_age_seconds=0.0, cache_status="miss").to_dict()
 
 @api_router.get("/stocks/{symbol}/chart")
 async def get_stock_chart(symbol: str, timeframe: str = "1mo"):
@@ -2065,14 +5470,14 @@ async def get_stock_chart(symbol: str, timeframe: str = "1mo"):
         
         period = period_map.get(timeframe, "1mo")
         
-        loop = asyncio.get_event_loop()
-        
-        def get_chart_data():
-            ticker = yf.Ticker(ticker_symbol)
-            hist = ticker.history(period=period, interval="1d")
-            return hist
-        
-        hist = await loop.run_in_executor(executor, get_chart_data)
+        if period in STORED_CHART_LOOKBACK:
+            # Timeframes inside the stored 1y window are served from the local OHLCV store
+            hist = await fetch_history_incremental(symbol)
+            if not hist.empty:
+                lookback = STORED_CHART_LOOKBACK[period]
+                hist = hist.tail(lookback) if isinstance(lookback, int) else hist[hist.index > hist.index[-1] - lookback]
+        else:
+            hist = await call_upstream(symbol, "history", yf.Ticker(ticker_symbol).history, period=period, interval="1d")
         
         if hist.empty:
             raise HTTPException(status_code=404, detail=f"Chart data not found for {symbol}")
@@ -2230,7 +5635,7 @@ async def get_performance_analytics():
     try:
         # Calculate performance metrics
         total_stocks = len(NSE_SYMBOLS)
-        cache_hit_rate = len(STOCK_DATA_CACHE) / max(total_stocks, 1) * 100
+        cache_hit_rate = STOCK_DATA_CACHE.hit_ratio() * 100
         
         performance_data = {
             "system_stats": {
@@ -2358,37 +5763,76 @@ async def get_system_performance():
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
 
+async def get_shared_cache_statistics() -> Dict[str, Any]:
+    """This worker's L2 counters plus the last published L1/L2 statistics of every worker"""
+    if not SHARED_CACHE_ENABLED:
+        return {"enabled": False}
+    loop = asyncio.get_event_loop()
+    try:
+        await loop.run_in_executor(executor, publish_worker_cache_stats)
+        workers = await loop.run_in_executor(executor, load_worker_cache_stats)
+    except sqlite3.Error as e:
+        logger.warning(f"Shared cache statistics unavailable: {str(e)}")
+        workers = {}
+    return {
+        "enabled": True,
+        "path": str(SHARED_CACHE_PATH),
+        "worker": WORKER_ID,
+        "lease_seconds": SHARED_CACHE_LEASE_SECONDS,
+        "background_lease_held": BACKGROUND_LEASE["held"],
+        **SHARED_CACHE_STATS,
+        "workers": workers
+    }
+
 @api_router.get("/system/cache/stats")
 async def get_cache_statistics():
     """Get detailed cache statistics and management"""
     try:
-        current_time = time.time()
         cache_stats = {
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "total_entries": len(STOCK_DATA_CACHE),
+            "indicator_states": len(INDICATOR_STATE),
             "cache_expiry_minutes": CACHE_EXPIRY_MINUTES,
-            "entries_by_age": {
-                "fresh_0_5min": 0,
-                "recent_5_10min": 0,
-                "old_10_15min": 0,
-                "expired_15min_plus": 0
+            "cache_trading_expiry_minutes": CACHE_TRADING_EXPIRY_MINUTES,
+            "cache_hard_expiry_minutes": CACHE_HARD_EXPIRY_MINUTES,
+            "market_session": market_session(),
+            "next_market_open": next_market_open().isoformat(),
+            "stale_while_revalidate": {
+                **CACHE_REFRESH_STATS,
+                "refreshing_now": len(CACHE_REFRESHING)
+            },
+            "shared_cache": await get_shared_cache_statistics(),
+            "mongo_cache": {
+                "enabled": MONGO_CACHE_ENABLED,
+                **MONGO_CACHE_STATS,
+                "pending_writes": len(MONGO_CACHE_PENDING)
+            },
+            "warm_restart": {
+                "format": WARM_STATE_FORMAT,
+                **WARM_STATE_STATS,
+                "pending_restore": len(WARM_STATE_KEYS),
+                "dirty": len(WARM_STATE_DIRTY)
+            },
+            "negative_cache": {
+                **NEGATIVE_CACHE_STATS,
+                "backing_off": sum(1 for state in SYMBOL_FAILURES.values() if not state["quarantined"]),
+                "quarantined_now": sum(1 for state in SYMBOL_FAILURES.values() if state["quarantined"])
             },
-            "memory_usage_estimate_mb": len(STOCK_DATA_CACHE) * 0.1,  # Rough estimate
-            "hit_ratio_estimate": "N/A"  # Would need to implement hit tracking
+            "fundamentals": {
+                **FUNDAMENTALS_STATS,
+                "entries": len(FUNDAMENTALS_CACHE),
+                "min_ttl_hours": FUNDAMENTALS_MIN_TTL_HOURS
+            },
+            "entries_by_age": dict(zip(
+                ["fresh_0_5min", "recent_5_10min", "old_10_15min", "expired_15min_plus"],
+                STOCK_DATA_CACHE.entries_by_age([5, 10, 15])
+            )),
+            "memory_usage_mb": round(STOCK_DATA_CACHE.bytes / (1024 * 1024), 2),
+            "memory_budget_mb": CACHE_MAX_MEMORY_MB,
+            "hit_ratio": STOCK_DATA_CACHE.hit_ratio(),
+            "cache": STOCK_DATA_CACHE.stats()
         }
         
-        # Analyze cache entries by age
-        for key, entry in STOCK_DATA_CACHE.items():
-            age_minutes = (current_time - entry.get('timestamp', 0)) / 60
-            if age_minutes <= 5:
-                cache_stats["entries_by_age"]["fresh_0_5min"] += 1
-            elif age_minutes <= 10:
-                cache_stats["entries_by_age"]["recent_5_10min"] += 1
-            elif age_minutes <= 15:
-                cache_stats["entries_by_age"]["old_10_15min"] += 1
-            else:
-                cache_stats["entries_by_age"]["expired_15min_plus"] += 1
-        
         return cache_stats
         
     except Exception as e:
@@ -2403,7 +5847,16 @@ async def clear_cache():
     """Clear all cache entries (admin function)"""
     try:
         old_size = len(STOCK_DATA_CACHE)
+        # Cleared entries must not come back from the warm-restart store
+        WARM_STATE_DIRTY.update(STOCK_DATA_CACHE.keys())
+        WARM_STATE_DIRTY.update(key for key in WARM_STATE_KEYS if key.startswith("stock_"))
+        WARM_STATE_KEYS.difference_update(WARM_STATE_DIRTY)
         STOCK_DATA_CACHE.clear()
+        if SHARED_CACHE_ENABLED:
+            await asyncio.get_event_loop().run_in_executor(executor, clear_shared_cache)
+        # Other API instances would otherwise reload the cleared analyses from Mongo
+        if MONGO_CACHE_ENABLED:
+            await clear_mongo_cache()
         
         logger.info(f"Cache manually cleared: {old_size} entries removed")
         
@@ -2420,14 +5873,236 @@ async def clear_cache():
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
 
+@api_router.get("/system/universe/stats")
+async def get_universe_store_statistics():
+    """Get shape, coverage and date range of the memory-mapped universe array"""
+    try:
+        trading_days = UNIVERSE_STORE.trading_days()
+        fresh = UNIVERSE_STORE.fresh_rows()
+        populated = ~np.all(np.isnan(UNIVERSE_STORE.field('close')), axis=1)
+        
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "path": str(UNIVERSE_STORE.directory),
+            "shape": {
+                "symbols": len(UNIVERSE_STORE.symbols),
+                "trading_days": UNIVERSE_STORE.days,
+                "fields": list(UNIVERSE_FIELDS)
+            },
+            "size_mb": round(UNIVERSE_STORE.data.nbytes / (1024 ** 2), 2),
+            "populated_symbols": int(populated.sum()),
+            "fresh_symbols": int(fresh.sum()),
+            "first_day": trading_days[0].strftime("%Y-%m-%d") if len(trading_days) else None,
+            "last_day": trading_days[-1].strftime("%Y-%m-%d") if len(trading_days) else None
+        }
+    except Exception as e:
+        logger.error(f"Universe statistics failed: {str(e)}")
+        return {
+            "error": str(e),
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+
+@api_router.get("/stocks/indicators/universe")
+async def get_universe_indicators(sector: Optional[str] = None, fresh_only: bool = True,
+                                  columns: Optional[str] = None):
+    """Get the latest technical indicators for the whole universe as a columnar table"""
+    try:
+        requested = [c.strip() for c in columns.split(',') if c.strip()] if columns else INDICATOR_COLUMNS
+        unknown = [c for c in requested if c not in INDICATOR_COLUMNS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown indicator columns: {', '.join(unknown)}")
+        
+        start = time.perf_counter()
+        graph = UNIVERSE_STORE.indicator_graph()
+        table = graph.materialize(requested)
+        compute_ms = (time.perf_counter() - start) * 1000
+        
+        mask = UNIVERSE_STORE.fresh_rows() if fresh_only else ~np.isnan(graph.get('sma_20'))
+        if sector and sector != "All":
+            mask &= np.array([NSE_SYMBOLS[s] == sector for s in table.index])
+        table = table[mask]
+        
+        return {
+            "symbols": list(table.index),
+            "columns": {
+                name: [None if pd.isna(v) else float(v) for v in table[name]]
+                for name in table.columns
+            },
+            "total_symbols": len(table),
+            "evaluated_indicators": graph.evaluated,
+            "compute_time_ms": round(compute_ms, 2),
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Universe indicator computation failed: {str(e)}")
+        return {
+            "error": str(e),
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+
+@api_router.get("/stocks/breakouts/universe")
+async def get_universe_breakouts(
+    sector: Optional[str] = None,
+    breakout_type: Optional[str] = None,
+    min_confidence: float = 0.5,
+    fresh_only: bool = True
+):
+    """Detect breakouts across the whole shared universe store in one vectorized pass"""
+    try:
+        start = time.perf_counter()
+        graph = UNIVERSE_STORE.indicator_graph()
+        indicators = {name: graph.get(name) for name in BREAKOUT_INDICATORS}
+        price = graph.price
+        indicator_ms = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        result = detect_universe_breakouts(price, indicators)
+        detection_ms = (time.perf_counter() - start) * 1000
+        
+        mask = (result['pattern'] >= 0) & (result['confidence'] >= np.float32(min_confidence))
+        if fresh_only:
+            mask &= UNIVERSE_STORE.fresh_rows()
+        if sector and sector != "All":
+            mask &= np.array([NSE_SYMBOLS[s] == sector for s in UNIVERSE_STORE.symbols])
+        if breakout_type and breakout_type != 'All':
+            mask &= result['pattern'] == (BREAKOUT_TYPES.index(breakout_type) if breakout_type in BREAKOUT_TYPES else -2)
+        
+        rows = np.flatnonzero(mask)
+        rows = rows[np.argsort(-result['confidence'][rows], kind='stable')]
+        
+        breakouts = []
+        for row in rows:
+            symbol = UNIVERSE_STORE.symbols[row]
+            breakout_data = breakout_from_result(result[row])
+            breakouts.append({
+                "symbol": symbol,
+                "sector": NSE_SYMBOLS.get(symbol, "Unknown"),
+                "current_price": float(price[row]),
+                "breakout_price": breakout_data['breakout_price'],
+                "breakout_type": breakout_data['type'],
+                "confidence_score": breakout_data['confidence']
+            })
+        
+        return {
+            "breakout_stocks": breakouts,
+            "total_symbols": len(UNIVERSE_STORE.symbols),
+            "breakouts_found": len(breakouts),
+            "indicator_time_ms": round(indicator_ms, 2),
+            "detection_time_ms": round(detection_ms, 3),
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Universe breakout detection failed: {str(e)}")
+        return {
+            "error": str(e),
+            "breakout_stocks": [],
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+
+@api_router.get("/system/coalescing/stats")
+async def get_coalescing_statistics():
+    """Get single-flight request coalescing counters"""
+    leaders = COALESCING_STATS["leaders"]
+    coalesced = COALESCING_STATS["coalesced"]
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "leaders": leaders,
+        "coalesced": coalesced,
+        "coalesce_rate": f"{coalesced / max(leaders + coalesced, 1) * 100:.1f}%",
+        "cancelled": COALESCING_STATS["cancelled"],
+        "in_flight": len(INFLIGHT_REQUESTS),
+        "in_flight_by_kind": {
+            kind: sum(1 for key in INFLIGHT_REQUESTS if key.split(":", 1)[0] == kind)
+            for kind in COALESCING_STATS["by_kind"]
+        },
+        "by_kind": COALESCING_STATS["by_kind"]
+    }
+
+@api_router.get("/system/quarantine")
+async def get_quarantined_symbols():
+    """List quarantined symbols and symbols backing off after failures, with their next re-probe"""
+    def _describe(symbol: str, state: Dict) -> Dict:
+        return {
+            "symbol": symbol,
+            "sector": NSE_SYMBOLS.get(symbol, "Unknown"),
+            "failures": state["failures"],
+            "not_found_responses": state["not_found"],
+            "reason": state["reason"],
+            "first_failure": datetime.fromtimestamp(state["first_failure"], timezone.utc).isoformat(),
+            "last_failure": datetime.fromtimestamp(state["last_failure"], timezone.utc).isoformat(),
+            "next_probe": datetime.fromtimestamp(state["retry_at"], timezone.utc).isoformat(),
+            "probe_due": time.time() >= state["retry_at"]
+        }
+
+    entries = sorted(SYMBOL_FAILURES.items())
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "quarantined": [_describe(symbol, state) for symbol, state in entries if state["quarantined"]],
+        "backing_off": [_describe(symbol, state) for symbol, state in entries if not state["quarantined"]],
+        "policy": {
+            "base_backoff_seconds": NEGATIVE_CACHE_BASE_SECONDS,
+            "max_backoff_seconds": NEGATIVE_CACHE_MAX_SECONDS,
+            "quarantine_after_not_found": QUARANTINE_AFTER_NOT_FOUND
+        },
+        "stats": NEGATIVE_CACHE_STATS
+    }
+
+@api_router.delete("/system/quarantine/{symbol}")
+async def release_quarantined_symbol(symbol: str):
+    """Drop a symbol from the negative cache so the next request probes it immediately"""
+    symbol = symbol.upper()
+    if SYMBOL_FAILURES.pop(symbol, None) is None:
+        raise HTTPException(status_code=404, detail=f"{symbol} is not quarantined or backing off")
+
+    NEGATIVE_CACHE_STATS["released"] += 1
+    negative_cache_writer.submit(store_symbol_failure, symbol, None)
+    return {
+        "status": "success",
+        "message": f"Released {symbol} from the negative cache",
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+@api_router.get("/system/upstream/calls")
+async def get_upstream_call_statistics(symbol: Optional[str] = None):
+    """Get outbound market-data call counts, overall and per symbol"""
+    try:
+        by_symbol = UPSTREAM_CALL_STATS["by_symbol"]
+
+        if symbol:
+            symbol = symbol.upper()
+            return {
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "symbol": symbol,
+                "calls": by_symbol.get(symbol, {}),
+                "total_calls": sum(by_symbol.get(symbol, {}).values())
+            }
+
+        per_symbol_totals = {s: sum(kinds.values()) for s, kinds in by_symbol.items() if s != BULK_CALL_KEY}
+        busiest = sorted(per_symbol_totals.items(), key=lambda x: x[1], reverse=True)[:20]
+
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "total_calls": request_count,
+            "calls_by_kind": UPSTREAM_CALL_STATS["by_kind"],
+            "bulk_calls": sum(by_symbol.get(BULK_CALL_KEY, {}).values()),
+            "symbols_fetched": len(per_symbol_totals),
+            "avg_calls_per_symbol": round(sum(per_symbol_totals.values()) / max(len(per_symbol_totals), 1), 2),
+            "busiest_symbols": [{"symbol": s, "calls": c} for s, c in busiest]
+        }
+    except Exception as e:
+        logger.error(f"Upstream call statistics failed: {str(e)}")
+        return {
+            "error": str(e),
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+
 @api_router.get("/system/rate-limiting/status")
 async def get_rate_limiting_status():
     """Get current rate limiting status and statistics"""
     try:
-        global request_count, last_request_time, requests_per_minute
-        
-        current_time = time.time()
-        time_since_reset = current_time - last_request_time
+        buckets = {provider: bucket.stats() for provider, bucket in UPSTREAM_BUCKETS.items()}
         
         return {
             "timestamp": datetime.now(timezone.utc).isoformat(),
@@ -2436,17 +6111,24 @@ async def get_rate_limiting_status():
                 "max_retries": MAX_RETRIES,
                 "initial_wait_seconds": INITIAL_WAIT,
                 "max_wait_seconds": MAX_WAIT,
-                "batch_delay_seconds": BATCH_DELAY
+                "kind_providers": UPSTREAM_KIND_PROVIDERS,
+                "default_provider": DEFAULT_UPSTREAM_PROVIDER
             },
             "current_stats": {
                 "total_requests": request_count,
-                "requests_this_minute": requests_per_minute,
-                "time_since_reset_seconds": time_since_reset,
-                "estimated_requests_per_hour": requests_per_minute * 60 if time_since_reset < 60 else 0
+                "requests_last_minute": requests_last_minute(),
+                "waiting": sum(bucket["waiting"] for bucket in buckets.values())
             },
+            "buckets": buckets,
+            "concurrency": {provider: limiter.stats() for provider, limiter in UPSTREAM_LIMITERS.items()},
+            "circuit_breakers": {provider: breaker.stats() for provider, breaker in UPSTREAM_BREAKERS.items()},
+            "retry_budget": RETRY_BUDGET.stats(),
             "limits": {
-                "requests_per_minute_limit": 30,
-                "status": "within_limits" if requests_per_minute < 30 else "approaching_limit"
+                provider: {
+                    "requests_per_minute_limit": stats["requests_per_minute_limit"],
+                    "status": "within_limits" if stats["tokens_available"] >= 1 else "throttling"
+                }
+                for provider, stats in buckets.items()
             }
         }
     except Exception as e:
@@ -2486,7 +6168,7 @@ logging.getLogger('requests').setLevel(logging.WARNING)
 # Log startup information
 logger.info("=== Stock Screener API Starting ===")
 logger.info(f"Rate limiting enabled: MAX_RETRIES={MAX_RETRIES}, INITIAL_WAIT={INITIAL_WAIT}s, MAX_WAIT={MAX_WAIT}s")
-logger.info(f"Batch processing: BATCH_DELAY={BATCH_DELAY}s, Cache expiry={CACHE_EXPIRY_MINUTES}min")
+logger.info(f"Upstream rate limits: {UPSTREAM_RATE_LIMITS}, Cache expiry={CACHE_EXPIRY_MINUTES}min")
 
 # Background task for cache management and performance monitoring
 async def background_maintenance_task():
@@ -2496,6 +6178,31 @@ async def background_maintenance_task():
             # Clean up expired cache entries every 10 minutes
             clear_old_cache_entries()
             
+            # Flag a holiday list that no longer covers today (logged once a day)
+            check_holiday_calendar()
+            
+            # Persist universe array pages written since the last pass
+            await asyncio.get_event_loop().run_in_executor(executor, UNIVERSE_STORE.flush)
+            
+            # Persist cache entries, indicator states and the snapshot for a warm restart; the
+            # stores are shared, so only the background lease holder writes them
+            if BACKGROUND_LEASE["held"]:
+                await save_warm_state()
+            
+            # Write out buffered Mongo cache documents that did not fill a batch
+            if MONGO_CACHE_ENABLED:
+                await flush_mongo_cache_writes()
+            
+            # Expire shared L2 entries and publish this worker's cache statistics
+            if SHARED_CACHE_ENABLED:
+                loop = asyncio.get_event_loop()
+                if BACKGROUND_LEASE["held"]:
+                    await loop.run_in_executor(executor, prune_shared_cache)
+                await loop.run_in_executor(executor, publish_worker_cache_stats)
+            
+            # Drop expired scan job results
+            clear_expired_scan_jobs()
+            
             # Log performance metrics every 30 minutes
             if int(time.time()) % 1800 == 0:  # Every 30 minutes
                 metrics = get_system_performance_metrics()
@@ -2515,14 +6222,66 @@ async def startup_event():
     logger.info("=== Stock Screener API Started Successfully ===")
     logger.info(f"Available symbols: {len(NSE_SYMBOLS)}")
     logger.info(f"Sectors covered: {len(set(NSE_SYMBOLS.values()))}")
+    if check_holiday_calendar():
+        logger.info(f"NSE holidays loaded from {NSE_HOLIDAYS_PATH} through {max(NSE_HOLIDAYS)}")
+    
+    # Prepare the persistent OHLCV store
+    try:
+        init_ohlcv_store()
+        SYMBOL_FAILURES.update(load_symbol_failures())
+        logger.info(f"OHLCV store ready at {OHLCV_STORE_PATH} "
+                    f"({sum(1 for state in SYMBOL_FAILURES.values() if state['quarantined'])} symbols quarantined)")
+    except Exception as e:
+        logger.error(f"OHLCV store initialisation failed, history will be fetched directly: {str(e)}")
+    
+    # Prepare the cross-worker L2 cache
+    if SHARED_CACHE_ENABLED:
+        try:
+            init_shared_cache()
+            logger.info(f"Shared L2 cache ready at {SHARED_CACHE_PATH} (worker {WORKER_ID})")
+        except Exception as e:
+            logger.error(f"Shared cache initialisation failed, caching per worker only: {str(e)}")
+    
+    # Decide which worker runs the shared background work before any of it starts
+    set_background_lease(renew_background_lease())
+    asyncio.create_task(background_lease_keeper())
+    
+    # Durable Mongo analysis cache; index creation must not hold up startup if Mongo is slow
+    if MONGO_CACHE_ENABLED:
+        spawn_background_task(ensure_mongo_cache_indexes())
+        logger.info("Mongo analysis cache enabled")
+    
+    # Prepare the warm-restart store; its contents are restored lazily by the snapshot refresher
+    try:
+        init_warm_state_store()
+    except Exception as e:
+        logger.error(f"Warm state store initialisation failed, starting cold: {str(e)}")
     
     # Start background maintenance task
     asyncio.create_task(background_maintenance_task())
     logger.info("Background maintenance task started")
+    
+    # Start building the materialized scan snapshot
+    asyncio.create_task(scan_snapshot_refresher())
+    logger.info("Scan snapshot refresher started")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     logger.info("=== Stock Screener API Shutting Down ===")
+    if MONGO_CACHE_ENABLED:
+        await flush_mongo_cache_writes()
     client.close()
+    # Serialize while the loop still owns the state, then write synchronously
+    if BACKGROUND_LEASE["held"]:
+        try:
+            write_warm_state(*collect_warm_state())
+        except Exception as e:
+            logger.error(f"Warm state save failed at shutdown: {str(e)}")
+        # Hand the lease over now rather than after it lapses
+        release_refresh_leases([BACKGROUND_LEASE_KEY])
     executor.shutdown(wait=True)
+    negative_cache_writer.shutdown(wait=True)
+    # Hung market-data calls are not worth holding shutdown for
+    upstream_executor.shutdown(wait=False, cancel_futures=True)
+    UNIVERSE_STORE.flush()
     logger.info("Cleanup completed")
\ No newline at end of file
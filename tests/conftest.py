@@ -0,0 +1,166 @@
+"""Shared fixtures for the backend tests.
+
+backend/server.py is imported against a throwaway data directory and an unreachable
+MongoDB, and yfinance is replaced by FakeMarket, so no test touches the network.
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:1")
+os.environ.setdefault("DB_NAME", "stockbreak_test")
+os.environ["STOCKBREAK_DATA_DIR"] = tempfile.mkdtemp(prefix="stockbreak-test-")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+def make_history(seed: int = 0, bars: int = 260, end=None, start_price: float = 100.0) -> pd.DataFrame:
+    """Deterministic random-walk daily OHLCV frame shaped like ticker.history()"""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=end or pd.Timestamp.today().normalize(), periods=bars, name="Date")
+    close = start_price * np.exp(np.cumsum(rng.normal(0.001, 0.02, bars)))
+    return pd.DataFrame({
+        "Open": close * (1 + rng.normal(0, 0.005, bars)),
+        "High": close * (1 + rng.uniform(0, 0.02, bars)),
+        "Low": close * (1 - rng.uniform(0, 0.02, bars)),
+        "Close": close,
+        "Volume": rng.integers(100_000, 1_000_000, bars).astype(float),
+    }, index=index)
+
+
+def reference_indicators(df: pd.DataFrame) -> dict:
+    """Per-symbol pandas rolling-window indicators the vectorized and incremental engines must match"""
+    close, high, low, volume = df['Close'], df['High'], df['Low'], df['Volume']
+    n = len(df)
+    delta = close.diff()
+    ema_12, ema_26 = close.ewm(span=12).mean(), close.ewm(span=26).mean()
+    macd_line = ema_12 - ema_26
+    signal_line = macd_line.ewm(span=9).mean()
+    std_20 = close.rolling(20).std()
+    k_percent = 100 * (close - low.rolling(14).min()) / (high.rolling(14).max() - low.rolling(14).min())
+    typical_price = (high + low + close) / 3
+    true_range = pd.concat([high - low, (high - close.shift()).abs(), (low - close.shift()).abs()], axis=1).max(axis=1)
+    avg_volume = volume.rolling(20).mean().iloc[-1]
+    sma_20 = close.rolling(20).mean().iloc[-1]
+    values = {
+        'sma_20': sma_20,
+        'sma_50': close.rolling(50).mean().iloc[-1],
+        'sma_200': close.rolling(200).mean().iloc[-1],
+        'ema_12': ema_12.iloc[-1] if n >= 12 else None,
+        'ema_26': ema_26.iloc[-1] if n >= 26 else None,
+        'rsi': 100 - 100 / (1 + delta.where(delta > 0, 0).rolling(14).mean().iloc[-1]
+                            / (-delta.where(delta < 0, 0)).rolling(14).mean().iloc[-1]) if n >= 14 else None,
+        'macd': macd_line.iloc[-1] if n >= 26 else None,
+        'macd_signal': signal_line.iloc[-1] if n >= 35 else None,
+        'macd_histogram': (macd_line - signal_line).iloc[-1] if n >= 35 else None,
+        'bollinger_middle': sma_20,
+        'bollinger_upper': sma_20 + 2 * std_20.iloc[-1],
+        'bollinger_lower': sma_20 - 2 * std_20.iloc[-1],
+        'stochastic_k': k_percent.iloc[-1],
+        'stochastic_d': k_percent.rolling(3).mean().iloc[-1],
+        'vwap': (typical_price * volume).rolling(20).sum().iloc[-1] / volume.rolling(20).sum().iloc[-1],
+        'atr': true_range.rolling(14).mean().iloc[-1] if n >= 14 else None,
+        'volume_ratio': volume.iloc[-1] / avg_volume if avg_volume > 0 else None,
+        'resistance_level': high.rolling(20).max().iloc[-1],
+        'support_level': low.rolling(20).min().iloc[-1],
+    }
+    return {key: None if value is None or pd.isna(value) else float(value) for key, value in values.items()}
+
+
+def assert_indicators_match(actual: dict, expected: dict) -> None:
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if value is None:
+            assert actual[key] is None, key
+        else:
+            assert actual[key] == pytest.approx(value, rel=1e-9, abs=1e-9), key
+
+
+class FakeTicker:
+    def __init__(self, market: "FakeMarket", ticker: str):
+        self.market = market
+        self.symbol = ticker.replace(".NS", "")
+
+    def history(self, period="1y", start=None, **kwargs):
+        self.market.calls["history"] += 1
+        return self.market.bars(self.symbol, start)
+
+    @property
+    def info(self):
+        self.market.calls["info"] += 1
+        return {"longName": f"{self.symbol} Ltd", "trailingPE": 20.0, "marketCap": 5e10, "beta": 1.1}
+
+
+class FakeMarket:
+    """Stand-in for yfinance: per-symbol history frames (or exceptions to raise) and call counts"""
+
+    def __init__(self):
+        self.histories = {}
+        self.calls = {"history": 0, "info": 0, "download": 0}
+
+    def ticker(self, ticker: str) -> FakeTicker:
+        return FakeTicker(self, ticker)
+
+    def bars(self, symbol: str, start=None) -> pd.DataFrame:
+        outcome = self.histories.get(symbol)
+        if isinstance(outcome, Exception):
+            raise outcome
+        if outcome is None:
+            outcome = make_history(sum(map(ord, symbol)))
+        if start is not None:
+            outcome = outcome[outcome.index >= pd.Timestamp(start)]
+        return outcome.copy()
+
+    def download(self, tickers, start=None, **kwargs):
+        self.calls["download"] += 1
+        frames = {}
+        for ticker in tickers:
+            try:
+                frames[ticker] = self.bars(ticker.replace(".NS", ""), start)
+            except Exception:
+                continue
+        frames = {ticker: frame for ticker, frame in frames.items() if not frame.empty}
+        return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def stores():
+    server.init_ohlcv_store()
+    server.init_shared_cache()
+    server.init_warm_state_store()
+
+
+@pytest.fixture
+def fake_market(monkeypatch):
+    market = FakeMarket()
+    monkeypatch.setattr(server.yf, "Ticker", market.ticker)
+    monkeypatch.setattr(server.yf, "download", market.download)
+    for provider in server.UPSTREAM_BUCKETS:
+        monkeypatch.setitem(server.UPSTREAM_BUCKETS, provider, server.TokenBucket(1e6, 1000))
+    return market
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """Start every test with empty caches and negative cache"""
+    server.STOCK_DATA_CACHE.clear()
+    server.SYMBOL_FAILURES.clear()
+    server.FUNDAMENTALS_CACHE.clear()
+    server.INDICATOR_STATE.clear()
+    server.clear_shared_cache()
+    for breaker in server.UPSTREAM_BREAKERS.values():
+        breaker.state, breaker.failures, breaker.probe_in_flight = "closed", 0, False
+    yield
+    server.executor.submit(lambda: None).result()
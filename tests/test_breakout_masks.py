@@ -0,0 +1,89 @@
+import math
+
+import numpy as np
+import pytest
+
+import server
+from tests.conftest import make_history
+
+RANGES = {  # Indicator values around a price of 100 that make every pattern fire somewhere
+    'sma_200': (90, 105), 'sma_50': (90, 110), 'resistance_level': (95, 105), 'bollinger_upper': (95, 108),
+    'volume_ratio': (0.5, 2.5), 'macd': (-2, 2), 'macd_signal': (-2, 2), 'rsi': (30, 90),
+    'stochastic_k': (0, 100), 'stochastic_d': (0, 100),
+}
+
+
+def _reference_breakout(price: float, ind: dict):
+    """Scalar rule-by-rule detection; a missing (NaN) indicator never fires its pattern"""
+    def above(value, level):
+        return not math.isnan(value) and not math.isnan(level) and value > level
+
+    volume_ratio = ind['volume_ratio']
+    candidates = []
+    if above(price, ind['sma_200'] * 1.02) and above(volume_ratio, 1.5):
+        candidates.append(("200_dma", ind['sma_200'], 0.85))
+    if above(price, ind['resistance_level'] * 1.01) and above(volume_ratio, 1.3):
+        candidates.append(("resistance", ind['resistance_level'], 0.75))
+    if above(price, ind['bollinger_upper']) and above(volume_ratio, 1.2):
+        candidates.append(("bollinger_upper", ind['bollinger_upper'], 0.65))
+    if above(ind['macd'], ind['macd_signal']) and above(ind['rsi'], 50) and above(80, ind['rsi']) \
+            and above(price, ind['sma_50']):
+        candidates.append(("momentum", ind['sma_50'], 0.70))
+    k, d = ind['stochastic_k'], ind['stochastic_d']
+    if above(k, d) and above(k, 20) and above(80, k):
+        candidates.append(("stochastic", price * 0.98, 0.60))
+    if not candidates:
+        return None
+    kind, level, confidence = max(candidates, key=lambda candidate: candidate[2])
+    return {"type": kind, "breakout_price": level, "confidence": confidence}
+
+
+@pytest.fixture
+def universe():
+    rng = np.random.default_rng(42)
+    size = 2000
+    indicators = {name: rng.uniform(low, high, size) for name, (low, high) in RANGES.items()}
+    for values in indicators.values():
+        values[rng.random(size) < 0.05] = np.nan   # symbols too young for some indicators
+    return np.full(size, 100.0), indicators
+
+
+def test_masks_pick_the_same_pattern_as_rule_by_rule_detection(universe):
+    price, indicators = universe
+
+    result = server.detect_universe_breakouts(price, indicators)
+
+    fired = set()
+    for i, row in enumerate(result):
+        expected = _reference_breakout(price[i], {name: values[i] for name, values in indicators.items()})
+        actual = server.breakout_from_result(row)
+        if expected is None:
+            assert actual is None, i
+        else:
+            fired.add(expected["type"])
+            assert actual == pytest.approx(expected), i
+    assert fired == set(server.BREAKOUT_TYPES)
+
+
+def test_result_array_is_typed_per_symbol(universe):
+    price, indicators = universe
+
+    result = server.detect_universe_breakouts(price, indicators)
+
+    assert result.dtype == server.BREAKOUT_RESULT_DTYPE and result.shape == price.shape
+    idle = result['pattern'] < 0
+    assert np.all(result['confidence'][idle] == 0) and np.all(np.isnan(result['breakout_price'][idle]))
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_per_symbol_detection_uses_the_universe_masks(seed):
+    hist = make_history(seed=seed, bars=260)
+    hist.iloc[-1, hist.columns.get_loc('Volume')] *= 1 + seed % 4   # vary the volume confirmation
+    indicators = server.calculate_advanced_technical_indicators(hist)
+    price = float(hist['Close'].iloc[-1])
+
+    expected = _reference_breakout(price, {name: math.nan if indicators[name] is None else indicators[name]
+                                           for name in RANGES})
+    actual = server.detect_advanced_breakout("TEST", hist, indicators)
+
+    assert actual == (pytest.approx(expected) if expected else None)
@@ -0,0 +1,123 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import server
+from tests.conftest import make_history, run
+
+
+def test_split_bulk_history_handles_both_column_layouts_and_missing_tickers():
+    frames = {"RELIANCE.NS": make_history(1, bars=5), "TCS.NS": make_history(2, bars=5)}
+    frames["TCS.NS"]["Close"] = np.nan  # Missing tickers come back as all-NaN rows
+
+    by_ticker = pd.concat(frames, axis=1)
+    by_field = by_ticker.swaplevel(0, 1, axis=1)
+
+    for raw in (by_ticker, by_field):
+        split = server.split_bulk_history(raw, ["RELIANCE", "TCS", "INFY"])
+        assert list(split) == ["RELIANCE"]
+        pd.testing.assert_frame_equal(split["RELIANCE"], frames["RELIANCE.NS"], check_names=False)
+
+
+def test_concurrent_downloads_do_not_mix_results(monkeypatch):
+    """yf.download keeps results in module globals; the lock keeps overlapping calls apart"""
+    shared = {}
+
+    def racy_download(tickers, **kwargs):
+        shared.clear()
+        for ticker in tickers:
+            shared[ticker] = make_history(sum(map(ord, ticker)), bars=5)
+            time.sleep(0.01)
+        return pd.concat(dict(shared), axis=1)
+
+    monkeypatch.setattr(server.yf, "download", racy_download)
+    batches = [[f"A{i}" for i in range(5)], [f"B{i}" for i in range(5)], [f"C{i}" for i in range(5)]]
+    results = {}
+
+    def worker(batch):
+        results[batch[0]] = server.download_bulk_history(batch)
+
+    threads = [threading.Thread(target=worker, args=(batch,)) for batch in batches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for batch in batches:
+        assert sorted(results[batch[0]]) == batch
+
+
+def test_batch_fetch_downloads_uncached_symbols_in_one_call(fake_market):
+    symbols = ["RELIANCE", "TCS", "INFY", "WIPRO"]
+    server.cache_stock_data("RELIANCE", run(server._fetch_comprehensive_stock_data("RELIANCE")))
+    calls = dict(fake_market.calls)
+
+    results = run(server.fetch_stock_data_batch(symbols, bulk=True))
+
+    assert [r["symbol"] for r in results] == symbols
+    assert fake_market.calls["download"] - calls["download"] <= 2  # stored and fresh symbols
+    assert fake_market.calls["history"] == calls["history"]       # no per-symbol fallback
+    assert all(run(server.lookup_cached_stock_data(s, record=False))[1] == "fresh" for s in symbols)
+
+
+def test_bulk_prefilter_skips_full_analysis(fake_market):
+    seen = []
+
+    def prefilter(symbol, hist):
+        seen.append(symbol)
+        return symbol == "TCS"
+
+    results = run(server.fetch_stock_data_batch(["HCLTECH", "TCS"], bulk=True, prefilter=prefilter))
+
+    assert sorted(seen) == ["HCLTECH", "TCS"]
+    assert results[0] is None and results[1]["symbol"] == "TCS"
+
+
+def test_bulk_call_timeout_scales_with_the_chunk(fake_market, monkeypatch):
+    monkeypatch.setattr(server, "UPSTREAM_CALL_TIMEOUT", 0.1)
+    monkeypatch.setattr(server, "BULK_DOWNLOAD_TICKER_TIMEOUT", 0.2)
+    download = fake_market.download
+
+    def serial_download(tickers, **kwargs):
+        time.sleep(0.05 * len(tickers))   # One request per ticker, one after another
+        return download(tickers, **kwargs)
+
+    monkeypatch.setattr(server.yf, "download", serial_download)
+
+    assert sorted(run(server.fetch_bulk_history(["RELIANCE", "TCS", "INFY", "WIPRO"]))) == ["INFY", "RELIANCE", "TCS", "WIPRO"]
+
+
+def test_download_gives_up_instead_of_starting_after_its_caller(fake_market, monkeypatch):
+    monkeypatch.setattr(server, "BULK_DOWNLOAD_TICKER_TIMEOUT", 0.2)
+    server.YF_DOWNLOAD_LOCK.acquire()   # Another download is still running
+    try:
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            server.download_bulk_history(["RELIANCE", "TCS"], timeout=0.5)
+        # It waited only for what the download itself would not need
+        assert 0.05 < time.monotonic() - started < 0.4
+    finally:
+        server.YF_DOWNLOAD_LOCK.release()
+
+    assert fake_market.calls["download"] == 0
+
+
+def test_per_symbol_fallback_keeps_the_batch_lease(fake_market, monkeypatch):
+    with server.closing(server.get_ohlcv_connection()) as conn, conn:
+        conn.executemany("DELETE FROM ohlcv WHERE symbol = ?", [("NTPC",), ("ONGC",)])
+    download = fake_market.download
+    monkeypatch.setattr(server.yf, "download",
+                        lambda tickers, **kwargs: download([t for t in tickers if t != "ONGC.NS"], **kwargs))
+    leases = []
+    acquire, release = server.acquire_refresh_leases, server.release_refresh_leases
+    monkeypatch.setattr(server, "acquire_refresh_leases", lambda keys: leases.append(("acquire", sorted(keys))) or acquire(keys))
+    monkeypatch.setattr(server, "release_refresh_leases", lambda keys: leases.append(("release", sorted(keys))) or release(keys))
+
+    results = run(server.fetch_stock_data_batch(["NTPC", "ONGC"], bulk=True))
+
+    assert [r["symbol"] for r in results] == ["NTPC", "ONGC"]
+    assert fake_market.calls["history"] == 1   # ONGC came from the per-symbol path
+    assert leases == [("acquire", ["stock_NTPC", "stock_ONGC"]), ("release", ["stock_NTPC", "stock_ONGC"])]
@@ -0,0 +1,110 @@
+import time
+
+import server
+from tests.conftest import run
+
+
+def _seed_expired_entry(symbol: str, age_seconds: float, keep_bars: bool = False) -> dict:
+    """Cache a real analysis, then age it past its hard TTL"""
+    stock_data = run(server._fetch_comprehensive_stock_data(symbol))
+    assert stock_data is not None
+    server.STOCK_DATA_CACHE.clear()
+    server.clear_shared_cache()
+    if not keep_bars:
+        with server.closing(server.get_ohlcv_connection()) as conn, conn:
+            conn.execute("DELETE FROM ohlcv WHERE symbol = ?", (symbol,))
+    then = time.time() - age_seconds
+    entry = {'data': stock_data, 'timestamp': then, 'expires_at': then + 60, 'stale_until': then + 120}
+    server.STOCK_DATA_CACHE[f"stock_{symbol}"] = entry
+    return entry
+
+
+def _open_circuit() -> None:
+    breaker = server.UPSTREAM_BREAKERS[server.DEFAULT_UPSTREAM_PROVIDER]
+    breaker.state = "open"
+    breaker.opened_at = time.monotonic()
+
+
+def _shared_row(symbol: str):
+    with server.closing(server.get_shared_cache_connection()) as conn:
+        return conn.execute("SELECT timestamp FROM shared_cache WHERE key = ?", (f"stock_{symbol}",)).fetchone()
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_half_open():
+    breaker = server.CircuitBreaker(failure_threshold=3, open_seconds=0.05)
+    for _ in range(2):
+        breaker.record("error")
+    assert breaker.allow()
+
+    breaker.record("timeout")
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()        # the single half-open probe
+    assert not breaker.allow()    # everyone else still fails fast
+    breaker.record("ok")
+    assert breaker.state == "closed"
+
+
+def test_failed_half_open_probe_reopens():
+    breaker = server.CircuitBreaker(failure_threshold=1, open_seconds=0.0)
+    breaker.record("error")
+    assert breaker.allow()
+    breaker.record("throttled")
+    assert breaker.state == "open"
+
+
+def test_retry_budget_caps_retries_to_a_fraction_of_requests():
+    budget = server.RetryBudget(ratio=0.1, min_per_minute=2)
+    for _ in range(50):
+        budget.record_request()
+
+    granted = sum(budget.try_spend() for _ in range(20))
+    assert granted == 5
+    assert budget.denied == 15
+
+
+def test_stale_fallback_is_not_recached_as_fresh(fake_market):
+    entry = _seed_expired_entry("RELIANCE", 3 * 3600)
+    _open_circuit()
+
+    result = run(server.fetch_with_retry("RELIANCE"))
+
+    assert result["cache_status"] == "stale"
+    assert result["data_age_seconds"] >= 3 * 3600 - 1
+
+    # Callers hand whatever fetch_with_retry returned to cache_stock_data
+    server.cache_stock_data("RELIANCE", result)
+    server.executor.submit(lambda: None).result()
+
+    assert server.STOCK_DATA_CACHE.get("stock_RELIANCE")['timestamp'] == entry['timestamp']
+    assert run(server.lookup_cached_stock_data("RELIANCE", record=False))[1] != "fresh"
+    assert _shared_row("RELIANCE") is None
+
+
+def test_batch_fetch_during_outage_serves_stale_without_recaching(fake_market):
+    entry = _seed_expired_entry("TCS", 3 * 3600)
+    _open_circuit()
+
+    for bulk in (True, False):
+        [result] = run(server.fetch_stock_data_batch(["TCS"], bulk=bulk, allow_stale=False))
+        assert result["cache_status"] == "stale"
+
+    assert server.STOCK_DATA_CACHE.get("stock_TCS")['timestamp'] == entry['timestamp']
+    server.executor.submit(lambda: None).result()
+    assert _shared_row("TCS") is None
+
+
+def test_analysis_from_stored_bars_during_outage_is_not_cached(fake_market):
+    entry = _seed_expired_entry("INFY", 3 * 3600, keep_bars=True)
+    _open_circuit()
+
+    result = run(server.fetch_with_retry("INFY"))
+    assert result["data_validation"]["degraded"] is True
+
+    server.cache_stock_data("INFY", result)
+    server.executor.submit(lambda: None).result()
+
+    assert server.STOCK_DATA_CACHE.get("stock_INFY")['timestamp'] == entry['timestamp']
+    assert _shared_row("INFY") is None
@@ -0,0 +1,65 @@
+import pickle
+
+import pandas as pd
+
+import server
+from tests.conftest import make_history, run
+
+INFO = {"longName": "Test Ltd", "trailingPE": 21.5, "marketCap": 5e10, "beta": None,
+        "longBusinessSummary": "x" * 5000, "companyOfficers": [{"name": "A"}] * 20}
+
+
+def _entry() -> server.CompactStockEntry:
+    hist = make_history(seed=4, bars=250)
+    real_time = server.derive_price_snapshot(hist)
+    return server.build_stock_analysis("TEST", hist, INFO, real_time), hist
+
+
+def test_chart_timeframes_are_rebuilt_from_one_copy_of_the_bars():
+    entry, hist = _entry()
+
+    chart = entry["chart_data"]
+
+    assert list(chart) == list(server.CHART_TIMEFRAMES)
+    for timeframe, bars in server.CHART_TIMEFRAMES.items():
+        assert chart[timeframe] == (hist.tail(bars) if bars else hist).reset_index().to_dict('records')
+    assert entry.ohlcv.shape == (len(hist), len(server.OHLCV_COLUMNS))
+
+
+def test_info_keeps_only_the_fields_the_analysis_reads():
+    entry, _ = _entry()
+
+    assert entry["info"] == {"longName": "Test Ltd", "trailingPE": 21.5, "marketCap": 5e10}
+    assert entry["name"] == "Test Ltd" and entry["fundamental_data"]
+
+
+def test_cache_views_share_the_bars_and_leave_the_entry_untouched():
+    entry, _ = _entry()
+
+    view = entry.with_cache_info(data_age_seconds=12.0, cache_status="stale")
+
+    assert view.ohlcv is entry.ohlcv and view.summary is entry.summary
+    assert view["cache_status"] == "stale" and "cache_status" not in entry
+    assert view.to_dict().keys() == set(entry.to_dict()) | {"data_age_seconds", "cache_status"}
+
+
+def test_entry_is_far_smaller_than_the_materialised_dict():
+    entry, _ = _entry()
+
+    assert server.deep_sizeof(entry) * 3 < server.deep_sizeof(entry.to_dict())
+
+
+def test_pickled_entry_round_trips():
+    entry, _ = _entry()
+
+    restored = pickle.loads(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+
+    assert restored.summary == entry.summary and restored.info == entry.info
+    pd.testing.assert_frame_equal(restored.history(), entry.history())
+
+
+def test_stock_endpoint_returns_the_full_shape(fake_market):
+    data = run(server.get_stock_data("RELIANCE"))
+
+    assert {"chart_data", "info", "technical_indicators", "breakout_data", "cache_status"} <= set(data)
+    assert set(data["chart_data"]["1mo"][0]) == {"Date", *server.OHLCV_COLUMNS}
@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import server
+from tests.conftest import FakeTicker, run
+
+SYMBOL = "HINDUNILVR"
+
+
+@pytest.fixture(autouse=True)
+def no_stored_fundamentals():
+    with server.closing(server.get_ohlcv_connection()) as conn, conn:
+        conn.execute("DELETE FROM fundamentals WHERE symbol = ?", (SYMBOL,))
+
+
+def _stats() -> dict:
+    return dict(server.FUNDAMENTALS_STATS)
+
+
+def _delta(before: dict) -> dict:
+    return {key: value - before[key] for key, value in server.FUNDAMENTALS_STATS.items() if value != before[key]}
+
+
+async def _settle() -> None:
+    while server.BACKGROUND_TASKS:
+        await asyncio.gather(*server.BACKGROUND_TASKS)
+
+
+def test_fundamentals_are_fetched_once_then_served_from_memory_and_store(fake_market):
+    before = _stats()
+
+    info, quote = run(server.get_fundamentals(SYMBOL))
+    assert quote["longName"] == info["longName"] == f"{SYMBOL} Ltd"
+    assert set(info) <= set(server.STOCK_INFO_FIELDS)
+
+    assert run(server.get_fundamentals(SYMBOL)) == (info, None)
+    server.FUNDAMENTALS_CACHE.clear()   # a restart keeps only the store
+    assert run(server.get_fundamentals(SYMBOL)) == (info, None)
+
+    assert fake_market.calls["info"] == 1
+    assert _delta(before) == {"refreshes": 1, "memory_hits": 1, "store_hits": 1}
+
+
+def test_expired_fundamentals_are_served_while_one_refresh_runs(fake_market):
+    run(server.get_fundamentals(SYMBOL))
+    server.FUNDAMENTALS_CACHE[SYMBOL]["fetched_at"] -= 3 * 86400
+    before = _stats()
+
+    async def scenario():
+        served = await asyncio.gather(*[server.get_fundamentals(SYMBOL) for _ in range(3)])
+        await _settle()
+        return served
+
+    served = run(scenario())
+
+    assert all(quote is None and info["longName"] == f"{SYMBOL} Ltd" for info, quote in served)
+    assert fake_market.calls["info"] == 2
+    assert _delta(before) == {"memory_hits": 3, "stale_served": 3, "refreshes": 1}
+    assert server.fundamentals_expire_at(server.FUNDAMENTALS_CACHE[SYMBOL]["fetched_at"]) > datetime.now().timestamp()
+
+
+def test_failed_refresh_keeps_the_previous_fundamentals(fake_market, monkeypatch):
+    info, _ = run(server.get_fundamentals(SYMBOL))
+    previous = server.FUNDAMENTALS_CACHE[SYMBOL]
+
+    def unavailable(ticker):
+        raise RuntimeError("quote endpoint down")
+
+    monkeypatch.setattr(FakeTicker, "info", property(unavailable))
+
+    assert run(server.refresh_fundamentals(SYMBOL, previous)) == (info, None)
+    assert server.FUNDAMENTALS_CACHE[SYMBOL] is previous
+
+
+def test_fundamentals_last_until_the_first_pre_open_after_the_minimum_ttl():
+    friday_close = server.IST.localize(datetime(2026, 10, 16, 16, 0)).timestamp()
+    monday_pre_open = server.IST.localize(datetime(2026, 10, 19, 9, 0)).timestamp()
+    monday_noon = server.IST.localize(datetime(2026, 10, 19, 12, 0)).timestamp()
+
+    assert server.fundamentals_expire_at(friday_close) == monday_pre_open
+    assert server.fundamentals_expire_at(monday_noon) >= monday_noon + server.FUNDAMENTALS_MIN_TTL_HOURS * 3600
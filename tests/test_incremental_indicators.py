@@ -0,0 +1,85 @@
+import pickle
+
+import numpy as np
+import pytest
+
+import server
+from tests.conftest import assert_indicators_match, make_history, reference_indicators
+
+
+@pytest.mark.parametrize("bars", [1, 14, 35, 200, 260])
+def test_seeded_state_matches_the_rolling_reference(bars):
+    hist = make_history(seed=bars, bars=bars)
+    state = server.IncrementalIndicatorState.from_history("TEST", hist)
+
+    assert_indicators_match(state.values(), reference_indicators(hist))
+
+
+def test_daily_advances_match_a_full_recompute():
+    hist = make_history(seed=7, bars=260)
+    state = server.IncrementalIndicatorState.from_history("TEST", hist.iloc[:180])
+
+    for end in range(181, len(hist) + 1):
+        window = hist.iloc[max(0, end - 250):end]   # the served window slides forward
+        assert state.advance(window)
+        assert_indicators_match(state.values(), reference_indicators(hist.iloc[:end]))
+    assert state.bars == len(hist) - 1
+
+
+def test_intraday_refreshes_replace_the_live_bar():
+    hist = make_history(seed=11, bars=120)
+    state = server.IncrementalIndicatorState.from_history("TEST", hist)
+
+    for move in (1.01, 0.97, 1.04):
+        intraday = hist.copy()
+        intraday.iloc[-1, intraday.columns.get_loc('Close')] *= move
+        intraday.iloc[-1, intraday.columns.get_loc('High')] = intraday.iloc[-1][['High', 'Close']].max()
+        intraday.iloc[-1, intraday.columns.get_loc('Low')] = intraday.iloc[-1][['Low', 'Close']].min()
+        assert state.advance(intraday)
+        assert_indicators_match(state.values(), reference_indicators(intraday))
+    assert state.bars == len(hist) - 1
+
+
+def test_history_that_no_longer_overlaps_rebuilds_the_state():
+    hist = make_history(seed=3, bars=200)
+    server.get_incremental_indicators("TEST", hist.iloc[:100])
+    stale = server.INDICATOR_STATE["TEST"]
+
+    assert not stale.advance(hist.iloc[150:])
+    assert_indicators_match(server.get_incremental_indicators("TEST", hist.iloc[150:]),
+                            reference_indicators(hist.iloc[150:]))
+    assert server.INDICATOR_STATE["TEST"] is not stale
+
+
+def test_pickled_state_resumes_where_it_stopped():
+    hist = make_history(seed=5, bars=220)
+    restored = pickle.loads(pickle.dumps(server.IncrementalIndicatorState.from_history("TEST", hist.iloc[:210])))
+
+    assert restored.advance(hist)
+    assert_indicators_match(restored.values(), reference_indicators(hist))
+
+
+def test_rolling_sums_stay_exact_over_long_high_priced_runs():
+    rng = np.random.default_rng(9)
+    prices = 1e7 + np.cumsum(rng.normal(0, 0.5, 100_000))
+    window = server.RollingWindow(20)
+    for price in prices[:-1]:
+        window.push(float(price))
+
+    tail = prices[-20:]
+    assert window.preview_sum(float(prices[-1])) == pytest.approx(tail.sum(), rel=1e-15)
+    assert window.preview_std(float(prices[-1])) == pytest.approx(tail.std(ddof=1), rel=1e-9)
+
+
+def test_unpickled_window_is_reseeded_from_its_values():
+    window = server.RollingWindow(5)
+    for price in (10.0, 11.0, 12.0, 13.0, 14.0, 15.0):
+        window.push(price)
+    state = window.__getstate__()
+    state["total"], state["total_sq"] = 1e9, 1e9   # drifted sums from an old process
+
+    restored = server.RollingWindow.__new__(server.RollingWindow)
+    restored.__setstate__(state)
+
+    assert restored.preview_sum(16.0) == pytest.approx(70.0)
+    assert restored.preview_std(16.0) == pytest.approx(np.std([12, 13, 14, 15, 16], ddof=1))
@@ -0,0 +1,58 @@
+import pytest
+
+import server
+from tests.conftest import make_history
+
+
+def _graph(seed: int = 0, bars: int = 260) -> server.LazyIndicatorGraph:
+    return server.LazyIndicatorGraph.from_frame(make_history(seed=seed, bars=bars))
+
+
+def test_only_requested_indicators_and_their_dependencies_are_computed():
+    graph = _graph()
+
+    graph.get('rsi')
+    assert graph.evaluated == ['rsi']
+
+    graph.get('macd_histogram')
+    assert set(graph.evaluated) == {'rsi', 'ema_12_series', 'ema_26_series', 'macd_line',
+                                    'macd_signal_series', 'macd_histogram'}
+
+
+def test_shared_dependencies_are_computed_once(monkeypatch):
+    calls = []
+    dependencies, func = server.INDICATOR_REGISTRY['sma_20']
+
+    def counted(*args):
+        calls.append(1)
+        return func(*args)
+
+    monkeypatch.setitem(server.INDICATOR_REGISTRY, 'sma_20', (dependencies, counted))
+    graph = _graph()
+
+    for name in ('bollinger_upper', 'bollinger_lower', 'bollinger_middle', 'sma_20'):
+        graph.get(name)
+    assert len(calls) == 1
+
+
+def test_scan_columns_cover_only_the_rules_that_can_match():
+    assert server.plan_scan_columns('200_dma') == ['sma_200', 'volume_ratio']
+    assert 'stochastic_k' not in server.plan_scan_columns(min_confidence=0.7)
+    assert set(server.plan_scan_columns()) >= set(server.BREAKOUT_INDICATORS)
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_lazy_prefilter_agrees_with_full_detection(seed):
+    hist = make_history(seed=seed, bars=260)
+    hist.iloc[-1, hist.columns.get_loc('Volume')] *= 1 + seed % 4   # vary the volume confirmation
+    full = server.detect_advanced_breakout("TEST", hist, server.calculate_advanced_technical_indicators(hist))
+
+    for breakout_type in [None, 'All'] + server.BREAKOUT_TYPES:
+        for min_confidence in (0.0, 0.7, 0.8):
+            wanted = full is not None and full["confidence"] >= min_confidence and \
+                breakout_type in (None, 'All', full["type"])
+            lazy = server.detect_breakout_lazy(server.LazyIndicatorGraph.from_frame(hist), breakout_type, min_confidence)
+
+            assert (lazy is not None) == wanted, (breakout_type, min_confidence)
+            if wanted:
+                assert lazy == pytest.approx(full)
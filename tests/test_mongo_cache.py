@@ -0,0 +1,132 @@
+import time
+import types
+
+import bson
+import pytest
+from pymongo import ReplaceOne
+
+import server
+from tests.conftest import run
+
+
+def _matches(doc: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        value = doc.get(field)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+        elif "$in" in condition and value not in condition["$in"]:
+            return False
+        elif "$gt" in condition and not (value is not None and value > condition["$gt"]):
+            return False
+        elif "$exists" in condition and (field in doc) != condition["$exists"]:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.docs.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeCollection:
+    """Just enough of a motor collection for the analysis cache: replace upserts and $in reads"""
+
+    def __init__(self):
+        self.docs = {}
+
+    async def bulk_write(self, requests, ordered=True):
+        for request in requests:
+            assert isinstance(request, ReplaceOne) and request._upsert
+            bson.encode(request._doc)  # Only plain BSON types go over the wire
+            self.docs[request._filter["_id"]] = request._doc
+
+    async def delete_many(self, query):
+        deleted = [key for key, doc in self.docs.items() if _matches(doc, query)]
+        for key in deleted:
+            del self.docs[key]
+        return types.SimpleNamespace(deleted_count=len(deleted))
+
+    def find(self, query, projection=None):
+        return FakeCursor([{k: v for k, v in doc.items() if k != "_id"}
+                           for doc in self.docs.values() if _matches(doc, query)])
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    database = types.SimpleNamespace(analysis_cache=FakeCollection(), ohlcv_segments=FakeCollection())
+    monkeypatch.setattr(server, "db", database)
+    server.MONGO_CACHE_PENDING.clear()
+    return database
+
+
+def _cache_and_flush(symbol: str) -> dict:
+    stock_data = run(server._fetch_comprehensive_stock_data(symbol))
+    now = time.time()
+    entry = {'data': stock_data, 'timestamp': now, 'expires_at': now + 60, 'stale_until': now + 120}
+    server.queue_mongo_cache_write(symbol, entry)
+    run(server.flush_mongo_cache_writes())
+    return entry
+
+
+def test_rewrites_replace_the_symbols_documents(fake_market, fake_db):
+    for _ in range(3):
+        _cache_and_flush("RELIANCE")
+    _cache_and_flush("TCS")
+
+    assert sorted(fake_db.analysis_cache.docs) == ["RELIANCE", "TCS"]
+    assert sorted(fake_db.ohlcv_segments.docs) == ["RELIANCE", "TCS"]
+    assert "payload" not in fake_db.analysis_cache.docs["RELIANCE"]
+
+
+def test_buffered_writes_keep_the_latest_document_per_symbol(fake_market, fake_db):
+    stock_data = run(server._fetch_comprehensive_stock_data("INFY"))
+    for timestamp in (1000.0, 2000.0):
+        server.queue_mongo_cache_write("INFY", {'data': stock_data, 'timestamp': timestamp,
+                                                'expires_at': timestamp + 60, 'stale_until': timestamp + 120})
+
+    assert len(server.MONGO_CACHE_PENDING) == 1
+    run(server.flush_mongo_cache_writes())
+    assert fake_db.analysis_cache.docs["INFY"]["as_of"].timestamp() == 2000.0
+
+
+def test_round_trip_restores_the_analysis(fake_market, fake_db):
+    entry = _cache_and_flush("WIPRO")
+    server.STOCK_DATA_CACHE.clear()
+
+    assert run(server.load_mongo_cache(["WIPRO"])) == 1
+
+    restored = server.STOCK_DATA_CACHE.get("stock_WIPRO")['data']
+    assert server.bson_document(restored.to_dict()) == server.bson_document(entry['data'].to_dict())
+
+
+def test_legacy_pickled_documents_are_ignored(fake_market, fake_db):
+    _cache_and_flush("HCLTECH")
+    legacy = fake_db.analysis_cache.docs["HCLTECH"]
+    fake_db.analysis_cache.docs["HCLTECH"] = {
+        key: value for key, value in legacy.items() if key not in ("summary", "info")
+    } | {"payload": b"\x80\x04not unpickled"}
+    server.STOCK_DATA_CACHE.clear()
+
+    assert run(server.load_mongo_cache(["HCLTECH"])) == 0
+    assert server.STOCK_DATA_CACHE.get("stock_HCLTECH") is None
+
+
+def test_clearing_the_cache_clears_mongo_and_the_write_buffer(fake_market, fake_db, monkeypatch):
+    monkeypatch.setattr(server, "MONGO_CACHE_ENABLED", True)
+    entry = _cache_and_flush("SBIN")
+    server.queue_mongo_cache_write("ITC", entry)
+
+    assert run(server.clear_cache())["status"] == "success"
+
+    assert not fake_db.analysis_cache.docs and not fake_db.ohlcv_segments.docs
+    assert not server.MONGO_CACHE_PENDING
+    assert run(server.load_mongo_cache(["SBIN"])) == 0
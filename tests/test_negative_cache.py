@@ -0,0 +1,138 @@
+import time
+
+import pytest
+from yfinance.exceptions import YFPricesMissingError, YFTzMissingError
+
+import server
+from tests.conftest import make_history, run
+
+
+def _fail(symbol: str, times: int, not_found: bool) -> None:
+    for _ in range(times):
+        server.record_symbol_failure(symbol, "test failure", not_found=not_found)
+
+
+def test_backoff_doubles_up_to_the_cap():
+    delays = []
+    for _ in range(12):
+        before = time.time()
+        server.record_symbol_failure("RELIANCE", "boom", not_found=False)
+        delays.append(server.SYMBOL_FAILURES["RELIANCE"]["retry_at"] - before)
+
+    assert round(delays[0]) == server.NEGATIVE_CACHE_BASE_SECONDS
+    assert round(delays[1]) == 2 * server.NEGATIVE_CACHE_BASE_SECONDS
+    assert round(delays[-1]) == server.NEGATIVE_CACHE_MAX_SECONDS
+    assert server.symbol_blocked("RELIANCE")
+    assert not server.symbol_quarantined("RELIANCE")
+
+
+def test_unconfirmed_failures_never_quarantine():
+    _fail("TCS", 10, not_found=False)
+
+    assert not server.SYMBOL_FAILURES["TCS"]["quarantined"]
+    assert "TCS" in server.select_scan_symbols(None, len(server.NSE_SYMBOLS))
+
+
+def test_confirmed_not_found_quarantines_after_threshold():
+    _fail("INFY", server.QUARANTINE_AFTER_NOT_FOUND - 1, not_found=True)
+    assert not server.symbol_quarantined("INFY")
+
+    server.record_symbol_failure("INFY", "possibly delisted", not_found=True)
+    assert server.symbol_quarantined("INFY")
+    assert server.symbol_blocked("INFY")
+    assert "INFY" not in server.select_scan_symbols(None, len(server.NSE_SYMBOLS))
+
+
+def test_unconfirmed_failure_resets_the_not_found_streak():
+    _fail("WIPRO", server.QUARANTINE_AFTER_NOT_FOUND - 1, not_found=True)
+    server.record_symbol_failure("WIPRO", "empty frame", not_found=False)
+    server.record_symbol_failure("WIPRO", "possibly delisted", not_found=True)
+
+    assert not server.SYMBOL_FAILURES["WIPRO"]["quarantined"]
+
+
+def test_quarantine_expires_for_the_daily_reprobe():
+    _fail("MINDTREE", server.QUARANTINE_AFTER_NOT_FOUND, not_found=True)
+    assert "MINDTREE" not in server.select_scan_symbols(None, len(server.NSE_SYMBOLS))
+
+    server.SYMBOL_FAILURES["MINDTREE"]["retry_at"] = time.time() - 1
+
+    assert not server.symbol_quarantined("MINDTREE")
+    assert not server.symbol_blocked("MINDTREE")
+    assert "MINDTREE" in server.select_scan_symbols(None, len(server.NSE_SYMBOLS))
+
+    # A failed re-probe puts it back on the daily schedule rather than the short backoff
+    before = time.time()
+    server.record_symbol_failure("MINDTREE", "empty frame", not_found=False)
+    assert server.symbol_quarantined("MINDTREE")
+    assert server.SYMBOL_FAILURES["MINDTREE"]["retry_at"] - before >= server.NEGATIVE_CACHE_MAX_SECONDS - 1
+
+
+def test_success_lifts_quarantine():
+    _fail("SRTRANSFIN", server.QUARANTINE_AFTER_NOT_FOUND, not_found=True)
+    server.record_symbol_success("SRTRANSFIN")
+
+    assert "SRTRANSFIN" not in server.SYMBOL_FAILURES
+
+
+def test_quarantine_is_persisted():
+    _fail("IBULHSGFIN", server.QUARANTINE_AFTER_NOT_FOUND, not_found=True)
+    server.negative_cache_writer.submit(lambda: None).result()
+
+    assert server.load_symbol_failures()["IBULHSGFIN"]["quarantined"]
+
+    server.record_symbol_success("IBULHSGFIN")
+    server.negative_cache_writer.submit(lambda: None).result()
+    assert "IBULHSGFIN" not in server.load_symbol_failures()
+
+
+def test_yfinance_missing_ticker_errors_classify_as_not_found():
+    assert server.classify_upstream_error(YFTzMissingError("MOTHERSUMI.NS")) == "not_found"
+    assert server.classify_upstream_error(YFPricesMissingError("MOTHERSUMI.NS", "")) == "not_found"
+    assert server.classify_upstream_error(RuntimeError("Too Many Requests")) == "throttled"
+    assert server.classify_upstream_error(RuntimeError("boom")) == "error"
+
+
+def test_not_found_does_not_trip_the_circuit():
+    breaker = server.CircuitBreaker(failure_threshold=2, open_seconds=30)
+    for _ in range(5):
+        breaker.record("not_found")
+    assert breaker.state == "closed"
+
+
+def test_fetch_quarantines_only_confirmed_dead_symbols(fake_market):
+    fake_market.histories["MOTHERSUMI"] = YFTzMissingError("MOTHERSUMI.NS")
+    fake_market.histories["ZEEL"] = make_history(bars=0)
+
+    for _ in range(server.QUARANTINE_AFTER_NOT_FOUND + 1):
+        for state in server.SYMBOL_FAILURES.values():
+            state["retry_at"] = 0
+        assert run(server._fetch_comprehensive_stock_data("MOTHERSUMI")) is None
+        assert run(server._fetch_comprehensive_stock_data("ZEEL")) is None
+
+    assert server.symbol_quarantined("MOTHERSUMI")
+    assert not server.SYMBOL_FAILURES["ZEEL"]["quarantined"]
+    assert server.circuit_open() is False
+
+
+def test_blocked_symbols_skip_network_io(fake_market):
+    _fail("MOTHERSUMI", server.QUARANTINE_AFTER_NOT_FOUND, not_found=True)
+    calls = dict(fake_market.calls)
+
+    assert run(server.fetch_with_retry("MOTHERSUMI")) is None
+    assert run(server.fetch_stock_data_batch(["MOTHERSUMI"])) == [None]
+    assert fake_market.calls == calls
+
+
+def test_release_endpoint():
+    _fail("PVR", server.QUARANTINE_AFTER_NOT_FOUND, not_found=True)
+
+    listing = run(server.get_quarantined_symbols())
+    assert [entry["symbol"] for entry in listing["quarantined"]] == ["PVR"]
+
+    run(server.release_quarantined_symbol("pvr"))
+    assert "PVR" not in server.SYMBOL_FAILURES
+
+    with pytest.raises(server.HTTPException) as error:
+        run(server.release_quarantined_symbol("PVR"))
+    assert error.value.status_code == 404
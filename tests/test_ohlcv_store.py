@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+
+import server
+from tests.conftest import make_history, run
+
+PRICES = ['Open', 'High', 'Low', 'Close']
+
+
+def _history(symbol: str) -> pd.DataFrame:
+    """A fresh stored history for symbol, served by the fake market"""
+    with server.closing(server.get_ohlcv_connection()) as conn, conn:
+        conn.execute("DELETE FROM ohlcv WHERE symbol = ?", (symbol,))
+    return make_history(sum(map(ord, symbol)), bars=200)
+
+
+def _split(hist: pd.DataFrame, ratio: float = 2.0) -> pd.DataFrame:
+    """The same history as the provider serves it after a ratio-for-one split"""
+    adjusted = hist.copy()
+    adjusted[PRICES] /= ratio
+    adjusted['Volume'] *= ratio
+    return adjusted
+
+
+def _assert_served(served: pd.DataFrame, expected: pd.DataFrame) -> None:
+    pd.testing.assert_frame_equal(served, expected, check_freq=False, check_names=False, check_exact=False)
+
+
+def test_reference_bar_is_the_newest_settled_one():
+    hist = _history("RELIANCE")
+    server.store_history("RELIANCE", hist)
+
+    day, close = server.get_reference_bars(["RELIANCE", "UNKNOWN"])["RELIANCE"]
+    assert day == hist.index[-2].strftime("%Y-%m-%d")
+    assert close == pytest.approx(hist['Close'].iloc[-2])
+
+    server.store_history("RELIANCE", hist.iloc[:1], replace=True)
+    assert server.get_reference_bars(["RELIANCE"])["RELIANCE"][0] == hist.index[0].strftime("%Y-%m-%d")
+
+
+def test_incremental_fetch_appends_to_unchanged_history(fake_market):
+    hist = _history("TCS")
+    fake_market.histories["TCS"] = hist.iloc[:-1]
+    run(server.fetch_history_incremental("TCS"))
+
+    # The newest bar arrives and yesterday's partial bar is finalised
+    finalised = hist.copy()
+    finalised.iloc[-2, finalised.columns.get_loc('Close')] *= 1.01
+    fake_market.histories["TCS"] = finalised
+    calls = fake_market.calls["history"]
+
+    served = run(server.fetch_history_incremental("TCS"))
+
+    assert fake_market.calls["history"] - calls == 1
+    _assert_served(served, finalised)
+
+
+def test_split_upstream_replaces_the_stored_history(fake_market):
+    hist = _history("INFY")
+    fake_market.histories["INFY"] = hist
+    run(server.fetch_history_incremental("INFY"))
+    server.INDICATOR_STATE["INFY"] = server.IncrementalIndicatorState.from_history("INFY", hist)
+
+    fake_market.histories["INFY"] = _split(hist)
+    calls = fake_market.calls["history"]
+
+    served = run(server.fetch_history_incremental("INFY"))
+
+    assert fake_market.calls["history"] - calls == 2   # the incremental probe, then the full history
+    _assert_served(served, _split(hist))
+    assert "INFY" not in server.INDICATOR_STATE
+
+
+def test_bulk_fetch_refetches_only_rebased_symbols(fake_market):
+    histories = {symbol: _history(symbol) for symbol in ("WIPRO", "HCLTECH")}
+    fake_market.histories.update(histories)
+    run(server.fetch_bulk_history_incremental(list(histories)))
+
+    fake_market.histories["WIPRO"] = _split(histories["WIPRO"], ratio=5.0)
+    downloads = fake_market.calls["download"]
+
+    served = run(server.fetch_bulk_history_incremental(list(histories)))
+
+    assert fake_market.calls["download"] - downloads == 2   # incremental chunk, then WIPRO in full
+    _assert_served(served["WIPRO"], _split(histories["WIPRO"], ratio=5.0))
+    _assert_served(served["HCLTECH"], histories["HCLTECH"])
@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+
+import server
+from tests.conftest import run
+
+
+def test_bucket_serves_the_burst_then_paces_at_the_rate():
+    async def scenario():
+        bucket = server.TokenBucket(requests_per_minute=600, burst=5)  # 10 tokens a second
+        started = time.monotonic()
+        for _ in range(10):
+            await bucket.acquire()
+        return time.monotonic() - started, bucket
+
+    elapsed, bucket = run(scenario())
+    assert 0.4 <= elapsed < 0.8
+    assert bucket.acquired == 10
+    assert bucket.throttled >= 4
+
+
+def test_acquire_many_charges_every_token_even_beyond_the_burst():
+    async def scenario():
+        bucket = server.TokenBucket(requests_per_minute=600, burst=2)
+        started = time.monotonic()
+        await bucket.acquire(5)           # 2 from the burst, 3 waited for
+        first = time.monotonic() - started
+        await bucket.acquire()            # the next token then accrues at the normal rate
+        return first, time.monotonic() - started, bucket
+
+    first, total, bucket = run(scenario())
+    assert first == pytest.approx(0.3, abs=0.1)
+    assert total == pytest.approx(0.4, abs=0.1)
+    assert bucket.acquired == 6
+    assert bucket.requests_last_minute() == 6
+
+
+def test_concurrent_waiters_are_served_in_order():
+    async def scenario():
+        bucket = server.TokenBucket(requests_per_minute=6000, burst=1)
+        order = []
+
+        async def take(n):
+            await bucket.acquire()
+            order.append(n)
+
+        await asyncio.gather(*[take(n) for n in range(20)])
+        return order
+
+    assert run(scenario()) == list(range(20))
+
+
+def test_bulk_download_is_charged_per_ticker(fake_market, monkeypatch):
+    bucket = server.TokenBucket(1e6, 1000)
+    monkeypatch.setitem(server.UPSTREAM_BUCKETS, server.DEFAULT_UPSTREAM_PROVIDER, bucket)
+    download_kwargs = []
+
+    def download(tickers, **kwargs):
+        download_kwargs.append(kwargs)
+        return fake_market.download(tickers, **kwargs)
+
+    monkeypatch.setattr(server.yf, "download", download)
+    symbols = list(server.NSE_SYMBOLS)[:45]
+    calls_before = server.UPSTREAM_CALL_STATS["by_kind"].get("bulk_history", 0)
+
+    frames = run(server.fetch_bulk_history(symbols))
+
+    assert len(frames) == 45
+    assert len(download_kwargs) == -(-45 // server.BULK_DOWNLOAD_CHUNK_SIZE)
+    assert all(kwargs["threads"] is False for kwargs in download_kwargs)
+    assert bucket.acquired == 45
+    assert server.UPSTREAM_CALL_STATS["by_kind"]["bulk_history"] - calls_before == 45
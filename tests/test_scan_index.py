@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+import server
+
+SECTORS = ["All", None, "Banking", "IT", "Pharma", "Unlisted"]
+RISK_LEVELS = [None, "All", "Low", "Medium", "High"]
+ACTIONS = [None, "All", "BUY", "WAIT", "STRONG BUY"]
+
+
+def _row(symbol: str, rng: random.Random) -> dict:
+    rule = rng.choice(server.BREAKOUT_RULES)
+    return {
+        "symbol": symbol,
+        "sector": server.NSE_SYMBOLS[symbol],
+        "breakout_type": rule["type"],
+        "confidence_score": rule["confidence"],
+        "risk_assessment": {"risk_level": rng.choice(["Low", "Medium", "High"])},
+        "trading_recommendation": rng.choice([None, {"action": "BUY"}, {"action": "STRONG BUY"}, {}]),
+        "technical_data": {"rsi": rng.choice([None, rng.uniform(20, 90)]), "volume_ratio": rng.uniform(0.5, 3)},
+        "fundamental_data": {"pe_ratio": rng.choice([None, rng.uniform(5, 80)])},
+    }
+
+
+@pytest.fixture(scope="module")
+def snapshot():
+    rng = random.Random(7)
+    symbols = server.get_symbols_by_priority()
+    scanned = frozenset(symbol for symbol in symbols if rng.random() < 0.9)
+    rows = {symbol: _row(symbol, rng) for symbol in scanned if rng.random() < 0.4}
+    return rows, scanned, server.ScanIndex(rows, scanned, symbols)
+
+
+def _brute_force(rows, scanned, sector, min_confidence, risk_level, action, breakout_type, limit, ranges):
+    """The live scan's semantics: cover the first `limit` symbols, filter row by row, sort by confidence"""
+    covered = server.select_scan_symbols(sector, limit)
+    matched = [rows[symbol] for symbol in covered if symbol in rows and server.matches_scan_filters(
+        rows[symbol], min_confidence, risk_level, action, breakout_type, ranges)]
+    matched.sort(key=lambda row: row['confidence_score'], reverse=True)
+    return matched, sum(symbol in scanned for symbol in covered)
+
+
+def test_queries_match_row_by_row_filtering(snapshot):
+    rows, scanned, index = snapshot
+    rng = random.Random(11)
+
+    for _ in range(1000):
+        query = (
+            rng.choice(SECTORS), rng.choice([0.0, 0.5, 0.6, 0.65, 0.7, 0.75, 0.85, 0.9]),
+            rng.choice(RISK_LEVELS), rng.choice(ACTIONS), rng.choice([None, "All"] + server.BREAKOUT_TYPES),
+            rng.choice([1, 10, 50, 100, 1000]),
+            server.scan_range_filters(rng.choice([None, 40.0]), rng.choice([None, 70.0]),
+                                      rng.choice([None, 1.5]), None, rng.choice([None, 25.0])),
+        )
+        matched, total = index.query(*query)
+        expected, expected_total = _brute_force(rows, scanned, *query)
+
+        assert [row["symbol"] for row in matched] == [row["symbol"] for row in expected], query
+        assert total == expected_total, query
+
+
+def test_unknown_category_values_match_nothing(snapshot):
+    _, _, index = snapshot
+
+    assert index.query(risk_level="Extreme", min_confidence=0.0)[0] == []
+    assert index.query(sector="Unlisted", min_confidence=0.0) == ([], 0)
+
+
+def test_snapshot_limits_skip_quarantined_symbols(snapshot):
+    rows, scanned, _ = snapshot
+    quarantined = [symbol for symbol in server.get_symbols_by_priority() if symbol in rows][:3]
+    for symbol in quarantined:
+        for _ in range(server.QUARANTINE_AFTER_NOT_FOUND):
+            server.record_symbol_failure(symbol, "No data found, symbol may be delisted", not_found=True)
+
+    index = server.ScanSnapshot(1, server.datetime.now(server.timezone.utc), 0.0, dict(rows), scanned).index
+
+    for sector, limit in ((None, 10), (None, 50), (None, 1000), ("Banking", 5)):
+        query = (sector, 0.0, None, None, None, limit, {})
+        matched, total = index.query(*query)
+        expected, expected_total = _brute_force(rows, scanned, *query)
+        assert [row["symbol"] for row in matched] == [row["symbol"] for row in expected], query
+        assert total == expected_total, query
@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from tests.conftest import run
+
+
+@pytest.fixture
+def universe(fake_market, monkeypatch):
+    """A 30-symbol universe scanned live in batches of 10; jobs are dropped afterwards"""
+    symbols = server.get_symbols_by_priority()[:30]
+    monkeypatch.setattr(server, "get_symbols_by_priority", lambda: list(symbols))
+    monkeypatch.setattr(server, "SCAN_SNAPSHOT", None)
+    monkeypatch.setattr(server, "BATCH_SIZE", 10)
+    yield symbols
+    server.SCAN_JOBS.clear()
+
+
+def test_job_reports_progress_and_completes_with_the_scan_results(universe):
+    async def scenario():
+        job = await server.create_scan_job(server.ScanJobRequest(min_confidence=0.0))
+        progress = []
+        while True:
+            state = await server.get_scan_job(job["job_id"], include_results=False)
+            progress.append(state["progress"]["processed"])
+            if state["status"] != "running":
+                break
+            await asyncio.sleep(0.05)
+        return job, progress, await server.get_scan_job(job["job_id"])
+
+    job, progress, finished = run(scenario())
+
+    assert job["status"] == "running" and job["progress"]["total_symbols"] == 30
+    assert any(0 < processed < 30 for processed in progress)   # partial progress while batches run
+    assert finished["status"] == "completed" and finished["progress"]["percent"] == 100.0
+    collected = run(server.collect_breakout_scan(None, 0.0, None, None, None, 100, True, {}))
+    assert [row["symbol"] for row in finished["breakout_stocks"]] == \
+        [row["symbol"] for row in collected["breakout_stocks"]]
+    assert finished["scan_statistics"]["total_scanned"] == 30
+
+
+def test_identical_requests_reuse_the_running_job(universe):
+    async def scenario():
+        first = await server.create_scan_job(server.ScanJobRequest(limit=10))
+        second = await server.create_scan_job(server.ScanJobRequest(limit=10))
+        other = await server.create_scan_job(server.ScanJobRequest(limit=20))
+        await asyncio.gather(*(job.task for job in server.SCAN_JOBS.values()))
+        return first, second, other
+
+    first, second, other = run(scenario())
+
+    assert second["reused"] and second["job_id"] == first["job_id"]
+    assert not other["reused"] and other["job_id"] != first["job_id"]
+    assert run(server.list_scan_jobs())["jobs"][0]["status"] == "completed"
+
+
+def test_finished_jobs_expire_after_the_ttl(universe):
+    async def scenario():
+        job = await server.create_scan_job(server.ScanJobRequest(limit=10))
+        await server.SCAN_JOBS[job["job_id"]].task
+        return job["job_id"]
+
+    job_id = run(scenario())
+    server.SCAN_JOBS[job_id].finished_at = datetime.now(timezone.utc) - timedelta(minutes=server.SCAN_JOB_TTL_MINUTES + 1)
+
+    assert server.clear_expired_scan_jobs() == 1
+    with pytest.raises(HTTPException) as error:
+        run(server.get_scan_job(job_id))
+    assert error.value.status_code == 404
@@ -0,0 +1,61 @@
+import pytest
+
+import server
+from tests.conftest import run
+
+FILTERS = [
+    {},
+    {"min_confidence": 0.8},
+    {"breakout_type": "momentum", "min_confidence": 0.0},
+    {"sector": "Banking", "limit": 10},
+    {"limit": 25, "risk_level": "Medium"},
+    {"action": "BUY", "min_rsi": 50.0, "max_pe": 30.0},
+]
+
+
+@pytest.fixture
+def universe(fake_market, monkeypatch):
+    """A 40-symbol universe analysed once into a published snapshot"""
+    symbols = server.get_symbols_by_priority()[:40]
+    monkeypatch.setattr(server, "get_symbols_by_priority", lambda: list(symbols))
+    monkeypatch.setattr(server, "SCAN_SNAPSHOT", None)
+    server.SCAN_SNAPSHOT = run(server.build_scan_snapshot())
+    return fake_market
+
+
+def _scan(filters: dict) -> dict:
+    ranges = server.scan_range_filters(filters.get("min_rsi"), None, None, None, filters.get("max_pe"))
+    return run(server.collect_breakout_scan(
+        filters.get("sector"), filters.get("min_confidence", 0.5), filters.get("risk_level"), filters.get("action"),
+        filters.get("breakout_type"), filters.get("limit", 100), True, ranges
+    ))
+
+
+def test_fresh_snapshot_answers_scans_without_fetching(universe):
+    calls = dict(universe.calls)
+
+    response = run(server.scan_breakout_stocks(min_confidence=0.0))
+
+    assert response["scanning_info"]["processing_method"] == "Materialized snapshot"
+    assert response["breakout_stocks"] and universe.calls == calls
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_snapshot_query_matches_a_live_scan(universe, filters):
+    from_snapshot = _scan(filters)
+    server.SCAN_SNAPSHOT = None
+    live = _scan(filters)
+
+    assert live["scanning_info"]["processing_method"] != "Materialized snapshot"
+    assert [row["symbol"] for row in from_snapshot["breakout_stocks"]] == \
+        [row["symbol"] for row in live["breakout_stocks"]]
+    assert from_snapshot["scan_statistics"]["total_scanned"] == live["scan_statistics"]["total_scanned"]
+    assert from_snapshot["sector_breakdown"] == live["sector_breakdown"]
+
+
+def test_expired_snapshot_falls_back_to_a_live_scan(universe):
+    server.SCAN_SNAPSHOT.expires_at = 0
+
+    response = _scan({"limit": 5})
+
+    assert response["scanning_info"]["processing_method"] == "Batch processing with caching"
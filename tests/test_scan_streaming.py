@@ -0,0 +1,65 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from tests.conftest import run
+
+
+@pytest.fixture
+def universe(fake_market, monkeypatch):
+    """A 30-symbol universe scanned live in batches of 10"""
+    symbols = server.get_symbols_by_priority()[:30]
+    monkeypatch.setattr(server, "get_symbols_by_priority", lambda: list(symbols))
+    monkeypatch.setattr(server, "SCAN_SNAPSHOT", None)
+    monkeypatch.setattr(server, "BATCH_SIZE", 10)
+    return symbols
+
+
+def _stream(**params) -> list:
+    async def consume():
+        response = await server.stream_breakout_scan(min_confidence=0.0, **params)
+        return response.media_type, [chunk async for chunk in response.body_iterator]
+
+    return run(consume())
+
+
+def test_ndjson_stream_emits_breakouts_per_batch_then_a_summary(universe):
+    media_type, chunks = _stream()
+    events = [json.loads(chunk) for chunk in chunks]
+
+    assert media_type == "application/x-ndjson" and all(chunk.endswith("\n") for chunk in chunks)
+    assert [event["data"]["batch"] for event in events if event["event"] == "progress"] == [1, 2, 3]
+    assert events[-1]["event"] == "summary"
+
+    # Breakouts of each batch arrive before that batch's progress event, not at the end
+    batch_of = {symbol: i // 10 + 1 for i, symbol in enumerate(universe)}
+    batch = 1
+    for event in events:
+        if event["event"] == "progress":
+            batch = event["data"]["batch"] + 1
+        elif event["event"] == "breakout":
+            assert batch_of[event["data"]["symbol"]] == batch
+
+    streamed = [event["data"]["symbol"] for event in events if event["event"] == "breakout"]
+    collected = run(server.collect_breakout_scan(None, 0.0, None, None, None, 100, True, {}))
+    assert streamed and sorted(streamed) == sorted(row["symbol"] for row in collected["breakout_stocks"])
+    assert events[-1]["data"]["scan_statistics"]["breakouts_found"] == len(streamed)
+
+
+def test_sse_stream_names_each_event(universe):
+    media_type, chunks = _stream(format="sse", limit=10)
+
+    assert media_type == "text/event-stream"
+    names = [chunk.split("\n", 1)[0] for chunk in chunks]
+    assert names[-2:] == ["event: progress", "event: summary"]
+    for chunk in chunks:
+        assert chunk.endswith("\n\n")
+        json.loads(chunk.split("\ndata: ", 1)[1])
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        run(server.stream_breakout_scan(format="xml"))
+    assert error.value.status_code == 400
@@ -0,0 +1,97 @@
+import asyncio
+
+import server
+from tests.conftest import run
+
+
+class SlowFetches:
+    """Stands in for _fetch_comprehensive_stock_data: never finishes, records cancellations"""
+
+    def __init__(self):
+        self.started = []
+        self.cancelled = []
+
+    async def __call__(self, symbol: str):
+        self.started.append(symbol)
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            self.cancelled.append(symbol)
+            raise
+
+
+async def _wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_concurrent_callers_share_one_run():
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def scenario():
+        return await asyncio.gather(*[server.single_flight("test:shared", factory) for _ in range(5)])
+
+    assert run(scenario()) == ["result"] * 5
+    assert len(calls) == 1
+    assert not server.INFLIGHT_REQUESTS and not server.INFLIGHT_WAITERS
+
+
+def test_cancelling_one_caller_keeps_the_shared_task_for_the_rest():
+    async def scenario():
+        started = asyncio.Event()
+
+        async def factory():
+            started.set()
+            await asyncio.sleep(0.1)
+            return "result"
+
+        first = asyncio.ensure_future(server.single_flight("test:partial", factory))
+        second = asyncio.ensure_future(server.single_flight("test:partial", factory))
+        await started.wait()
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert run(scenario()) == ("result", True)
+
+
+def test_cancelling_the_last_caller_cancels_the_shared_task():
+    fetch = SlowFetches()
+
+    async def scenario():
+        callers = [asyncio.ensure_future(server.single_flight("test:abandoned", lambda: fetch("RELIANCE")))
+                   for _ in range(3)]
+        await _wait_until(lambda: fetch.started)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await _wait_until(lambda: not server.INFLIGHT_REQUESTS)
+
+    run(scenario())
+    assert fetch.cancelled == ["RELIANCE"]
+    assert not server.INFLIGHT_WAITERS
+
+
+def test_cancel_scan_job_stops_its_fetches(monkeypatch):
+    fetch = SlowFetches()
+    monkeypatch.setattr(server, "_fetch_comprehensive_stock_data", fetch)
+    monkeypatch.setattr(server, "SCAN_SNAPSHOT", None)
+
+    async def scenario():
+        request = server.ScanJobRequest(limit=5, use_cache=False)
+        job = await server.create_scan_job(request)
+        await _wait_until(lambda: len(fetch.started) == 5)
+
+        cancelled = await server.cancel_scan_job(job["job_id"])
+        await _wait_until(lambda: not server.INFLIGHT_REQUESTS)
+        return cancelled
+
+    assert run(scenario())["status"] == "cancelled"
+    assert sorted(fetch.cancelled) == sorted(fetch.started)
+    server.SCAN_JOBS.clear()
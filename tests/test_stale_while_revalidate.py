@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+import pytest
+
+import server
+from tests.conftest import run
+
+
+@pytest.fixture
+def cached(fake_market, monkeypatch):
+    """Cache one analysis per symbol in L1 only, returning a function that ages an entry"""
+    monkeypatch.setattr(server, "SHARED_CACHE_ENABLED", False)
+
+    def cache(symbol: str, expired_for: float = 0.0, hard_expired: bool = False) -> dict:
+        server.cache_stock_data(symbol, run(server._fetch_comprehensive_stock_data(symbol)))
+        entry = server.STOCK_DATA_CACHE[f"stock_{symbol}"]
+        if expired_for:
+            entry['timestamp'] -= expired_for
+            entry['expires_at'] = time.time() - expired_for
+        if hard_expired:
+            entry['stale_until'] = time.time() - 1
+        return entry
+
+    return cache
+
+
+async def _settle() -> None:
+    """Let scheduled background refreshes finish"""
+    while server.BACKGROUND_TASKS:
+        await asyncio.gather(*server.BACKGROUND_TASKS)
+
+
+def test_fresh_entry_is_served_without_a_refresh(cached, fake_market):
+    cached("RELIANCE")
+    calls = dict(fake_market.calls)
+
+    data = run(server.get_cached_stock_data("RELIANCE"))
+
+    assert data["cache_status"] == "fresh" and fake_market.calls == calls
+    assert not server.BACKGROUND_TASKS
+
+
+def test_stale_entry_is_served_at_once_and_refreshed_once(cached, fake_market):
+    entry = cached("TCS", expired_for=120)
+    fetches = fake_market.calls["history"] + fake_market.calls["download"]
+
+    async def scenario():
+        served = await asyncio.gather(*[server.get_cached_stock_data("TCS") for _ in range(5)])
+        scheduled = server.CACHE_REFRESH_STATS["refreshes_scheduled"]
+        await _settle()
+        return served, scheduled
+
+    before = server.CACHE_REFRESH_STATS["refreshes_scheduled"]
+    served, scheduled = run(scenario())
+
+    assert all(data["cache_status"] == "stale" and data["data_age_seconds"] >= 120 for data in served)
+    assert scheduled - before == 1
+    assert fake_market.calls["history"] + fake_market.calls["download"] - fetches == 1
+    refreshed = server.STOCK_DATA_CACHE["stock_TCS"]
+    assert refreshed is not entry and server.is_cache_valid(refreshed)
+    assert "TCS" not in server.CACHE_REFRESHING
+
+
+def test_stale_entry_is_not_served_when_fresh_data_is_required(cached):
+    cached("INFY", expired_for=120)
+
+    assert run(server.get_cached_stock_data("INFY", allow_stale=False)) is None
+
+
+def test_entry_past_the_hard_ttl_is_a_miss(cached):
+    cached("WIPRO", expired_for=120, hard_expired=True)
+
+    assert run(server.lookup_cached_stock_data("WIPRO")) == (None, "miss")
+    assert run(server.get_cached_stock_data("WIPRO")) is None
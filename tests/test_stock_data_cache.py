@@ -0,0 +1,112 @@
+import time
+
+import server
+
+
+def _entry(size: int = 1000, age: float = 0.0, expires_in: float = 600.0, stale_for: float = 600.0) -> dict:
+    now = time.time()
+    return {'data': "x" * size, 'timestamp': now - age, 'expires_at': now + expires_in,
+            'stale_until': now + expires_in + stale_for}
+
+
+def _cache(entries: int, policy: str = 'lru') -> server.StockDataCache:
+    """A cache with room for `entries` entries of _entry()'s default size"""
+    return server.StockDataCache(entries * server.deep_sizeof(_entry()) + 100, policy)
+
+
+def test_byte_budget_evicts_the_least_recently_used_entry():
+    cache = _cache(3)
+    for symbol in ("A", "B", "C"):
+        cache[f"stock_{symbol}"] = _entry()
+    cache.lookup("stock_A")   # A becomes the most recently used
+
+    cache["stock_D"] = _entry()
+
+    assert list(cache) == ["stock_C", "stock_A", "stock_D"]
+    assert cache.bytes == sum(server.deep_sizeof(cache[key]) for key in cache) <= cache.max_bytes
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lfu_policy_evicts_the_least_used_entry():
+    cache = _cache(3, policy='lfu')
+    for symbol in ("A", "B", "C"):
+        cache[f"stock_{symbol}"] = _entry()
+    for key, reads in (("stock_A", 3), ("stock_B", 1), ("stock_C", 2)):
+        for _ in range(reads):
+            cache.lookup(key)
+
+    cache["stock_D"] = _entry()
+
+    assert "stock_B" not in cache and len(cache) == 3
+
+
+def test_oversized_write_keeps_only_the_new_entry():
+    cache = _cache(2)
+    cache["stock_A"] = _entry()
+
+    cache["stock_B"] = _entry(size=10_000)
+
+    assert list(cache) == ["stock_B"]
+
+
+def test_lookups_are_counted_per_key_class():
+    cache = _cache(10)
+    cache["stock_A"] = _entry()
+    cache["stock_B"] = _entry(expires_in=-1)
+    cache["chart_A"] = _entry(expires_in=-10, stale_for=5)
+
+    statuses = [cache.lookup(key)[1] for key in ("stock_A", "stock_B", "stock_C", "chart_A")]
+    cache["stock_C"] = _entry()
+
+    assert statuses == ["fresh", "stale", "miss", "miss"]
+    by_class = cache.stats()["by_key_class"]
+    assert (by_class["stock"]["hits"], by_class["stock"]["stale_hits"], by_class["stock"]["misses"]) == (1, 1, 1)
+    assert by_class["stock"]["loads"] == 1 and by_class["stock"]["entries"] == 3
+    assert by_class["chart"]["misses"] == 1 and by_class["chart"]["hit_ratio"] == 0.0
+    assert cache.hit_ratio() == 0.5
+
+
+def test_unrecorded_lookups_leave_statistics_and_recency_alone():
+    cache = _cache(10)
+    cache["stock_A"] = _entry()
+    cache["stock_B"] = _entry()
+
+    cache.lookup("stock_A", record=False)
+
+    assert list(cache) == ["stock_A", "stock_B"] and cache.hit_ratio() == 0.0
+
+
+def test_entries_are_counted_by_age_band():
+    cache = _cache(10)
+    for i, age_minutes in enumerate((1, 4, 12, 30, 90)):
+        cache[f"stock_{i}"] = _entry(age=age_minutes * 60)
+    del cache["stock_3"]
+
+    assert cache.entries_by_age([5, 15, 60]) == [2, 1, 0, 1]
+
+
+def test_clear_and_delete_forget_pending_loads():
+    cache = _cache(10)
+    cache.lookup("stock_A")
+    cache["stock_B"] = _entry(expires_in=-10, stale_for=5)
+    cache.lookup("stock_B")   # past the hard TTL: a miss on a key that still has an entry
+
+    cache.clear()
+    cache["stock_B"] = _entry(expires_in=-10, stale_for=5)
+    cache.lookup("stock_B")
+    del cache["stock_B"]      # as clear_old_cache_entries does
+    cache["stock_A"] = _entry()
+    cache["stock_B"] = _entry()
+
+    assert cache.stats()["by_key_class"]["stock"]["loads"] == 0
+
+
+def test_abandoned_misses_are_not_timed(monkeypatch):
+    cache = _cache(10)
+    cache.lookup("stock_A")
+    monkeypatch.setattr(server, "CACHE_PENDING_LOAD_SECONDS", 0)
+    cache.lookup("stock_B")   # drops the abandoned miss on A
+
+    cache["stock_A"] = _entry()
+
+    assert cache.stats()["by_key_class"]["stock"]["loads"] == 0
@@ -0,0 +1,97 @@
+import pytest
+
+import server
+from tests.conftest import FakeTicker, make_history, run
+
+
+@pytest.fixture(autouse=True)
+def cold_stores():
+    """Forget stored bars and fundamentals left by earlier tests for the symbols used here"""
+    symbols = ("RELIANCE", "TCS", "INFY")
+    with server.closing(server.get_ohlcv_connection()) as conn, conn:
+        for table in ("ohlcv", "fundamentals"):
+            conn.executemany(f"DELETE FROM {table} WHERE symbol = ?", [(symbol,) for symbol in symbols])
+
+
+def test_cold_fetch_makes_one_history_and_one_fundamentals_call(fake_market):
+    stock_data = run(server._fetch_comprehensive_stock_data("RELIANCE"))
+
+    assert fake_market.calls == {"history": 1, "info": 1, "download": 0}
+    assert stock_data["data_validation"]["upstream_calls"] == {"history": 1, "fundamentals": 1}
+    assert stock_data["name"] == "RELIANCE Ltd" and stock_data["fundamental_data"]
+
+
+def test_refetch_reuses_stored_bars_and_cached_fundamentals(fake_market):
+    run(server._fetch_comprehensive_stock_data("TCS"))
+
+    stock_data = run(server._fetch_comprehensive_stock_data("TCS"))
+
+    assert fake_market.calls == {"history": 2, "info": 1, "download": 0}
+    assert stock_data["data_validation"]["upstream_calls"] == {"history": 1, "fundamentals": 0}
+    assert stock_data["name"] == "TCS Ltd"
+
+
+def test_stock_endpoint_answers_repeats_from_the_cache(fake_market):
+    first = run(server.get_stock_data("infy"))
+    calls = dict(fake_market.calls)
+
+    second = run(server.get_stock_data("INFY"))
+
+    assert fake_market.calls == calls
+    assert first["cache_status"] == "miss" and second["cache_status"] == "fresh"
+    assert second["chart_data"]["1mo"] == first["chart_data"]["1mo"]
+
+
+@pytest.fixture
+def flaky_history(monkeypatch):
+    """History calls raise a transport error until `failures` of them have failed"""
+    state = {"failures": 0, "attempts": 0}
+    original = FakeTicker.history
+
+    def history(ticker, *args, **kwargs):
+        state["attempts"] += 1
+        if state["attempts"] <= state["failures"]:
+            raise ConnectionError("Connection reset by peer")
+        return original(ticker, *args, **kwargs)
+
+    monkeypatch.setattr(FakeTicker, "history", history)
+    monkeypatch.setattr(server, "INITIAL_WAIT", 0.01)
+    monkeypatch.setattr(server, "RETRY_BUDGET", server.RetryBudget(ratio=0.1, min_per_minute=10))
+    return state
+
+
+def test_transient_history_errors_are_retried(fake_market, flaky_history):
+    flaky_history["failures"] = 2
+
+    stock_data = run(server.fetch_with_retry("RELIANCE"))
+
+    assert stock_data["symbol"] == "RELIANCE" and flaky_history["attempts"] == 3
+    assert server.RETRY_BUDGET.stats()["retries_last_minute"] == 2
+    assert "RELIANCE" not in server.SYMBOL_FAILURES
+
+
+def test_persistent_errors_reach_the_negative_cache_once(fake_market, flaky_history):
+    flaky_history["failures"] = 100
+
+    assert run(server.fetch_with_retry("TCS")) is None
+    assert flaky_history["attempts"] == server.MAX_RETRIES
+    assert server.circuit_open()   # every attempt reached the breaker
+
+    server.UPSTREAM_BREAKERS[server.DEFAULT_UPSTREAM_PROVIDER].state = "closed"
+    assert run(server.fetch_comprehensive_stock_data("INFY")) is None
+
+    assert server.SYMBOL_FAILURES["TCS"]["failures"] == server.SYMBOL_FAILURES["INFY"]["failures"] == 1
+
+
+def test_price_snapshot_prefers_the_live_quote():
+    hist = make_history(seed=2, bars=30)
+    quote = {"currentPrice": 123.0, "regularMarketPreviousClose": 100.0, "regularMarketVolume": 5000, "marketCap": 1e9}
+
+    live = server.derive_price_snapshot(hist, quote)
+    historical = server.derive_price_snapshot(hist)
+
+    assert live["current_price"] == 123.0 and live["change_percent"] == pytest.approx(23.0)
+    assert live["volume"] == 5000 and live["source"] == "Yahoo Finance Real-time"
+    assert historical["current_price"] == pytest.approx(hist['Close'].iloc[-1])
+    assert historical["previous_close"] == pytest.approx(hist['Close'].iloc[-2])
+    assert historical["source"] == "Yahoo Finance Historical" and "data_age_warning" in historical
@@ -0,0 +1,85 @@
+import json
+import logging
+from datetime import date, datetime
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def holidays(monkeypatch):
+    monkeypatch.setattr(server, "NSE_HOLIDAYS", {date(2026, 10, 20): "Dussehra", date(2026, 12, 25): "Christmas"})
+    monkeypatch.setitem(server.NSE_HOLIDAYS_STATUS, "warned_on", None)
+    monkeypatch.setitem(server.NSE_HOLIDAYS_STATUS, "error", None)
+    return server.NSE_HOLIDAYS
+
+
+def test_shipped_holiday_file_loads():
+    shipped = server.load_nse_holidays(server.ROOT_DIR / 'nse_holidays.json')
+
+    assert shipped[date(2026, 12, 25)] == "Christmas"
+    assert all(day.weekday() < 5 for day in shipped)
+
+
+def test_holidays_are_read_from_the_configured_file(tmp_path):
+    path = tmp_path / "holidays.json"
+    path.write_text(json.dumps({"2027-01-26": "Republic Day"}))
+
+    assert server.load_nse_holidays(path) == {date(2027, 1, 26): "Republic Day"}
+
+
+def test_listed_holidays_are_not_trading_days(holidays):
+    assert not server.is_trading_day(date(2026, 10, 20))
+    assert server.is_trading_day(date(2026, 10, 21))
+    assert not server.is_trading_day(date(2026, 10, 24))   # Saturday
+
+
+def test_warns_once_a_day_past_the_last_listed_holiday(holidays, caplog):
+    with caplog.at_level(logging.WARNING, logger=server.logger.name):
+        assert server.check_holiday_calendar(date(2026, 12, 25))
+        assert not caplog.records
+
+        assert not server.check_holiday_calendar(date(2027, 1, 4))
+        assert not server.check_holiday_calendar(date(2027, 1, 4))
+        assert len(caplog.records) == 1 and "2026-12-25" in caplog.messages[0]
+
+        server.check_holiday_calendar(date(2027, 1, 5))
+        assert len(caplog.records) == 2
+
+
+def test_warns_when_no_holidays_loaded(monkeypatch, caplog):
+    monkeypatch.setattr(server, "NSE_HOLIDAYS", {})
+    monkeypatch.setitem(server.NSE_HOLIDAYS_STATUS, "warned_on", None)
+    monkeypatch.setitem(server.NSE_HOLIDAYS_STATUS, "error", "No such file")
+
+    with caplog.at_level(logging.WARNING, logger=server.logger.name):
+        assert not server.check_holiday_calendar(date(2026, 10, 19))
+
+    assert "No such file" in caplog.text
+
+
+def _ist(*args) -> datetime:
+    return server.IST.localize(datetime(*args))
+
+
+def test_sessions_follow_the_nse_day(holidays):
+    assert server.market_session(_ist(2026, 10, 19, 8, 59)) == "CLOSED"
+    assert server.market_session(_ist(2026, 10, 19, 9, 5)) == "PRE_OPEN"
+    assert server.market_session(_ist(2026, 10, 19, 15, 30)) == "OPEN"
+    assert server.market_session(_ist(2026, 10, 19, 15, 40)) == "SETTLING"
+    assert server.market_session(_ist(2026, 10, 19, 15, 45)) == "CLOSED"
+    assert server.market_session(_ist(2026, 10, 20, 11, 0)) == "CLOSED"   # Dussehra
+
+
+def test_settled_data_stays_current_until_the_next_pre_open(holidays):
+    monday_evening = _ist(2026, 10, 19, 18, 0).timestamp()
+    friday_evening = _ist(2026, 10, 23, 18, 0).timestamp()
+    monday_noon = _ist(2026, 10, 19, 12, 0).timestamp()
+
+    # The Tuesday holiday is skipped, and so is the weekend
+    assert server.market_data_expires_at(monday_evening, 300) == _ist(2026, 10, 21, 9, 0).timestamp()
+    assert server.market_data_expires_at(friday_evening, 300) == _ist(2026, 10, 26, 9, 0).timestamp()
+    assert server.market_data_expires_at(monday_noon, server.cache_ttl_seconds("OPEN")) == \
+        monday_noon + server.CACHE_TRADING_EXPIRY_MINUTES * 60
+    assert server.cache_ttl_seconds("SETTLING") == server.CACHE_EXPIRY_MINUTES * 60
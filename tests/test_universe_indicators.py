@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import server
+from tests.conftest import assert_indicators_match, make_history, reference_indicators
+
+LENGTHS = [5, 13, 14, 20, 34, 35, 60, 199, 200, 260]
+
+
+def _row(table: pd.DataFrame, symbol: str) -> dict:
+    return {key: None if pd.isna(value) else float(value) for key, value in table.loc[symbol].items()}
+
+
+@pytest.mark.parametrize("bars", LENGTHS)
+def test_single_symbol_matches_the_rolling_reference(bars):
+    hist = make_history(seed=bars, bars=bars)
+
+    assert_indicators_match(server.calculate_advanced_technical_indicators(hist), reference_indicators(hist))
+
+
+def test_ragged_universe_matches_each_symbol_on_its_own():
+    histories = {f"S{bars}": make_history(seed=bars, bars=bars) for bars in LENGTHS}
+    days = max(LENGTHS)
+
+    # Shorter histories are NaN-padded before their first bar; one symbol also misses its last day
+    arrays = {column: np.full((days, len(histories)), np.nan) for column in ('Close', 'High', 'Low', 'Volume')}
+    for i, hist in enumerate(histories.values()):
+        for column, array in arrays.items():
+            array[days - len(hist):, i] = hist[column].to_numpy()
+    gapped = list(histories).index("S60")
+    for array in arrays.values():
+        array[:, gapped] = np.roll(array[:, gapped], -1)
+        array[-1, gapped] = np.nan
+
+    table = server.compute_universe_indicators(arrays['Close'], arrays['High'], arrays['Low'],
+                                               arrays['Volume'], symbols=list(histories))
+
+    assert list(table.columns) == server.INDICATOR_COLUMNS
+    for symbol, hist in histories.items():
+        assert_indicators_match(_row(table, symbol), reference_indicators(hist))
+
+
+def test_flat_history_has_no_undefined_ratios():
+    hist = make_history(seed=1, bars=40)
+    hist[['Open', 'High', 'Low', 'Close']] = 100.0
+
+    indicators = server.calculate_advanced_technical_indicators(hist)
+
+    assert indicators['rsi'] is None and indicators['stochastic_k'] is None
+    assert indicators['sma_20'] == 100.0 and indicators['atr'] == 0.0
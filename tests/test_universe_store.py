@@ -0,0 +1,125 @@
+import multiprocessing
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import server
+from tests.conftest import make_history, run
+
+SYMBOLS = [f"SYM{i:03d}" for i in range(40)]
+
+
+def calendar_history(bars: int, end_offset: int = 0, seed: int = 0) -> pd.DataFrame:
+    """History on NSE trading days only, ending `end_offset` trading days before the latest one"""
+    today = (pd.Timestamp.today().normalize() - pd.Timestamp(0)).days
+    days = server.trading_day_numbers(today, bars + end_offset)[:bars]
+    frame = make_history(seed=seed, bars=bars)
+    frame.index = pd.to_datetime(days.astype('datetime64[D]'))
+    return frame
+
+
+def row_frame(store: server.UniverseStore, symbol: str) -> pd.DataFrame:
+    view = store.symbol_view(symbol)
+    dates = pd.to_datetime(np.asarray(store.dates).astype('datetime64[D]'))
+    frame = pd.DataFrame(np.asarray(view), index=dates, columns=server.OHLCV_COLUMNS)
+    return frame.dropna(subset=['Close'])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return server.UniverseStore(tmp_path / "universe", SYMBOLS, 260)
+
+
+def test_axis_covers_the_full_lookback_after_a_short_first_write(store):
+    short = calendar_history(30, seed=1)
+    long = calendar_history(250, seed=2)
+
+    store.write_symbol("SYM000", short)
+    store.write_symbol("SYM001", long)
+
+    assert len(row_frame(store, "SYM001")) == 250
+    pd.testing.assert_frame_equal(row_frame(store, "SYM001"), long, check_freq=False, check_names=False)
+    pd.testing.assert_frame_equal(row_frame(store, "SYM000"), short, check_freq=False, check_names=False)
+    assert len(store.trading_days()) == 260
+
+
+def test_newer_day_rolls_the_axis_and_keeps_existing_rows(store):
+    older = calendar_history(100, end_offset=1, seed=3)
+    store.write_symbol("SYM000", older)
+
+    latest = calendar_history(100, seed=4)
+    store.write_symbol("SYM001", latest)
+
+    assert store.trading_days()[-1] == latest.index[-1]
+    pd.testing.assert_frame_equal(row_frame(store, "SYM000"), older, check_freq=False, check_names=False)
+    assert store.fresh_rows()[store.index["SYM001"]]
+    assert not store.fresh_rows()[store.index["SYM000"]]
+
+
+def test_off_calendar_session_is_added(store):
+    hist = calendar_history(50, seed=5)
+    store.write_symbol("SYM000", hist)
+
+    # A weekend special session (e.g. Muhurat trading) is not on the weekday calendar
+    sunday = hist.index[-10] + pd.offsets.Week(weekday=6)
+    special = pd.concat([hist, hist.iloc[[-10]].set_axis([sunday])]).sort_index()
+    store.write_symbol("SYM001", special)
+
+    assert sunday in store.trading_days()
+    assert len(row_frame(store, "SYM001")) == 51
+    pd.testing.assert_frame_equal(row_frame(store, "SYM000"), hist, check_freq=False, check_names=False)
+
+
+def test_bars_older_than_the_lookback_are_skipped(store):
+    hist = calendar_history(300, seed=6)
+    store.write_symbol("SYM000", hist)
+
+    pd.testing.assert_frame_equal(row_frame(store, "SYM000"), hist.iloc[-260:], check_freq=False, check_names=False)
+
+
+def test_change_percent_uses_the_last_two_bars(store):
+    hist = calendar_history(20, seed=7)
+    store.write_symbol("SYM000", hist)
+
+    expected = (hist['Close'].iloc[-1] / hist['Close'].iloc[-2] - 1) * 100
+    assert store.change_percent()[store.index["SYM000"]] == pytest.approx(expected)
+
+
+def test_fetches_write_the_universe_store_off_the_event_loop(fake_market, monkeypatch):
+    writers = []
+    monkeypatch.setattr(server.UNIVERSE_STORE, "write_symbol",
+                        lambda symbol, hist: writers.append((symbol, threading.current_thread())))
+
+    assert run(server.fetch_comprehensive_stock_data("RELIANCE"))
+
+    assert [symbol for symbol, _ in writers] == ["RELIANCE"]
+    assert writers[0][1] is not threading.main_thread()
+
+
+def _write_from_worker(directory, worker: int) -> None:
+    store = server.UniverseStore(directory, SYMBOLS, 260)
+    for n, symbol in enumerate(SYMBOLS[worker::4]):
+        store.write_symbol(symbol, calendar_history(20 + 23 * n, end_offset=9 - n, seed=worker * 100 + n))
+    store.flush()
+
+
+@pytest.mark.skipif(server.fcntl is None, reason="cross-process locking needs fcntl")
+def test_concurrent_workers_do_not_corrupt_rows(tmp_path):
+    directory = tmp_path / "universe"
+    server.UniverseStore(directory, SYMBOLS, 260).open()
+
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_write_from_worker, args=(directory, w)) for w in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+
+    store = server.UniverseStore(directory, SYMBOLS, 260)
+    for worker in range(4):
+        for n, symbol in enumerate(SYMBOLS[worker::4]):
+            expected = calendar_history(20 + 23 * n, end_offset=9 - n, seed=worker * 100 + n)
+            pd.testing.assert_frame_equal(row_frame(store, symbol), expected, check_freq=False, check_names=False)
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+
+import pytest
+
+import server
+from tests.conftest import run
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = server.AdaptiveConcurrencyLimiter(initial=1, minimum=1, maximum=1, latency_target=5.0)
+    monkeypatch.setitem(server.UPSTREAM_LIMITERS, server.DEFAULT_UPSTREAM_PROVIDER, limiter)
+    monkeypatch.setitem(server.UPSTREAM_BUCKETS, server.DEFAULT_UPSTREAM_PROVIDER, server.TokenBucket(1e6, 1000))
+    monkeypatch.setattr(server, "UPSTREAM_CALL_TIMEOUT", 0.05)
+    return limiter
+
+
+async def _wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_every_admitted_call_has_a_thread():
+    windows = sum(limiter.maximum for limiter in server.UPSTREAM_LIMITERS.values())
+    assert windows <= server.upstream_executor._max_workers
+    assert server.upstream_executor is not server.executor
+
+
+def test_timed_out_call_holds_its_slot_until_the_thread_returns(limiter):
+    hung = threading.Event()
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await server.call_upstream("RELIANCE", "history", hung.wait, 5)
+        held = limiter.in_flight
+
+        # The next call queues behind the still-running thread instead of stacking a second one
+        follow_up = asyncio.ensure_future(server.call_upstream("TCS", "history", lambda: "ok"))
+        await asyncio.sleep(0.05)
+        queued = not follow_up.done()
+
+        hung.set()
+        result = await follow_up
+        await _wait_until(lambda: limiter.in_flight == 0)
+        return held, queued, result
+
+    assert run(scenario()) == (1, True, "ok")
+    assert limiter.outcomes["timeout"] == 1
+
+
+def test_cancelled_call_holds_its_slot_until_the_thread_returns(limiter):
+    hung = threading.Event()
+    started = threading.Event()
+
+    def blocking_call():
+        started.set()
+        hung.wait(5)
+
+    async def scenario():
+        call = asyncio.ensure_future(server.call_upstream("INFY", "history", blocking_call))
+        await _wait_until(started.is_set)
+        call.cancel()
+        await asyncio.gather(call, return_exceptions=True)
+        held = limiter.in_flight
+
+        hung.set()
+        await _wait_until(lambda: limiter.in_flight == 0)
+        return held
+
+    assert run(scenario()) == 1
+
+
+def test_completed_call_releases_immediately(limiter):
+    async def scenario():
+        result = await server.call_upstream("WIPRO", "history", lambda: 42)
+        return result, limiter.in_flight
+
+    assert run(scenario()) == (42, 0)
+    assert limiter.outcomes["ok"] == 1
+
+
+def test_bulk_call_timeout_leaves_the_window_and_breaker_alone(monkeypatch):
+    limiter = server.AdaptiveConcurrencyLimiter(initial=4, minimum=1, maximum=16, latency_target=5.0)
+    monkeypatch.setitem(server.UPSTREAM_LIMITERS, server.DEFAULT_UPSTREAM_PROVIDER, limiter)
+    monkeypatch.setitem(server.UPSTREAM_BUCKETS, server.DEFAULT_UPSTREAM_PROVIDER, server.TokenBucket(1e6, 1000))
+    breaker = server.UPSTREAM_BREAKERS[server.DEFAULT_UPSTREAM_PROVIDER]
+    hung = threading.Event()
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await server.call_upstream(server.BULK_CALL_KEY, "bulk_history", hung.wait, 5, cost=20, call_timeout=0.05)
+        hung.set()
+        await _wait_until(lambda: limiter.in_flight == 0)
+
+    run(scenario())
+
+    assert limiter.window == 4 and limiter.decreases == 0
+    assert limiter.outcomes["local_timeout"] == 1 and limiter.outcomes["timeout"] == 0
+    assert breaker.failures == 0
+
+
+def test_retries_are_charged_to_the_retry_budget_not_the_bucket(monkeypatch):
+    bucket = server.TokenBucket(1e6, 1000)
+    budget = server.RetryBudget(ratio=0.1, min_per_minute=10)
+    monkeypatch.setitem(server.UPSTREAM_BUCKETS, server.DEFAULT_UPSTREAM_PROVIDER, bucket)
+    monkeypatch.setattr(server, "RETRY_BUDGET", budget)
+    monkeypatch.setattr(server, "INITIAL_WAIT", 0.01)
+    attempts = []
+
+    def flaky_download():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("connection reset")
+        return "ok"
+
+    result = run(server.rate_limited_request(
+        server.call_upstream, server.BULK_CALL_KEY, "bulk_history", flaky_download, cost=20))
+
+    assert result == "ok" and len(attempts) == 2
+    assert bucket.acquired == 20
+    assert budget.stats()["requests_last_minute"] == 20 and budget.stats()["retries_last_minute"] == 20
@@ -0,0 +1,64 @@
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+import server
+from tests.conftest import run
+
+
+@pytest.fixture
+def warm_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "WARM_STATE_PATH", tmp_path / "warm_state.sqlite3")
+    monkeypatch.setattr(server, "SCAN_SNAPSHOT", None)
+    server.WARM_STATE_KEYS.clear()
+    yield tmp_path / "warm_state.sqlite3"
+    server.WARM_STATE_KEYS.clear()
+
+
+def _persist_analysis(symbol: str) -> None:
+    server.cache_stock_data(symbol, run(server._fetch_comprehensive_stock_data(symbol)))
+    server.write_warm_state(*server.collect_warm_state())
+    server.STOCK_DATA_CACHE.clear()
+
+
+def test_current_format_round_trips(fake_market, warm_store, monkeypatch):
+    monkeypatch.setattr(server, "SHARED_CACHE_ENABLED", False)
+    server.init_warm_state_store()
+    _persist_analysis("RELIANCE")
+
+    run(server.restore_warm_state())
+    data, status = run(server.lookup_cached_stock_data("RELIANCE"))
+
+    assert status == "fresh" and data["symbol"] == "RELIANCE"
+
+
+def test_rows_of_another_format_are_discarded_unread(fake_market, warm_store, monkeypatch):
+    monkeypatch.setattr(server, "SHARED_CACHE_ENABLED", False)
+    server.init_warm_state_store()
+    _persist_analysis("TCS")
+    with closing(server.get_warm_state_connection()) as conn, conn:
+        # A payload from an older release would not even unpickle into today's classes
+        conn.execute("UPDATE warm_state SET payload = ?, format = ? WHERE key = 'stock_TCS'",
+                     (b"not a pickle", server.WARM_STATE_FORMAT - 1))
+
+    run(server.restore_warm_state())
+
+    assert "stock_TCS" not in server.WARM_STATE_KEYS
+    assert run(server.lookup_cached_stock_data("TCS")) == (None, "miss")
+    with closing(server.get_warm_state_connection()) as conn:
+        assert conn.execute("SELECT 1 FROM warm_state WHERE key = 'stock_TCS'").fetchone() is None
+
+
+def test_unversioned_store_is_migrated_and_its_rows_dropped(warm_store):
+    with closing(sqlite3.connect(warm_store)) as conn, conn:
+        conn.execute("CREATE TABLE warm_state (key TEXT PRIMARY KEY, payload BLOB NOT NULL, usable_until REAL)")
+        conn.execute("INSERT INTO warm_state VALUES ('stock_INFY', x'80', NULL), ('snapshot', x'80', NULL)")
+
+    server.init_warm_state_store()
+    keys, snapshot_payload = server.load_warm_state_index()
+
+    assert keys == set() and snapshot_payload is None
+    server.write_warm_state([("indicator_INFY", b"payload", None)], [])
+    with closing(server.get_warm_state_connection()) as conn:
+        assert conn.execute("SELECT format FROM warm_state").fetchall() == [(server.WARM_STATE_FORMAT,)]
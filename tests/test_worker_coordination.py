@@ -0,0 +1,191 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from tests.conftest import run
+
+
+@pytest.fixture
+def sqlite_threads(monkeypatch):
+    """Record the thread every warm-state and L2 read runs on"""
+    threads = []
+    for name in ("read_warm_entries", "read_shared_entries"):
+        original = getattr(server, name)
+
+        def traced(*args, _original=original):
+            threads.append(threading.current_thread())
+            time.sleep(0.1)  # A slow disk must not stall the event loop
+            return _original(*args)
+
+        monkeypatch.setattr(server, name, traced)
+    return threads
+
+
+@pytest.fixture
+def snapshot_store(monkeypatch):
+    monkeypatch.setattr(server, "SCAN_SNAPSHOT", None)
+    monkeypatch.setitem(server.WARM_STATE_STATS, "saved_snapshot_version", None)
+    yield
+    server.write_warm_state([], ["snapshot"])
+
+
+def _snapshot(version: int, minutes_ago: float) -> server.ScanSnapshot:
+    built_at = datetime.now(timezone.utc) - timedelta(minutes=minutes_ago)
+    return server.ScanSnapshot(version, built_at, 1.0, {}, frozenset())
+
+
+async def _ticks_while(coro) -> tuple:
+    """Run coro while counting 10 ms ticks of a concurrent coroutine"""
+    ticks = 0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal ticks
+        while not done.is_set():
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    counting = asyncio.ensure_future(ticker())
+    try:
+        return await coro, ticks
+    finally:
+        done.set()
+        await counting
+
+
+def test_l2_lookup_reads_sqlite_off_the_event_loop(fake_market, sqlite_threads):
+    server.cache_stock_data("RELIANCE", run(server._fetch_comprehensive_stock_data("RELIANCE")))
+    server.executor.submit(lambda: None).result()
+    server.STOCK_DATA_CACHE.clear()
+
+    (data, status), ticks = run(_ticks_while(server.lookup_cached_stock_data("RELIANCE")))
+
+    assert status == "fresh" and data["symbol"] == "RELIANCE"
+    assert sqlite_threads and threading.main_thread() not in sqlite_threads
+    assert ticks >= 5
+
+
+def test_warm_restore_reads_sqlite_off_the_event_loop(fake_market, sqlite_threads, monkeypatch):
+    server.cache_stock_data("TCS", run(server._fetch_comprehensive_stock_data("TCS")))
+    server.write_warm_state(*server.collect_warm_state())
+    server.STOCK_DATA_CACHE.clear()
+    monkeypatch.setattr(server, "SHARED_CACHE_ENABLED", False)
+    server.WARM_STATE_KEYS.add("stock_TCS")
+
+    (data, status), ticks = run(_ticks_while(server.lookup_cached_stock_data("TCS")))
+
+    assert status == "fresh" and data["symbol"] == "TCS"
+    assert threading.main_thread() not in sqlite_threads
+    assert ticks >= 5
+    assert "stock_TCS" not in server.WARM_STATE_KEYS
+
+
+def test_background_lease_has_one_holder_until_it_lapses(monkeypatch):
+    monkeypatch.setattr(server, "WORKER_ID", "worker-a")
+    assert server.renew_background_lease()
+    assert server.renew_background_lease()   # renewal by the holder
+
+    monkeypatch.setattr(server, "WORKER_ID", "worker-b")
+    assert not server.renew_background_lease()
+
+    with server.closing(server.get_shared_cache_connection()) as conn, conn:
+        conn.execute("UPDATE refresh_leases SET expires_at = 0 WHERE key = ?", (server.BACKGROUND_LEASE_KEY,))
+    assert server.renew_background_lease()   # the lapsed lease is taken over
+
+    monkeypatch.setattr(server, "WORKER_ID", "worker-a")
+    assert not server.renew_background_lease()
+    server.release_refresh_leases([server.BACKGROUND_LEASE_KEY])   # only the holder can release it
+    monkeypatch.setattr(server, "WORKER_ID", "worker-b")
+    server.release_refresh_leases([server.BACKGROUND_LEASE_KEY])
+
+
+def test_only_newer_persisted_snapshots_are_adopted(snapshot_store):
+    server.write_warm_state([server.scan_snapshot_row(_snapshot(3, minutes_ago=5))], [])
+
+    assert run(server.adopt_persisted_snapshot(server.load_persisted_snapshot()))
+    assert server.SCAN_SNAPSHOT.version == 3
+
+    server.SCAN_SNAPSHOT = _snapshot(4, minutes_ago=1)
+    assert not run(server.adopt_persisted_snapshot(server.load_persisted_snapshot()))
+    assert server.SCAN_SNAPSHOT.version == 4
+
+
+def _run_refresher(monkeypatch, held: bool, persisted: server.ScanSnapshot = None) -> list:
+    """Run scan_snapshot_refresher briefly while another worker persists a snapshot; returns the builds"""
+    builds = []
+
+    async def build_scan_snapshot():
+        builds.append(1)
+        return _snapshot(len(builds), minutes_ago=0)
+
+    monkeypatch.setattr(server, "build_scan_snapshot", build_scan_snapshot)
+    monkeypatch.setattr(server, "SCAN_SNAPSHOT_POLL_SECONDS", 0.01)
+    monkeypatch.setitem(server.BACKGROUND_LEASE, "held", held)
+
+    async def scenario():
+        refresher = asyncio.ensure_future(server.scan_snapshot_refresher())
+        await asyncio.sleep(0.1)
+        if persisted is not None:
+            server.write_warm_state([server.scan_snapshot_row(persisted)], [])
+        await asyncio.sleep(0.2)
+        refresher.cancel()
+        await asyncio.gather(refresher, return_exceptions=True)
+
+    run(scenario())
+    return builds
+
+
+def test_lease_holder_builds_and_persists_due_snapshots(snapshot_store, monkeypatch):
+    builds = _run_refresher(monkeypatch, held=True)
+
+    assert len(builds) == 1   # built once, then fresh until the refresh interval
+    assert server.load_persisted_snapshot()[0] == server.SCAN_SNAPSHOT.version == 1
+
+
+def test_other_workers_adopt_the_persisted_snapshot(snapshot_store, monkeypatch):
+    persisted = _snapshot(7, minutes_ago=2)
+    builds = _run_refresher(monkeypatch, held=False, persisted=persisted)
+
+    assert not builds
+    assert server.SCAN_SNAPSHOT.built_at == persisted.built_at
+
+
+def test_unreadable_and_old_format_l2_rows_are_skipped(fake_market):
+    now = time.time()
+    entry = {'data': run(server._fetch_comprehensive_stock_data("RELIANCE")), 'timestamp': now,
+             'expires_at': now + 600, 'stale_until': now + 1200}
+    assert server.write_shared_entry("stock_RELIANCE", server.pickle.dumps(entry), now, now + 1200)
+    with server.closing(server.get_shared_cache_connection()) as conn, conn:
+        conn.executemany("INSERT OR REPLACE INTO shared_cache VALUES (?, ?, ?, ?, ?, ?)", [
+            ("stock_TCS", b"not a pickle", now, now + 600, "worker-b", server.SHARED_CACHE_FORMAT),
+            ("stock_INFY", server.pickle.dumps({"timestamp": now}), now, now + 600, "worker-b", None),
+        ])
+
+    entries = server.read_shared_entries({"stock_RELIANCE": 0, "stock_TCS": 0, "stock_INFY": 0})
+
+    assert list(entries) == ["stock_RELIANCE"]
+    with server.closing(server.get_shared_cache_connection()) as conn:
+        keys = {key for (key,) in conn.execute("SELECT key FROM shared_cache")}
+    assert "stock_TCS" not in keys and "stock_INFY" in keys
+
+
+def test_l2_writes_are_counted_on_the_event_loop(fake_market, monkeypatch):
+    counted = []
+    original = server.record_shared_write
+    monkeypatch.setattr(server, "record_shared_write",
+                        lambda write: (counted.append(threading.current_thread()), original(write)))
+    before = server.SHARED_CACHE_STATS["l2_writes"]
+
+    async def scenario():
+        server.cache_stock_data("RELIANCE", await server._fetch_comprehensive_stock_data("RELIANCE"))
+        while not counted:
+            await asyncio.sleep(0.01)
+
+    run(asyncio.wait_for(scenario(), 5))
+
+    assert counted == [threading.main_thread()]
+    assert server.SHARED_CACHE_STATS["l2_writes"] == before + 1